@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+
+# Desktop agent of the driver, runs as the user in the desktop session
+#
+# Usage: uv run python agent.py
+#
+# Does what needs the session so the core (dialpad.py) does not have to:
+# reports the focused window and the GNOME input source to the core and
+# enables or disables the touchpad pointer when the core asks. Slow desktop
+# calls (qdbus, kdotool, gsettings, xinput, setxkbmap) then never hold up the
+# touchpad events loop. Reconnects when the core is restarted; without the
+# agent the core does all of it itself.
+
+import logging
+import os
+import sys
+import threading
+from time import sleep
+from typing import NamedTuple
+
+import desktop
+from focus_watch import FocusWatcher
+from service import setup_logging
+from agent_link import MAX_MESSAGE_SIZE, MSG_FOCUS, MSG_HELLO, MSG_LAYOUT, MSG_TOUCHPAD, PROTOCOL_VERSION, agent_socket_path, connect_agent_socket, decode, encode
+
+log = logging.getLogger('asus-dialpad-driver')
+
+RECONNECT_INTERVAL = 2
+
+
+class AgentInputDevice(NamedTuple):
+    event: int
+
+
+class AgentTouchpad(NamedTuple):
+    """
+    What the desktop touchpad toggling needs of an engine of the core.
+    """
+    name: str
+    input_device: AgentInputDevice
+
+
+class DesktopAgent:
+
+    def __init__(self, path=None):
+        self.path = path or agent_socket_path()
+        self.socket = None
+        self.lock = threading.Lock()
+        self.window_title = None
+        self.layout = None
+        self.stopped = False
+
+    def send(self, message_type, *fields, text=None):
+        with self.lock:
+            if self.socket is None:
+                return
+            try:
+                self.socket.send(encode(message_type, *fields, text=text))
+            except OSError as e:
+                log.debug("Message to the core failed: %s", e)
+
+    def send_layout(self, index, layout):
+        # update_gnome_layout() reports the layout every time it looks
+        if (index, layout) != self.layout:
+            self.layout = (index, layout)
+            self.send(MSG_LAYOUT, index, text=layout)
+
+    def connect(self):
+        while True:
+            try:
+                s = connect_agent_socket(self.path)
+                break
+            except OSError as e:
+                log.debug("Core is not available at %s: %s", self.path, e)
+                sleep(RECONNECT_INTERVAL)
+
+        with self.lock:
+            self.socket = s
+            # before any FOCUS of the watcher thread
+            try:
+                s.send(encode(MSG_HELLO, PROTOCOL_VERSION, os.getpid(), text=desktop.xdg_session_type))
+            except OSError as e:
+                log.debug("Message to the core failed: %s", e)
+        log.info("Connected to the core at %s", self.path)
+
+        # the core forgets the focus and the layout of the previous agent
+        self.send_focus()
+        self.layout = None
+
+    def disconnect(self):
+        with self.lock:
+            if self.socket:
+                self.socket.close()
+                self.socket = None
+
+    def send_focus(self):
+        title = self.window_title
+        self.send(MSG_FOCUS, 1 if title is not None else 0, text=title)
+
+    def focus_changed(self, title):
+        # FocusWatcher reports only changes
+        self.window_title = title
+        self.send_focus()
+
+    def handle(self, data):
+        try:
+            message_type, fields, text = decode(data)
+        except ValueError as e:
+            log.warning("%s", e)
+            return
+
+        if message_type == MSG_TOUCHPAD:
+            enabled, event = fields
+            desktop.set_touchpad_prop_send_events(AgentTouchpad(text, AgentInputDevice(event)), enabled)
+
+    def run(self):
+        threading.Thread(
+            target=lambda: desktop.check_gnome_layout(lambda: desktop.update_gnome_layout(self.send_layout), lambda: self.stopped),
+            daemon=True
+        ).start()
+        threading.Thread(target=lambda: FocusWatcher(self.focus_changed).run(lambda: self.stopped), daemon=True).start()
+
+        while True:
+            self.connect()
+
+            while True:
+                # focus changes are sent by the watcher thread, only the requests of the core are waited for
+                try:
+                    data = self.socket.recv(MAX_MESSAGE_SIZE)
+                except OSError:
+                    data = b''
+                if not data:
+                    log.info("Core disconnected")
+                    break
+                self.handle(data)
+
+            self.disconnect()
+
+
+def main():
+    setup_logging()
+    desktop.connect_session()
+
+    agent = DesktopAgent()
+    try:
+        agent.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        agent.stopped = True
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+
+# Link between the privileged core of the driver (dialpad.py - evdev, gesture,
+# uinput, I2C) and the desktop agent of the user session (agent.py - focused
+# window, keyboard layout, touchpad toggling).
+#
+# One message per SOCK_SEQPACKET packet, a type byte followed by a fixed struct
+# and a UTF-8 string:
+#
+# HELLO     agent -> core  '<BHI' version, pid + session type
+# FOCUS     agent -> core  '<BB' has title + title of the active window
+# LAYOUT    agent -> core  '<Bi' index of the GNOME input source + layout name
+# TOUCHPAD  core -> agent  '<BBi' enabled, event number + touchpad name
+#
+# The core never waits for the agent - it only reads what the agent pushed
+# (the focused window is the last one the agent reported) and its own
+# messages are dropped when the agent does not keep up.
+
+import errno
+import logging
+import os
+import select
+import socket
+import struct
+import tempfile
+
+log = logging.getLogger('asus-dialpad-driver')
+
+AGENT_SOCKET_NAME = 'asus-dialpad-driver-agent.sock'
+USER_RUNTIME_DIRS = '/run/user'
+PROTOCOL_VERSION = 1
+MAX_MESSAGE_SIZE = 4096
+
+MSG_HELLO = 1
+MSG_FOCUS = 2
+MSG_LAYOUT = 3
+MSG_TOUCHPAD = 4
+
+HELLO = struct.Struct('<BHI')
+FOCUS = struct.Struct('<BB')
+LAYOUT = struct.Struct('<Bi')
+TOUCHPAD = struct.Struct('<BBi')
+
+MESSAGE_STRUCTS = {
+    MSG_HELLO: HELLO,
+    MSG_FOCUS: FOCUS,
+    MSG_LAYOUT: LAYOUT,
+    MSG_TOUCHPAD: TOUCHPAD,
+}
+
+
+def runtime_dir():
+    if os.environ.get('XDG_RUNTIME_DIR'):
+        return os.environ['XDG_RUNTIME_DIR']
+
+    # sudo drops XDG_RUNTIME_DIR, the agent of the user looks in the runtime dir of the user
+    if os.environ.get('SUDO_UID'):
+        user_runtime_dir = os.path.join(USER_RUNTIME_DIRS, os.environ['SUDO_UID'])
+        if os.path.isdir(user_runtime_dir):
+            return user_runtime_dir
+
+    return tempfile.gettempdir()
+
+
+def agent_socket_path():
+    if os.environ.get('DIALPAD_AGENT_SOCKET'):
+        return os.environ['DIALPAD_AGENT_SOCKET']
+
+    return os.path.join(runtime_dir(), AGENT_SOCKET_NAME)
+
+
+def encode(message_type, *fields, text=None):
+    header = MESSAGE_STRUCTS[message_type]
+    data = (text or "").encode(errors='replace')[:MAX_MESSAGE_SIZE - header.size]
+    return header.pack(message_type, *fields) + data
+
+
+def decode(data):
+    """
+    (type, (fields...), text), ValueError when the message is not known.
+    """
+    if not data or data[0] not in MESSAGE_STRUCTS:
+        raise ValueError("unknown agent message {!r}".format(data[:1]))
+
+    header = MESSAGE_STRUCTS[data[0]]
+    if len(data) < header.size:
+        raise ValueError("truncated agent message type {}".format(data[0]))
+
+    fields = header.unpack_from(data)
+    return fields[0], fields[1:], data[header.size:].decode(errors='replace')
+
+
+def peer_uid(connection):
+    pid, uid, gid = struct.unpack('3i', connection.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i')))
+    return uid
+
+
+class AgentLink:
+    """
+    Core side of the link, one agent at a time (a new one replaces the old one).
+
+    window_title - title of the active window the agent reported last
+    on_layout(index, layout) - GNOME input source changed (called by the serve() thread)
+    on_disconnect() - the agent went away, the core follows the session itself again (serve() thread)
+
+    The socket is owned by the user who started the driver with sudo, only
+    that user and root can connect.
+    """
+
+    def __init__(self, on_layout=None, path=None, on_disconnect=None):
+        self.path = path or agent_socket_path()
+        self.on_layout = on_layout
+        self.on_disconnect = on_disconnect
+        self.socket = None
+        self.connection = None
+        self.window_title = None
+        self.session_type = None
+        self.allowed_uids = {0, os.getuid()}
+        if os.environ.get('SUDO_UID'):
+            self.allowed_uids.add(int(os.environ['SUDO_UID']))
+
+    @property
+    def connected(self):
+        return self.connection is not None
+
+    def open(self):
+        # a socket still accepting belongs to another running core, only a stale one is replaced
+        try:
+            connect_agent_socket(self.path).close()
+        except FileNotFoundError:
+            pass
+        except OSError:
+            os.unlink(self.path)
+        else:
+            raise OSError(errno.EADDRINUSE, "another driver is listening on it")
+
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET | socket.SOCK_CLOEXEC)
+        umask = os.umask(0o077)
+        try:
+            self.socket.bind(self.path)
+        finally:
+            os.umask(umask)
+
+        if os.environ.get('SUDO_UID'):
+            os.chown(self.path, int(os.environ['SUDO_UID']), -1)
+
+        self.socket.listen(1)
+
+    def serve(self, is_stopped):
+        """
+        Accepts the agent and handles its messages until is_stopped() returns True.
+        """
+        while not is_stopped():
+            sockets = [self.socket] + ([self.connection] if self.connection else [])
+            try:
+                readable = select.select(sockets, [], [], 1)[0]
+            except (OSError, ValueError):
+                # closed
+                break
+
+            if self.socket in readable:
+                self.accept()
+            if self.connection and self.connection in readable:
+                self.receive()
+
+    def accept(self):
+        connection, address = self.socket.accept()
+
+        uid = peer_uid(connection)
+        if uid not in self.allowed_uids:
+            log.warning("Agent of uid %d refused", uid)
+            connection.close()
+            return
+
+        self.disconnect()
+        self.connection = connection
+        log.info("Desktop agent connected (uid %d)", uid)
+
+    def receive(self):
+        try:
+            data = self.connection.recv(MAX_MESSAGE_SIZE)
+        except OSError as e:
+            data = b''
+            log.debug("Agent connection failed: %s", e)
+
+        if not data:
+            log.info("Desktop agent disconnected")
+            self.disconnect()
+            if self.on_disconnect:
+                try:
+                    self.on_disconnect()
+                except Exception:
+                    log.exception("Handling of the agent disconnect failed")
+            return
+
+        try:
+            message_type, fields, text = decode(data)
+        except ValueError as e:
+            log.warning("%s", e)
+            return
+
+        if message_type == MSG_HELLO:
+            version, pid = fields
+            self.session_type = text
+            log.info("Desktop agent %d (protocol %d, %s session)", pid, version, text)
+        elif message_type == MSG_FOCUS:
+            self.window_title = text if fields[0] else None
+        elif message_type == MSG_LAYOUT and self.on_layout:
+            self.on_layout(fields[0], text)
+
+    def send_touchpad_send_events(self, name, event, enabled):
+        """
+        Returns False when there is no agent or it does not keep up.
+        """
+        connection = self.connection
+        if connection is None:
+            return False
+
+        try:
+            connection.send(encode(MSG_TOUCHPAD, 1 if enabled else 0, event, text=name), socket.MSG_DONTWAIT)
+            return True
+        except OSError as e:
+            log.debug("Touchpad message to the agent dropped: %s", e)
+            return False
+
+    def disconnect(self):
+        if self.connection:
+            self.connection.close()
+            self.connection = None
+        self.window_title = None
+        self.session_type = None
+
+    def close(self):
+        self.disconnect()
+        if self.socket:
+            self.socket.close()
+            self.socket = None
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+
+def connect_agent_socket(path=None):
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET | socket.SOCK_CLOEXEC)
+    try:
+        s.connect(path or agent_socket_path())
+    except OSError:
+        s.close()
+        raise
+
+    return s
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+# Shortcut dispatch throughput (what emulate_shortcuts() does per gesture)
+#
+# Usage: uv run python -m benchmarks.bench_dispatch
+#
+# The active window is one of the last app profiles (the worst case of the
+# title matching), keys go to a sink which only counts them.
+
+from collections import namedtuple
+
+from benchmarks.timing import best_of, result
+from dispatch import ShortcutDispatcher
+
+Key = namedtuple('Key', ['name', 'value'])
+
+KEY_MUTE = Key('KEY_MUTE', 113)
+KEY_VOLUMEDOWN = Key('KEY_VOLUMEDOWN', 114)
+KEY_VOLUMEUP = Key('KEY_VOLUMEUP', 115)
+KEY_LEFTSHIFT = Key('KEY_LEFTSHIFT', 42)
+
+PROFILES_COUNTS = (1, 10, 100, 1000)
+GESTURES = ("clockwise", "counterclockwise", "center")
+
+
+def profile():
+    return {
+        "center": [
+            {"key": KEY_MUTE, "trigger": "release", "duration": 1},
+            {"key": KEY_MUTE, "trigger": "release", "modifier": KEY_LEFTSHIFT},
+        ],
+        "clockwise": [
+            {"key": KEY_VOLUMEUP, "trigger": "immediate"},
+            {"key": KEY_VOLUMEUP, "trigger": "immediate", "modifier": KEY_LEFTSHIFT},
+        ],
+        "counterclockwise": [
+            {"key": KEY_VOLUMEDOWN, "trigger": "immediate"},
+            {"key": KEY_VOLUMEDOWN, "trigger": "immediate", "modifier": KEY_LEFTSHIFT},
+        ],
+    }
+
+
+def app_shortcuts(profiles_count):
+    shortcuts = {"app{:04d}".format(i): profile() for i in range(profiles_count)}
+    shortcuts["none"] = profile()
+    return shortcuts
+
+
+def dispatches_per_second(profiles_count, active_modifiers, dispatches_count=20000):
+    sent = [0]
+
+    def send_key(key_code, press):
+        sent[0] += 1
+
+    window_title = "Document - App{:04d}".format(profiles_count - 1)
+    dispatcher = ShortcutDispatcher(app_shortcuts(profiles_count), lambda: window_title, send_key)
+
+    def run():
+        for i in range(dispatches_count):
+            dispatcher.dispatch(GESTURES[i % 3], True, active_modifiers, 0)
+
+    return dispatches_count / best_of(run)
+
+
+def run():
+    results = {}
+    for profiles_count in PROFILES_COUNTS:
+        results["dispatch.profiles_{}".format(profiles_count)] = result(dispatches_per_second(profiles_count, set()), "dispatches/s")
+    results["dispatch.profiles_10_modifier"] = result(dispatches_per_second(10, {KEY_LEFTSHIFT}), "dispatches/s")
+    return results
+
+
+def main():
+    for name, measurement in run().items():
+        print(f"{name:32} {measurement['value']:12.0f} {measurement['unit']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+
+# Compares the bulk EventReader with the per-event libevdev path
+#
+# Usage: uv run python -m benchmarks.bench_evdev_reader [frames]
+#
+# The libevdev path cannot be fed from a file, so it is emulated the way
+# Device.events() builds its objects: one libevdev.evbit() lookup and one
+# InputEvent per kernel event. That leaves out the ctypes call of
+# libevdev_next_event() per event, so the real path is even slower.
+
+import gc
+import math
+import os
+import struct
+import sys
+import tempfile
+import tracemalloc
+from time import perf_counter
+from types import SimpleNamespace
+
+from benchmarks.timing import result
+from evdev_reader import ABS_MT_POSITION_X, ABS_MT_POSITION_Y, ABS_MT_TRACKING_ID, BTN_TOOL_FINGER, EV_ABS, EV_KEY, EV_SYN, INPUT_EVENT_FORMAT, INPUT_EVENT_SIZE, SYN_REPORT, EventReader
+from gesture import DialGesture
+
+EV_MSC = 0x04
+MSC_TIMESTAMP = 0x05
+ABS_X = 0x00
+ABS_Y = 0x01
+
+layout = SimpleNamespace(
+    circle_diameter=1400,
+    center_button_diameter=250,
+    circle_center_x=770,
+    circle_center_y=750,
+    top_right_icon_width=250,
+    top_right_icon_height=250
+)
+
+
+def synthetic_stream(frames_count):
+    """
+    Finger going around the dial, the same events per frame as sends an ASUS touchpad.
+    """
+    pack = struct.Struct(INPUT_EVENT_FORMAT).pack
+    data = bytearray()
+    usec = 0
+
+    for i in range(frames_count):
+        usec += 7000
+        sec, usec_part = divmod(usec, 1000000)
+        angle = i / 50 * 2 * math.pi
+        x = int(770 + 500 * math.cos(angle))
+        y = int(750 + 500 * math.sin(angle))
+
+        events = []
+        if i == 0:
+            events.append((EV_ABS, ABS_MT_TRACKING_ID, 1))
+        events += [
+            (EV_ABS, ABS_MT_POSITION_X, x),
+            (EV_ABS, ABS_MT_POSITION_Y, y),
+        ]
+        if i == 0:
+            events.append((EV_KEY, BTN_TOOL_FINGER, 1))
+        events += [
+            (EV_ABS, ABS_X, x),
+            (EV_ABS, ABS_Y, y),
+            (EV_MSC, MSC_TIMESTAMP, usec),
+            (EV_SYN, SYN_REPORT, 0),
+        ]
+        for type_, code, value in events:
+            data += pack(sec, usec_part, type_, code, value)
+
+    return bytes(data)
+
+
+def run_raw(path, gesture):
+    fd = os.open(path, os.O_RDONLY)
+    reader = EventReader(fd)
+    try:
+        while True:
+            try:
+                count = reader.read()
+            except EOFError:
+                break
+            frames, _ = reader.split(count)
+            for timestamp, events in frames:
+                gesture.process_frame(timestamp, events)
+    finally:
+        os.close(fd)
+
+    return reader.events_count
+
+
+def run_libevdev(path, gesture):
+    import libevdev
+
+    unpack = struct.Struct(INPUT_EVENT_FORMAT).iter_unpack
+    syn_report = libevdev.EV_SYN.SYN_REPORT
+    count = 0
+    events = []
+
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(INPUT_EVENT_SIZE * 64)
+            if not data:
+                break
+
+            for sec, usec, type_, code, value in unpack(data):
+                event = libevdev.InputEvent(libevdev.evbit(type_, code), value, sec, usec)
+                count += 1
+                if event.matches(syn_report):
+                    gesture.process_frame(event.sec + event.usec / 1000000, events)
+                    events = []
+                else:
+                    events.append((event.type.value, event.code.value, event.value))
+
+    return count
+
+
+def measure(name, run, path):
+    gesture = DialGesture(layout, 3946, lambda *args: None, lambda: None, lambda enabled: None, lambda: True)
+
+    gc.collect()
+    collections_before = gc.get_stats()[0]['collections']
+    tracemalloc.start()
+    try:
+        start = perf_counter()
+
+        count = run(path, gesture)
+
+        elapsed = perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        # also when the path is not available, the following benchmarks would be traced
+        tracemalloc.stop()
+    collections = gc.get_stats()[0]['collections'] - collections_before
+
+    # tracemalloc slows down both paths the same way, run once more without it for the rate
+    gesture = DialGesture(layout, 3946, lambda *args: None, lambda: None, lambda enabled: None, lambda: True)
+    start = perf_counter()
+    run(path, gesture)
+    untraced_elapsed = perf_counter() - start
+
+    print(f"{name:10} {count / untraced_elapsed:12.0f} events/s {peak / 1024:10.1f} KiB peak {collections:8d} gen0 collections ({elapsed:.2f}s traced)")
+
+    return count / untraced_elapsed, peak
+
+
+def run(frames_count=200000):
+    """
+    Results of both paths for benchmarks.suite, the libevdev one only when libevdev can be loaded.
+    """
+    results = {}
+
+    with tempfile.NamedTemporaryFile(suffix='.evdev') as f:
+        f.write(synthetic_stream(frames_count))
+        f.flush()
+
+        print(f"{frames_count} frames, {os.path.getsize(f.name) // INPUT_EVENT_SIZE} events")
+
+        rate, peak = measure("raw", run_raw, f.name)
+        results["evdev_reader.raw"] = result(rate, "events/s")
+        results["evdev_reader.raw_peak_memory"] = result(peak / 1024, "KiB")
+        try:
+            rate, peak = measure("libevdev", run_libevdev, f.name)
+            results["evdev_reader.libevdev"] = result(rate, "events/s")
+        except (ImportError, OSError) as e:
+            print(f"libevdev   skipped: {e}")
+
+    return results
+
+
+def main():
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
+
+
+if __name__ == "__main__":
+    main()
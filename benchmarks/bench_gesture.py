@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+# Frames per second of the gesture engine on synthetic input
+#
+# Usage: uv run python -m benchmarks.bench_gesture [frames]
+#
+# spiral - one finger circling the dial while moving in and out of the center button
+# taps - short taps of the center button
+# resting palm - spiral with a second contact resting on the touchpad the whole time
+
+import math
+import sys
+
+from benchmarks.bench_evdev_reader import layout
+from benchmarks.timing import best_of, result
+from evdev_reader import ABS_MT_POSITION_X, ABS_MT_POSITION_Y, ABS_MT_SLOT, ABS_MT_TOOL_TYPE, ABS_MT_TRACKING_ID, BTN_TOOL_FINGER, EV_ABS, EV_KEY, MT_TOOL_PALM
+from gesture import DialGesture
+
+FRAME_INTERVAL = 0.007
+MAX_X = 3946
+
+
+def spiral_frames(frames_count, palm=False):
+    frames = []
+    timestamp = 0
+
+    if palm:
+        frames.append((timestamp, [
+            (EV_ABS, ABS_MT_SLOT, 1),
+            (EV_ABS, ABS_MT_TRACKING_ID, 2),
+            (EV_ABS, ABS_MT_TOOL_TYPE, MT_TOOL_PALM),
+            (EV_ABS, ABS_MT_POSITION_X, 3000),
+            (EV_ABS, ABS_MT_POSITION_Y, 1800),
+            (EV_ABS, ABS_MT_SLOT, 0),
+        ]))
+
+    for i in range(frames_count):
+        timestamp += FRAME_INTERVAL
+        angle = i / 50 * 2 * math.pi
+        # radius goes from the center button to the edge of the dial and back
+        radius = 100 + 550 * abs(math.sin(i / 400 * math.pi))
+        events = []
+        if i == 0:
+            events.append((EV_ABS, ABS_MT_TRACKING_ID, 1))
+        events += [
+            (EV_ABS, ABS_MT_POSITION_X, int(770 + radius * math.cos(angle))),
+            (EV_ABS, ABS_MT_POSITION_Y, int(750 + radius * math.sin(angle))),
+        ]
+        if i == 0:
+            events.append((EV_KEY, BTN_TOOL_FINGER, 1))
+        frames.append((timestamp, events))
+
+    frames.append((timestamp + FRAME_INTERVAL, [(EV_ABS, ABS_MT_TRACKING_ID, -1), (EV_KEY, BTN_TOOL_FINGER, 0)]))
+    return frames
+
+
+def tap_frames(frames_count):
+    """
+    Taps of 4 frames (down, 2 moves, up) in the center button.
+    """
+    frames = []
+    timestamp = 0
+
+    for i in range(frames_count // 4):
+        tracking_id = i % 65535
+        timestamp += FRAME_INTERVAL
+        frames.append((timestamp, [(EV_ABS, ABS_MT_TRACKING_ID, tracking_id), (EV_ABS, ABS_MT_POSITION_X, 770), (EV_ABS, ABS_MT_POSITION_Y, 750), (EV_KEY, BTN_TOOL_FINGER, 1)]))
+        for j in range(2):
+            timestamp += FRAME_INTERVAL
+            frames.append((timestamp, [(EV_ABS, ABS_MT_POSITION_X, 771 + j)]))
+        timestamp += FRAME_INTERVAL
+        frames.append((timestamp, [(EV_ABS, ABS_MT_TRACKING_ID, -1), (EV_KEY, BTN_TOOL_FINGER, 0)]))
+
+    return frames
+
+
+def gestures_per_second(frames):
+    def run():
+        gesture = DialGesture(layout, MAX_X, lambda *args: None, lambda: None, lambda enabled: None, lambda: True, num_slots=5)
+        process_frame = gesture.process_frame
+        for timestamp, events in frames:
+            process_frame(timestamp, events)
+
+    elapsed = best_of(run)
+    return len(frames) / elapsed
+
+
+def run(frames_count=100000):
+    return {
+        "gesture.spiral": result(gestures_per_second(spiral_frames(frames_count)), "frames/s"),
+        "gesture.taps": result(gestures_per_second(tap_frames(frames_count)), "frames/s"),
+        "gesture.resting_palm": result(gestures_per_second(spiral_frames(frames_count, palm=True)), "frames/s"),
+    }
+
+
+def main():
+    frames_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    for name, measurement in run(frames_count).items():
+        print(f"{name:24} {measurement['value']:12.0f} {measurement['unit']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+# Keymap resolution time on keymaps compiled locally by xkbcommon from RMLVO
+# names, no display is needed (only the xkeyboard-config data files)
+#
+# Usage: uv run python -m benchmarks.bench_keymap
+#
+# index - building KeymapIndex of the whole keymap (done once per keymap change)
+# resolve - looking up keysyms of the characters shortcuts use with their modifiers
+# uncached - what the driver does on a keymap change without a cache entry:
+#            dialpad.load_evdev_key_for_wayland() of every keysym it needs, incl. the index
+# cached - the same keymap change with the mapping read from the keymap cache file
+#          (dialpad.load_keymap_from_cache())
+#
+# uncached and cached need the libevdev library dialpad.py imports.
+
+import os
+import sys
+import tempfile
+
+from benchmarks.timing import best_of, result
+
+LAYOUTS = {
+    "us": ("us", ""),
+    "de": ("de", ""),
+    "cz": ("cz", "qwerty"),
+    "multi": ("us,de,cz", ",,qwerty"),
+}
+
+# keysym names as set_evdev_key_for_char() gets them
+CHARS = [str(i) for i in range(10)] + [chr(c) for c in range(ord('a'), ord('z') + 1)] + [
+    "BackSpace", "Return", "space", "period", "comma", "minus", "plus", "asterisk", "slash", "equal",
+    "parenleft", "parenright", "percent", "ecaron", "scaron", "adiaeresis", "odiaeresis", "ssharp",
+]
+
+
+def compile_keymap(layout, variant):
+    from xkbcommon import xkb
+
+    return xkb.Context().keymap_new_from_names(layout=layout, variant=variant)
+
+
+def resolve(keymap_index, xkb):
+    for char in CHARS:
+        for keycode, layout, level, mod_mask in keymap_index.lookup(xkb.keysym_from_name(char)):
+            keymap_index.mod_names_for_mask(mod_mask)
+
+
+def keymap_change(dialpad, name, keymap, cache_path):
+    """
+    Seconds of the keymap change without and with the keymap cache.
+    """
+    from keymap_cache import KeymapCache
+
+    dialpad.keyboard_state = keymap.state_new()
+    dialpad.gnome_current_layout_index = None
+    dialpad.set_defaults_keysym_name_associated_to_evdev_key_reflecting_current_layout()
+    # the unicode sequence and the characters of the shortcuts
+    dialpad.get_keysym_name_associated_to_evdev_key_reflecting_current_layout().update(dict.fromkeys(CHARS, ''))
+    keysym_names = list(dialpad.get_keysym_name_associated_to_evdev_key_reflecting_current_layout())
+    cache_key = dialpad.keymap_cache_key(name)
+
+    def uncached():
+        dialpad.keymap_index = None
+        for keysym_name in keysym_names:
+            dialpad.load_evdev_key_for_wayland(keysym_name, dialpad.keyboard_state)
+
+    def cached():
+        # read from the file as after a restart
+        dialpad.keymap_cache = KeymapCache(cache_path)
+        if not dialpad.load_keymap_from_cache(cache_key):
+            raise RuntimeError("keymap {} is not cached".format(name))
+
+    uncached_elapsed = best_of(uncached)
+    dialpad.keymap_cache = KeymapCache(cache_path)
+    dialpad.save_keymap_to_cache(cache_key)
+
+    return uncached_elapsed, best_of(cached)
+
+
+def import_dialpad():
+    from xkbcommon import xkb
+    from keymap_index import KeymapIndex
+
+    try:
+        import dialpad
+        dialpad.import_device_modules()
+    except (ImportError, OSError) as e:
+        print(f"keymap.uncached and keymap.cached skipped: {e}", file=sys.stderr)
+        return None
+
+    # what import_session_modules() imports in a Wayland session
+    dialpad.xkb = xkb
+    dialpad.KeymapIndex = KeymapIndex
+    return dialpad
+
+
+def run():
+    from xkbcommon import xkb
+    from keymap_index import KeymapIndex
+
+    dialpad = import_dialpad()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, (layout, variant) in LAYOUTS.items():
+            keymap = compile_keymap(layout, variant)
+
+            elapsed = best_of(lambda: KeymapIndex(keymap))
+            results["keymap.index_{}".format(name)] = result(elapsed * 1000, "ms")
+
+            keymap_index = KeymapIndex(keymap)
+            elapsed = best_of(lambda: resolve(keymap_index, xkb))
+            results["keymap.resolve_{}".format(name)] = result(len(CHARS) / elapsed, "chars/s")
+
+            if dialpad:
+                uncached, cached = keymap_change(dialpad, name, keymap, os.path.join(directory, "keymap_cache.json"))
+                results["keymap.uncached_{}".format(name)] = result(uncached * 1000, "ms")
+                results["keymap.cached_{}".format(name)] = result(cached * 1000, "ms")
+
+    return results
+
+
+def main():
+    for name, measurement in run().items():
+        print(f"{name:24} {measurement['value']:12.3f} {measurement['unit']}")
+
+
+if __name__ == "__main__":
+    main()
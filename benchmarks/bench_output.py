@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+
+# Cost of the output paths of the driver
+#
+# Usage: uv run python -m benchmarks.bench_output
+#
+# i2c - DialPadEngine.activate() (4 I2C writes) with an SMBus which accepts
+#       the messages without a bus, i.e. the Python side of the I2C path (needs smbus2)
+# uinput_key - key press and release by UinputKeySink.send_key() written to a pipe
+# uinput_text - compiled text macro by UinputKeySink.send_buffer() written to a pipe
+# recording_key - the same keys to RecordingKeySink, the cost of the sink interface alone
+# send_key_event - key press and release by dialpad.send_key_event() (trace, latency
+#                  and the sink) to a pipe, needs the libevdev library dialpad.py imports
+#
+# The pipe is drained by a thread, like the kernel takes the events of uinput.
+
+import os
+import sys
+import threading
+from types import SimpleNamespace
+
+from benchmarks.timing import best_of, result
+from discovery import InputDevice
+from hal import RecordingKeySink
+from keysink import UinputKeySink
+from macro import MacroCompiler
+
+ITERATIONS = 10000
+# typed by 12 key strokes and 2 unicode sequences
+TEXT = "Hello, World → ü"
+
+KEY_VOLUMEUP = SimpleNamespace(value=115, name="KEY_VOLUMEUP")
+# keysym name -> key code as MacroCompiler gets them from the driver (not the codes
+# of a real keymap, the cost does not depend on them)
+US_KEYS = dict(
+    {chr(c): 30 + i for i, c in enumerate(range(ord('a'), ord('z') + 1))},
+    **{str(i): 2 + (i - 1) % 10 for i in range(10)},
+    space=57, comma=51, Control_L=29, Shift_L=42,
+)
+
+
+class FakeSMBus:
+
+    def __init__(self, bus=None):
+        self.messages = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def open(self, bus):
+        pass
+
+    def close(self):
+        pass
+
+    def i2c_rdwr(self, *messages):
+        self.messages += len(messages)
+
+
+class DrainedPipe:
+    """
+    Write end of a pipe as the uinput file of UinputKeySink, whatever is written is read away.
+    """
+
+    def __init__(self):
+        read_fd, write_fd = os.pipe()
+        self.read_file = open(read_fd, 'rb', buffering=0)
+        self.write_file = open(write_fd, 'wb', buffering=0)
+        self.thread = threading.Thread(target=self.drain, daemon=True)
+        self.thread.start()
+
+    def drain(self):
+        while self.read_file.read(65536):
+            pass
+
+    def close(self):
+        self.write_file.close()
+        self.thread.join()
+        self.read_file.close()
+
+
+def us_keys(name):
+    # capital letters with Shift, as the keymap of the driver resolves them
+    if len(name) == 1 and name.isupper():
+        return [SimpleNamespace(value=US_KEYS['Shift_L']), SimpleNamespace(value=US_KEYS[name.lower()])]
+
+    return SimpleNamespace(value=US_KEYS[name]) if name in US_KEYS else ''
+
+
+def us_keysym_name(char):
+    return {' ': 'space', ',': 'comma'}.get(char, char)
+
+
+def time_keys(send_key):
+    def run():
+        for i in range(ITERATIONS):
+            send_key(KEY_VOLUMEUP, True)
+            send_key(KEY_VOLUMEUP, False)
+
+    return best_of(run) / ITERATIONS * 1000000
+
+
+def run_i2c():
+    import smbus2
+    import engine
+
+    dialpad_engine = engine.DialPadEngine(
+        InputDevice("ASUE1416:00 04F3:3227 Touchpad", 0, "/dev/input/event0", "", 1, "i2c-ASUE1416:00"),
+        None, None, None, None, None, lambda: True
+    )
+
+    def run():
+        for i in range(ITERATIONS):
+            dialpad_engine.activate()
+
+    # the controller imports SMBus when it sends
+    smbus = smbus2.SMBus
+    smbus2.SMBus = FakeSMBus
+    try:
+        return best_of(run) / ITERATIONS * 1000000
+    finally:
+        smbus2.SMBus = smbus
+
+
+def run_send_key_event(uinput_sink):
+    import dialpad
+    from libevdev import EV_KEY
+
+    key_sink = dialpad.key_sink
+    dialpad.key_sink = uinput_sink
+    try:
+        def run():
+            for i in range(ITERATIONS):
+                dialpad.send_key_event(EV_KEY.KEY_VOLUMEUP, True)
+                dialpad.send_key_event(EV_KEY.KEY_VOLUMEUP, False)
+
+        return best_of(run) / ITERATIONS * 1000000
+    finally:
+        dialpad.key_sink = key_sink
+
+
+def run():
+    results = {}
+
+    try:
+        results["output.i2c_activate"] = result(run_i2c(), "us")
+    except ImportError as e:
+        print(f"output.i2c_activate skipped: {e}", file=sys.stderr)
+
+    pipe = DrainedPipe()
+    try:
+        uinput_sink = UinputKeySink(None, pipe.write_file)
+        results["output.uinput_key"] = result(time_keys(uinput_sink.send_key), "us")
+
+        buffer = MacroCompiler(us_keys, us_keysym_name).compile(TEXT)
+        elapsed = best_of(lambda: [uinput_sink.send_buffer(buffer) for i in range(ITERATIONS // 10)])
+        results["output.uinput_text"] = result(elapsed / (ITERATIONS // 10) * 1000000, "us")
+
+        results["output.recording_key"] = result(time_keys(RecordingKeySink().send_key), "us")
+
+        try:
+            results["output.send_key_event"] = result(run_send_key_event(uinput_sink), "us")
+        except (ImportError, OSError) as e:
+            print(f"output.send_key_event skipped: {e}", file=sys.stderr)
+    finally:
+        pipe.close()
+
+    return results
+
+
+def main():
+    for name, measurement in run().items():
+        print(f"{name:24} {measurement['value']:12.3f} {measurement['unit']}")
+
+
+if __name__ == "__main__":
+    main()
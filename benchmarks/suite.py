@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+# Runs all benchmarks and stores the results as JSON for comparison between commits
+#
+# Usage: uv run python -m benchmarks.suite [--output FILE] [--compare FILE]
+#
+# Results go to benchmarks/results/<commit>.json by default. With --compare
+# every result is printed next to the one of the given file, "+" is better.
+# Benchmarks which need what is not installed (libevdev, xkbcommon) are skipped.
+
+import argparse
+import importlib
+import json
+import os
+import platform
+import subprocess
+import sys
+from time import strftime
+
+BENCHMARKS = (
+    "benchmarks.bench_evdev_reader",
+    "benchmarks.bench_gesture",
+    "benchmarks.bench_dispatch",
+    "benchmarks.bench_keymap",
+    "benchmarks.bench_output",
+)
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_benchmarks():
+    results = {}
+    skipped = {}
+
+    for name in BENCHMARKS:
+        print(f"{name}...", file=sys.stderr)
+        try:
+            results.update(importlib.import_module(name).run())
+        except (ImportError, OSError) as e:
+            print(f"{name} skipped: {e}", file=sys.stderr)
+            skipped[name] = str(e)
+
+    return results, skipped
+
+
+def change(value, previous, unit):
+    """
+    Relative change where positive is always better.
+    """
+    if not previous:
+        return 0
+
+    if unit.endswith("/s"):
+        return value / previous - 1
+
+    return previous / value - 1 if value else 0
+
+
+def print_results(results, previous=None):
+    for name, measurement in results.items():
+        line = f"{name:32} {measurement['value']:14.3f} {measurement['unit']:12}"
+        if previous and name in previous:
+            old = previous[name]["value"]
+            line += f" {old:14.3f} {change(measurement['value'], old, measurement['unit']) * 100:+7.1f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs all benchmarks and stores the results as JSON.")
+    parser.add_argument("--output", help="JSON file of the results (default benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="JSON file of previous results to compare with")
+    args = parser.parse_args()
+
+    commit = git_commit()
+    results, skipped = run_benchmarks()
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)["results"]
+
+    print_results(results, previous)
+
+    output = args.output or os.path.join(RESULTS_DIR, commit + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "commit": commit,
+            "date": strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "results": results,
+            "skipped": skipped,
+        }, f, indent=2)
+
+    print(f"Results written to {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+
+# Helpers shared by the benchmarks
+
+import gc
+from time import perf_counter
+
+
+def best_of(run, repeat=5):
+    """
+    Fastest of repeat calls of run() in seconds, with the garbage collector off while timing.
+    """
+    best = None
+    gc.collect()
+    gc.disable()
+    try:
+        for i in range(repeat):
+            start = perf_counter()
+            run()
+            elapsed = perf_counter() - start
+            if best is None or elapsed < best:
+                best = elapsed
+    finally:
+        gc.enable()
+
+    return best
+
+
+def result(value, unit):
+    """
+    One measurement as stored by benchmarks.suite, a unit ending with "/s" means higher is better.
+    """
+    return {"value": value, "unit": unit}
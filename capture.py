@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+
+import os
+import struct
+import tempfile
+import threading
+from time import strftime, time
+
+CAPTURE_MAGIC = b'DPCAPT01'
+# magic, wall clock time of the start
+CAPTURE_HEADER = struct.Struct('<8sd')
+# kind, source, timestamp, count of what follows
+CAPTURE_RECORD = struct.Struct('<BBdH')
+# type, code, value
+CAPTURE_EVENT = struct.Struct('<HHi')
+# max x, slots, slices count, activation time, enabled, followed by count bytes of the name
+CAPTURE_TOUCHPAD = struct.Struct('<iiifB')
+# slices count, activation time, enabled
+CAPTURE_STATE = struct.Struct('<ifB')
+# current slot, followed by count times code and the value of every slot
+CAPTURE_RESYNC = struct.Struct('<i')
+CAPTURE_RESYNC_CODE = struct.Struct('<H')
+
+# Records
+CAPTURE_KIND_TOUCHPAD = 1  # a touchpad the following records of the source belong to
+CAPTURE_KIND_FRAME = 2  # count events of one frame, the SYN_REPORT is left out
+CAPTURE_KIND_RESYNC = 3  # touch state re-read from the device (start, events dropped by kernel)
+CAPTURE_KIND_STATE = 4  # config or the DialPad enabled state has changed
+CAPTURE_KIND_KEYBOARD = 5  # modifier key events of the keyboard
+
+KEYBOARD_SOURCE = 0
+
+
+def capture_path():
+    directory = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    return os.path.join(directory, 'asus-dialpad-driver-capture-{}-{}.bin'.format(os.getpid(), strftime('%Y%m%d-%H%M%S')))
+
+
+class CaptureWriter:
+    """
+    Records what the touchpads and the keyboard have sent to a compact binary file,
+    replayed by "python -m replay FILE".
+
+    Only frames as the gesture engine gets them (kernel timestamps included) and
+    the state needed to process them the same way are written. From the keyboard
+    only the modifiers of the layout shortcuts are recorded, never other keys.
+
+    Records of several threads are serialized by a lock.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or capture_path()
+        self.lock = threading.Lock()
+        self.sources_count = KEYBOARD_SOURCE
+        self.records_count = 0
+
+        self.file = open(self.path, 'wb')
+        self.file.write(CAPTURE_HEADER.pack(CAPTURE_MAGIC, time()))
+
+    def write(self, kind, source, timestamp, count, data=b''):
+        with self.lock:
+            if self.file is None:
+                return
+
+            self.file.write(CAPTURE_RECORD.pack(kind, source, timestamp, count))
+            self.file.write(data)
+            self.records_count += 1
+
+    def add_touchpad(self, timestamp, name, max_x, num_slots, slices_count, activation_time, enabled):
+        """
+        Returns the CaptureSource the records of the touchpad are written by.
+        """
+        with self.lock:
+            self.sources_count += 1
+            source = self.sources_count
+
+        name = name.encode()[:255]
+        self.write(CAPTURE_KIND_TOUCHPAD, source, timestamp, len(name), CAPTURE_TOUCHPAD.pack(max_x, num_slots, slices_count, activation_time, enabled) + name)
+        return CaptureSource(self, source)
+
+    def keyboard(self, timestamp, type_, code, value):
+        self.write(CAPTURE_KIND_KEYBOARD, KEYBOARD_SOURCE, timestamp, 1, CAPTURE_EVENT.pack(type_, code, value))
+
+    def close(self):
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.file = None
+
+
+class CaptureSource:
+    """
+    Records of one touchpad of a CaptureWriter.
+    """
+
+    def __init__(self, writer, source):
+        self.writer = writer
+        self.source = source
+
+    def frame(self, timestamp, events):
+        data = b''.join([CAPTURE_EVENT.pack(type_, code, value) for type_, code, value in events])
+        self.writer.write(CAPTURE_KIND_FRAME, self.source, timestamp, len(events), data)
+
+    def resync(self, timestamp, slot, slot_values):
+        data = [CAPTURE_RESYNC.pack(slot)]
+        for code, values in slot_values.items():
+            data.append(CAPTURE_RESYNC_CODE.pack(code))
+            data.append(struct.pack('<{}i'.format(len(values)), *values))
+        self.writer.write(CAPTURE_KIND_RESYNC, self.source, timestamp, len(slot_values), b''.join(data))
+
+    def state(self, timestamp, slices_count, activation_time, enabled):
+        self.writer.write(CAPTURE_KIND_STATE, self.source, timestamp, 0, CAPTURE_STATE.pack(slices_count, activation_time, enabled))
+
+
+def read_capture(path):
+    """
+    Yields records of a capture as (kind, source, timestamp, payload) where payload is
+    TOUCHPAD - (name, max_x, num_slots, slices_count, activation_time, enabled)
+    FRAME - [(type, code, value), ...]
+    RESYNC - (slot, {code: [value of every slot]})
+    STATE - (slices_count, activation_time, enabled)
+    KEYBOARD - (type, code, value)
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    if len(data) < CAPTURE_HEADER.size or CAPTURE_HEADER.unpack_from(data)[0] != CAPTURE_MAGIC:
+        raise ValueError("{} is not a DialPad capture".format(path))
+
+    num_slots = {}
+    offset = CAPTURE_HEADER.size
+    # a capture of a driver which was killed can end in the middle of a record
+    while offset + CAPTURE_RECORD.size <= len(data):
+        try:
+            kind, source, timestamp, count = CAPTURE_RECORD.unpack_from(data, offset)
+            offset += CAPTURE_RECORD.size
+
+            if kind == CAPTURE_KIND_TOUCHPAD:
+                max_x, slots, slices_count, activation_time, enabled = CAPTURE_TOUCHPAD.unpack_from(data, offset)
+                offset += CAPTURE_TOUCHPAD.size
+                name = data[offset:offset + count].decode(errors='replace')
+                offset += count
+                num_slots[source] = slots
+                payload = (name, max_x, slots, slices_count, activation_time, bool(enabled))
+            elif kind == CAPTURE_KIND_FRAME:
+                payload = list(CAPTURE_EVENT.iter_unpack(data[offset:offset + count * CAPTURE_EVENT.size]))
+                offset += count * CAPTURE_EVENT.size
+            elif kind == CAPTURE_KIND_RESYNC:
+                slot, = CAPTURE_RESYNC.unpack_from(data, offset)
+                offset += CAPTURE_RESYNC.size
+                values_format = struct.Struct('<{}i'.format(num_slots.get(source, 1)))
+                slot_values = {}
+                for i in range(count):
+                    code, = CAPTURE_RESYNC_CODE.unpack_from(data, offset)
+                    offset += CAPTURE_RESYNC_CODE.size
+                    slot_values[code] = list(values_format.unpack_from(data, offset))
+                    offset += values_format.size
+                payload = (slot, slot_values)
+            elif kind == CAPTURE_KIND_STATE:
+                slices_count, activation_time, enabled = CAPTURE_STATE.unpack_from(data, offset)
+                offset += CAPTURE_STATE.size
+                payload = (slices_count, activation_time, bool(enabled))
+            elif kind == CAPTURE_KIND_KEYBOARD:
+                payload = CAPTURE_EVENT.unpack_from(data, offset)
+                offset += CAPTURE_EVENT.size
+            else:
+                raise ValueError("{} has an unknown record {} at {}".format(path, kind, offset - CAPTURE_RECORD.size))
+        except struct.error:
+            break
+
+        if offset > len(data):
+            break
+
+        yield kind, source, timestamp, payload
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+import logging
+import os
+import socket
+import sys
+import tempfile
+
+log = logging.getLogger('asus-dialpad-driver')
+
+CONTROL_SOCKET_NAME = 'asus-dialpad-driver.sock'
+CONTROL_MAX_COMMAND_SIZE = 4096
+
+
+def control_socket_path():
+    # own socket of a driver which is not the one of the session (python -m selftest)
+    if os.environ.get('DIALPAD_CONTROL_SOCKET'):
+        return os.environ['DIALPAD_CONTROL_SOCKET']
+
+    return os.path.join(os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir(), CONTROL_SOCKET_NAME)
+
+
+class ControlServer:
+    """
+    Local control socket of the running driver, one text command per connection.
+
+    A command is a line "name arg1 arg2 ...", the reply is whatever the handler
+    returns followed by closing the connection. Only the user running the driver
+    can connect (the socket is created with 0600 permissions).
+    """
+
+    def __init__(self, path=None):
+        self.path = path or control_socket_path()
+        self.commands = {}
+        self.socket = None
+        self.register("help", self.help, "list of commands")
+
+    def register(self, name, handler, description):
+        """
+        handler(args) gets a list of the arguments and returns the reply text.
+        """
+        self.commands[name] = (handler, description)
+
+    def help(self, args):
+        return "\n".join("{} - {}".format(name, description) for name, (handler, description) in sorted(self.commands.items()))
+
+    def open(self):
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM | socket.SOCK_CLOEXEC)
+        umask = os.umask(0o077)
+        try:
+            self.socket.bind(self.path)
+        finally:
+            os.umask(umask)
+        self.socket.listen(4)
+        self.socket.settimeout(1)
+
+    def handle(self, line):
+        parts = line.split()
+        if not parts:
+            return self.help([])
+
+        command = self.commands.get(parts[0])
+        if command is None:
+            return "unknown command {}, try help".format(parts[0])
+
+        try:
+            return command[0](parts[1:])
+        except Exception as e:
+            log.exception("Control command %s failed", parts[0])
+            return "error: {}".format(e)
+
+    def serve(self, is_stopped):
+        """
+        Handles connections until is_stopped() returns True.
+        """
+        while not is_stopped():
+            try:
+                connection, address = self.socket.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                # closed
+                break
+
+            with connection:
+                connection.settimeout(1)
+                try:
+                    line = connection.recv(CONTROL_MAX_COMMAND_SIZE).decode(errors='replace').strip()
+                    connection.sendall(self.handle(line).encode() + b'\n')
+                except OSError as e:
+                    log.debug("Control connection failed: %s", e)
+
+    def close(self):
+        if self.socket:
+            self.socket.close()
+            self.socket = None
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+
+def send_command(line, path=None):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(path or control_socket_path())
+        s.sendall(line.encode())
+        s.shutdown(socket.SHUT_WR)
+
+        reply = b''
+        while True:
+            data = s.recv(65536)
+            if not data:
+                break
+            reply += data
+
+    return reply.decode(errors='replace')
+
+
+if __name__ == "__main__":
+    try:
+        print(send_command(" ".join(sys.argv[1:]) or "help"), end="")
+    except OSError as e:
+        print("Driver is not running or its control socket {} is not available: {}".format(control_socket_path(), e))
+        sys.exit(1)
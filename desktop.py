@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+
+# Desktop session calls of the driver - focused window, touchpad toggling and
+# GNOME input sources (Xlib, qdbus, kdotool, gsettings, xinput, synclient,
+# setxkbmap)
+#
+# Used by the core (dialpad.py) while no desktop agent is connected and by the
+# agent (agent.py). Imports nothing of evdev, uinput or I2C, the agent runs
+# without them.
+
+import ast
+import logging
+import os
+import re
+import subprocess
+import sys
+
+from input_sources import InputSourcesWatcher
+
+log = logging.getLogger('asus-dialpad-driver')
+
+xdg_session_type = None
+# X11 only
+display = None
+display_var = None
+# Wayland only
+display_wayland_var = None
+
+# only to avoid first - x11 only
+gnome_current_layout = None
+gnome_current_layout_index = None
+
+gsettings_failure_count = 0
+gsettings_max_failure_count = 1
+
+qdbus_failure_count = 0
+qdbus_max_failure_count = 1
+
+kdotool_failure_count = 0
+kdotool_max_failure_count = 1
+
+gnome_failure_count = 0
+gnome_max_failure_count = 1
+
+xinput_failure_count = 0
+xinput_max_failure_count = 1
+
+synclient_status_failure_count = 0
+synclient_status_max_failure_count = 1
+
+def use_session(session_type, x11_display=None, x11_display_var=None, wayland_display_var=None):
+    """
+    Session the caller already connected to (the core shares its X11 display).
+    """
+    global xdg_session_type, display, display_var, display_wayland_var
+
+    xdg_session_type = session_type
+    display = x11_display
+    display_var = x11_display_var
+    display_wayland_var = wayland_display_var
+
+def connect_session():
+    """
+    Detects the session and connects to the X11 display, Wayland needs no connection.
+    """
+    session_type = os.environ.get('XDG_SESSION_TYPE')
+    if not session_type:
+        log.error("XDG session type is not set. Exiting.")
+        sys.exit(1)
+
+    if session_type == "x11":
+        import Xlib.display
+
+        try:
+            x11_display_var = os.environ.get('DISPLAY')
+            use_session(session_type, Xlib.display.Display(x11_display_var), x11_display_var)
+            log.info("X11 session detected and connected.")
+        except Exception as e:
+            log.error(f"Failed to connect to X11 display: {e}")
+            sys.exit(1)
+    else:
+        use_session(session_type, wayland_display_var=os.environ.get('WAYLAND_DISPLAY'))
+        log.info("Wayland session detected.")
+
+def get_window_kde_wayland_title(window_id):
+    try:
+        cmd = ['qdbus', 'org.kde.KWin', f'/org/kde/KWin/Window/{window_id}', 'org.kde.KWin.Window.caption']
+        output = subprocess.check_output(cmd).decode().strip()
+        return output
+    except Exception as e:
+        log.error("Error getting KDE window title: %s", e)
+        return None
+
+def get_active_window_kde_wayland_title_using_qdbus():
+    global qdbus_failure_count, qdbus_max_failure_count
+
+    if qdbus_failure_count >= qdbus_max_failure_count:
+        return None
+
+    try:
+        cmd = ['qdbus', 'org.kde.KWin', '/KWin', 'org.kde.KWin.activeWindow']
+        output = subprocess.check_output(cmd).decode().strip()
+        match = re.search(r"(\d+)", output)
+        if match:
+            window_id = match.group(1)
+            return get_window_kde_wayland_title(window_id)
+    except Exception as e:
+        qdbus_failure_count += 1
+        log.error("QDbus KDE title fetch failed (%d/%d): %s", qdbus_failure_count, qdbus_max_failure_count, e)
+        return None
+
+def get_active_window_kde_wayland_title_using_kdotool():
+    global kdotool_failure_count, kdotool_max_failure_count
+
+    if kdotool_failure_count >= kdotool_max_failure_count:
+        return None
+
+    try:
+        window_uuid = subprocess.check_output(['kdotool', 'getactivename']).decode().strip()
+        title = subprocess.check_output(['kdotool', 'getwindowname', window_uuid]).decode().strip()
+        return title
+    except Exception as e:
+        kdotool_failure_count += 1
+        log.error("Kdotool title fetch failed (%d/%d): %s", kdotool_failure_count, kdotool_max_failure_count, e)
+        return None
+
+def get_active_window_gnome_wayland_title():
+    global gnome_failure_count, gnome_max_failure_count
+
+    if gnome_failure_count >= gnome_max_failure_count:
+        return None
+
+    try:
+        from pydbus import SessionBus
+
+        shell = SessionBus().get('org.gnome.Shell', '/org/gnome/Shell')
+        active_window = shell.Get('org.gnome.Shell', 'focusWindow')
+        return active_window.get('title', None)
+    except Exception as e:
+        gnome_failure_count += 1
+        log.error("GNOME window title fetch failed (%d/%d): %s", gnome_failure_count, gnome_max_failure_count, e)
+        return None
+
+def get_active_window_title():
+    if xdg_session_type == "x11" and display:
+        from Xlib.X import AnyPropertyType
+
+        try:
+            root = display.screen().root
+            window_id = root.get_full_property(display.intern_atom('_NET_ACTIVE_WINDOW'), AnyPropertyType).value[0]
+            window = display.create_resource_object('window', window_id)
+            window_name = window.get_full_property(display.intern_atom('_NET_WM_NAME'), AnyPropertyType)
+            return window_name.value.decode() if window_name else None
+        except Exception as e:
+            log.error("Error retrieving active window title (X11): %s", e)
+            return None
+    else:
+        kde_title = get_active_window_kde_wayland_title_using_qdbus()
+        if kde_title:
+            return kde_title
+
+        kde_title = get_active_window_kde_wayland_title_using_kdotool()
+        if kde_title:
+            return kde_title
+
+        gnome_title = get_active_window_gnome_wayland_title()
+        if gnome_title:
+            return gnome_title
+
+    log.error("Unsupported session type or display not connected.")
+    return None
+
+def qdbusSet(cmd):
+    global qdbus_failure_count, qdbus_max_failure_count
+
+    if qdbus_failure_count < qdbus_max_failure_count:
+        try:
+            subprocess.call(cmd)
+        except Exception as e:
+            log.debug(e, exc_info=True)
+            qdbus_failure_count+=1
+    else:
+        log.debug('Qdbus failed more than: "%s" so is not trying anymore', qdbus_max_failure_count)
+
+def qdbusSetTouchpadEnabled(value, engine):
+    cmd = [
+        'qdbus',
+        'org.kde.KWin',
+        f'/org/kde/KWin/InputDevice/event{engine.input_device.event}',
+        'org.freedesktop.DBus.Properties.Set',
+        'org.kde.KWin.InputDevice',
+        'enabled',
+        str(bool(value)).lower()
+    ]
+    qdbusSet(cmd)
+
+def gsettingsSet(path, name, value):
+    global gsettings_failure_count, gsettings_max_failure_count
+
+    if gsettings_failure_count < gsettings_max_failure_count:
+        try:
+            sudo_user = os.environ.get('SUDO_USER')
+            if sudo_user is not None:
+                cmd = ['runuser', '-u', sudo_user, 'gsettings', 'set', path, name, str(value)]
+            else:
+                cmd = ['gsettings', 'set', path, name, str(value)]
+
+            log.debug(cmd)
+            subprocess.call(cmd)
+        except Exception as e:
+            log.debug(e, exc_info=True)
+            gsettings_failure_count+=1
+    else:
+        log.debug('Gsettings failed more than: "%s" so is not trying anymore', gsettings_max_failure_count)
+
+def gsettingsGet(path, name):
+    global gsettings_failure_count, gsettings_max_failure_count
+
+    if gsettings_failure_count < gsettings_max_failure_count:
+        try:
+            cmd = ['gsettings', 'get', path, name]
+            result = subprocess.check_output(cmd).rstrip()
+            return result
+        except Exception as e:
+            log.debug(e, exc_info=True)
+            gsettings_failure_count+=1
+    else:
+        log.debug('Gsettings failed more then: \"%s\" so is not try anymore', gsettings_max_failure_count)
+
+def gsettingsSetTouchpadSendEvents(value):
+    gsettingsSet('org.gnome.desktop.peripherals.touchpad', 'send-events', 'enabled' if value else 'disabled')
+
+def set_touchpad_prop_send_events(engine, value):
+    """
+    engine - anything with name and input_device.event of the touchpad
+    """
+    global xinput_failure_count, synclient_status_failure_count
+
+    # 1. priority - gsettings (gnome) or qdbus (kde)
+    if gsettings_failure_count < gsettings_max_failure_count:
+        gsettingsSetTouchpadSendEvents(value)
+    if qdbus_failure_count < qdbus_max_failure_count:
+        qdbusSetTouchpadEnabled(value, engine)
+
+    # 2. priority - xinput
+    if xinput_failure_count > xinput_max_failure_count:
+        log.debug('Setting libinput Send Events via xinput failed more than: "%s" times so is not trying anymore', xinput_max_failure_count)
+    else:
+        try:
+            cmd = ["xinput", "enable" if value else "disable", engine.name]
+            log.debug(cmd)
+            subprocess.call(cmd)
+            return
+        except:
+            xinput_failure_count+=1
+            log.error('Setting libinput Send Events via xinput failed')
+
+    # 3. priority - synclient
+    if synclient_status_failure_count > synclient_status_max_failure_count:
+        log.debug('Setting libinput Send Events via synclient failed more than: "%s" times so is not trying anymore', xinput_max_failure_count)
+    try:
+        cmd = ["synclient", "TouchpadOff=" + str(value)]
+        log.debug(cmd)
+        subprocess.call(cmd)
+        return
+    except:
+        synclient_status_failure_count+=1
+
+def update_gnome_layout(on_wayland_layout):
+    """
+    Reads the current GNOME input source, on_wayland_layout(index, layout) loads it on Wayland, setxkbmap on X11.
+    """
+    global gnome_current_layout, gnome_current_layout_index
+
+    mru_sources = gsettingsGet('org.gnome.desktop.input-sources', 'mru-sources')
+    try:
+      mru_sources_evaluated = ast.literal_eval(mru_sources.decode())
+    except:
+      mru_sources_evaluated = []
+
+    sources = gsettingsGet('org.gnome.desktop.input-sources', 'sources')
+    try:
+      sources_evaluated = ast.literal_eval(sources.decode())
+    except:
+      sources_evaluated = []
+
+    if len(mru_sources_evaluated) > 0:
+
+        mru_layout_index = sources_evaluated.index(mru_sources_evaluated[0])
+        mru_layout = mru_sources_evaluated[0][1].split("+")[0]
+
+        if display_wayland_var:
+            on_wayland_layout(mru_layout_index, mru_layout)
+
+        elif gnome_current_layout != mru_layout:
+
+                try:
+                    cmd = ['setxkbmap', mru_layout, '-display', display_var]
+
+                    log.debug(cmd)
+                    subprocess.call(cmd)
+
+                    gnome_current_layout = mru_layout
+                    gnome_current_layout_index =  mru_layout_index
+                except:
+                    log.exception('setxkbmap set failed')
+
+    else:
+
+        current = gsettingsGet('org.gnome.desktop.input-sources', 'current')
+
+        current_evaluated = None
+        try:
+          current_evaluated = ast.literal_eval(current.decode().split(" ")[1])
+        except:
+          pass
+
+        if current_evaluated is not None and current_evaluated < len(sources_evaluated):
+            layout = sources_evaluated[current_evaluated][1].split("+")[0]
+
+            # first run, would be unnecessary duplicated loading x11 keymap because X.org server notify all clients at start about Mapping and setxkbmap would trigger new second notify
+            if gnome_current_layout == None:
+                gnome_current_layout = layout
+
+            elif gnome_current_layout != layout:
+
+                try:
+                    cmd = ['setxkbmap', layout, '-display', display_var]
+
+                    log.debug(cmd)
+                    subprocess.call(cmd)
+
+                    gnome_current_layout = layout
+                except:
+                    log.exception('setxkbmap set failed')
+
+def check_gnome_layout(update_layout, is_stopped):
+    """
+    Follows the GNOME input sources until is_stopped() returns True, update_layout() runs now and as soon as dconf reports a change.
+    """
+    update_layout()
+
+    InputSourcesWatcher(update_layout).run(is_stopped)
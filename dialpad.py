@@ -1,42 +1,67 @@
 #!/usr/bin/env python3
 
-import logging
 import os
-import importlib
 import sys
+from time import monotonic, sleep, time
+
+# for reporting time from launch to the first handled gesture
+launch_time = monotonic()
+
+from startup_profile import StartupProfile
+
+# STARTUP_PROFILE=1 - set up before the other imports so they are timed too
+startup_profile = StartupProfile.from_environment()
+
+import logging
+import importlib
 import threading
-from time import sleep, time
-import Xlib.display
-import Xlib.X
-import Xlib.XK
-from xkbcommon import xkb
-from libevdev import EV_ABS, EV_KEY, EV_LED, EV_MSC, EV_SYN, Device, InputEvent, const, device
-from pyinotify import WatchManager, IN_CLOSE_WRITE, IN_IGNORED, IN_MOVED_TO, AsyncNotifier
-from smbus2 import SMBus, i2c_msg
+import selectors
+from collections import deque
+from queue import Empty, SimpleQueue
+from contextlib import nullcontext
+from engine import DialPadEngine
+from service import ServiceNotifier, setup_logging
+from tracebuffer import TRACE_KEY_PRESS, TRACE_KEY_RELEASE, TraceBuffer
+from latency import STAGE_FRAME_TO_DECISION, STAGE_KERNEL_TO_SENT, STAGE_SEND_EVENTS, LatencyStats
+from control import ControlServer
+from agent_link import AgentLink
+import desktop
+from focus_watch import FocusWatcher
+from capture import CaptureWriter
+from dispatch import ShortcutDispatcher
+from keysink import UinputKeySink, is_keyboard_key, open_uinput
+from macro import MacroCompiler
+from hal import FakeDialPadController
+from profiler import MODE_CPROFILE, MODE_SAMPLE, RuntimeProfiler
+from realtime import DEFAULT_NICE, DEFAULT_PRIORITY, FrameJitter, RealtimeMode, parse_cpus, parse_gc_threshold
+from keymap_cache import KeymapCache, digest as keymap_digest
+from readiness import wait_for_change, wait_for_udev_device
+from discovery import UeventMonitor, find_keyboard, find_touchpads, read_input_devices, uevent_input_device
 from typing import Optional
-import re
-import math
-from pywayland.client import Display
-from pywayland.protocol.wayland import WlSeat
-import subprocess
 import configparser
-import ast
-from xkbcommon import xkb
 import signal
 import mmap
 
-# Logging setup
-logging.basicConfig(
-    format='%(asctime)s %(levelname)s %(message)s',
-    level=os.environ.get('LOG', 'INFO')
-)
+# Session specific modules, imported by import_session_modules()
+# (X11 session never loads pywayland and xkbcommon, Wayland session never loads Xlib)
+Xlib = None
+xkb = None
+Display = None
+WlSeat = None
+KeymapIndex = None
+
+# Modules of the devices and the config watching, imported by import_device_modules()
+# (the replay and the benchmarks import this file without them)
+EV_KEY = None
+Device = None
+device = None
+WatchManager = None
+Notifier = None
+IN_CLOSE_WRITE = IN_IGNORED = IN_MOVED_TO = None
+
 log = logging.getLogger('asus-dialpad-driver')
 
-# Detect session type
-xdg_session_type = os.environ.get('XDG_SESSION_TYPE')
-if not xdg_session_type:
-    log.error("XDG session type is not set. Exiting.")
-    sys.exit(1)
+xdg_session_type = None
 
 # Setup display for X11
 display = None
@@ -44,165 +69,52 @@ display_var = None
 display_wayland = None
 display_wayland_var = None
 keymap_loaded = False
+keymap_loaded_event = threading.Event()
 listening_touchpad_events_started = False
 active_modifiers = set()
 modifiers = set()
 
-if xdg_session_type == "x11":
-    try:
-        display_var = os.environ.get('DISPLAY')
-        display = Xlib.display.Display(display_var)
-        log.info("X11 session detected and connected.")
-    except Exception as e:
-        log.error(f"Failed to connect to X11 display: {e}")
-        sys.exit(1)
-else:
-    try:
-        display_wayland_var = os.environ.get('WAYLAND_DISPLAY')
-        display_wayland = Display(display_wayland_var)
-        display_wayland.connect()
-        log.info("Wayland session detected and connected.")
-    except Exception as e:
-        log.error(f"Failed to connect to Wayland display: {e}")
-        sys.exit(1)
-
 dialpad: bool = False
 
 # DialPad layout model
 model = None
-if len(sys.argv) > 1:
-    model = sys.argv[1]
-try:
-    model_layout = importlib.import_module('layouts.' + model)
-except:
-    log.error("DialPad layout *.py from dir layouts is required as first argument. Re-run install script or add missing first argument (valid value is default).")
-    sys.exit(1)
+model_layout = None
 
 # Config file dir
 config_file_dir = ""
-if len(sys.argv) > 2:
-    config_file_dir = sys.argv[2]
-# When is given config dir empty or is used default -> to ./ because inotify needs check folder (nor nothing = "")
-if config_file_dir == "":
-     config_file_dir = "./"
-
-# Layout
-circle_diameter = getattr(model_layout, "circle_diameter", 0)
-center_button_diameter = getattr(model_layout, "center_button_diameter", 0)
-circle_center_x = getattr(model_layout, "circle_center_x", 0)
-circle_center_y = getattr(model_layout, "circle_center_y", 0)
-top_right_icon_width = getattr(model_layout, "top_right_icon_width", 0)
-top_right_icon_height = getattr(model_layout, "top_right_icon_height", 0)
 
 # App-specific configuration (add more mappings as needed)
-app_shortcuts = getattr(model_layout, "app_shortcuts", {})
-
-# Figure out devices from devices file
-touchpad: Optional[str] = None
-touchpad_name: Optional[str] = None
-device_id: Optional[str] = None
-keyboard_device_id: Optional[str] = None
-device_addr: Optional[int] = None
-keyboard: Optional[str] = None
-
-# Constants
-try_times = 5
-try_sleep = 0.1
-
-# Look into the devices file #
-while try_times > 0:
-
-    touchpad_detected = 0
-    keyboard_detected = 0
-
-    with open('/proc/bus/input/devices', 'r') as f:
-        lines = f.readlines()
-        for line in lines:
-            # Look for the touchpad #
-
-            # https://github.com/mohamed-badaoui/asus-touchpad-numpad-driver/issues/87
-            # https://github.com/asus-linux-drivers/asus-numberpad-driver/issues/95
-            # https://github.com/asus-linux-drivers/asus-numberpad-driver/issues/110
-            # https://github.com/asus-linux-drivers/asus-numberpad-driver/issues/161
-            # https://github.com/asus-linux-drivers/asus-numberpad-driver/issues/198
-            if (touchpad_detected == 0 and ("Name=\"ASUE" in line or "Name=\"ELAN" in line or "Name=\"ASUP" or "Name=\"ASUF" or "Name=\"ASCE" or "Name=\"ASCF" or "Name=\"ASCP" in line) and "Touchpad" in line and not "9009" in line):
-                touchpad_detected = 1
-                log.info('Detecting touchpad from string: \"%s\"', line.strip())
-                touchpad_name = line.split("\"")[1]
-
-                # https://github.com/asus-linux-drivers/asus-numberpad-driver/issues/161
-                if ("ASUF1416" in line or "ASUF1205" in line or "ASUF1204" in line):
-                  device_addr = 0x38
-                else:
-                  device_addr = 0x15
-
-            if touchpad_detected == 1:
-                if "S: " in line:
-                    # search device id
-                    device_id = re.sub(r".*i2c-(\d+)/.*$", r'\1', line).replace("\n", "")
-                    log.info('Set touchpad device id %s from %s', device_id, line.strip())
-
-                if "H: " in line:
-                    touchpad = line.split("event")[1]
-                    touchpad = touchpad.split(" ")[0]
-                    touchpad_detected = 2
-                    log.info('Set touchpad id %s from %s', touchpad, line.strip())
-
-            # Look for the keyboard
-            if keyboard_detected == 0 and ("Name=\"AT Translated Set 2 keyboard" in line or (("Name=\"ASUE" in line or "Name=\"Asus" in line or "Name=\"ASUP" in line or "Name=\"ASUF" in line) and "Keyboard" in line)):
-                keyboard_detected = 1
-                log.info(
-                    'Detecting keyboard from string: \"%s\"', line.strip())
-
-            # We look for keyboard
-            if keyboard_detected == 1 and "H: " in line:
-                keyboard = line.split("event")[1]
-                keyboard = keyboard.split(" ")[0]
-                keyboard_detected = 2
-                log.info('Set keyboard id %s from %s', keyboard, line.strip())
-
-              # Do not stop looking if touchpad and keyboard have been found
-            # because more drivers can be installed
-            # https://github.com/mohamed-badaoui/asus-touchpad-numpad-driver/issues/87
-            # https://github.com/asus-linux-drivers/asus-numberpad-driver/issues/95
-            #if touchpad_detected == 2 and keyboard_detected == 2:
-            #    break
-
-    if touchpad_detected != 2 or keyboard_detected != 2:
-        try_times -= 1
-        if try_times == 0:
-            with open('/proc/bus/input/devices', 'r') as f:
-                lines = f.readlines()
-                for line in lines:
-                    log.error(line)
-            if keyboard_detected != 2:
-                log.error("Can't find keyboard (code: %s)", keyboard_detected)
-                # keyboard is optional, no sys.exit(1)!
-            if touchpad_detected != 2:
-                log.error("Can't find touchpad (code: %s)", touchpad_detected)
-                sys.exit(1)
-            if touchpad_detected == 2 and not device_id.isnumeric():
-                log.error("Can't find device id")
-                sys.exit(1)
-    else:
-        break
+app_shortcuts = {}
+dispatcher = None
 
-    sleep(try_sleep)
+# One engine per attached DialPad
+engines = []
+# devnodes of new touchpads prepared by attach threads, attached by the touchpad events loop
+touchpads_being_attached = set()
+keyboard: Optional[str] = None
 
-# Open a handle to "/dev/i2c-x", representing the I2C bus
-try:
-    bus = SMBus()
-    bus.open(int(device_id))
-    bus.close()
-except:
-    log.error("Can't open the I2C bus connection (id: %s)", device_id)
-    sys.exit(1)
+# how long to wait for a touchpad at start
+DEVICES_WAIT_TIMEOUT = 0.5
+# how long to wait for udev to set up a re-attached device
+DEVICE_READY_TIMEOUT = 1
+# notified by the touchpad events loop when is an input device added
+input_devices_changed = threading.Condition()
 
 # App-specific configuration (add more mappings as needed)
 
 
 # Initialize the virtual device globally
 uinput_device = None
+# how many times the virtual device was re-created
+uinput_device_generation = 0
+# keys of the shortcuts go there (hal.KeySink), the virtual device once it is created
+key_sink = None
+# texts of the {"text": ...} shortcuts, their input_event structs compiled for the current keymap
+macro_texts = set()
+macro_buffers = {}
+macro_compiler = None
+# upper limit of waiting for udev to announce the virtual device
+UINPUT_READY_TIMEOUT = 0.5
 
 # Config
 CONFIG_FILE_NAME = "dialpad_dev"
@@ -219,24 +131,58 @@ CONFIG_ACTIVATION_TIME = "activation_time"
 CONFIG_ACTIVATION_TIME_DEFAULT = True
 CONFIG_SUPPRESS_APP_SPECIFICS_SHORTCUTS = "config_supress_app_specifics_shortcuts"
 CONFIG_SUPPRESS_APP_SPECIFICS_SHORTCUTS_DEFAULT = False
-
-config_file_path = config_file_dir + CONFIG_FILE_NAME
+CONFIG_RAW_EVENT_READER = "raw_event_reader"
+CONFIG_RAW_EVENT_READER_DEFAULT = True
+CONFIG_REALTIME = "realtime"
+CONFIG_REALTIME_DEFAULT = False
+CONFIG_REALTIME_PRIORITY = "realtime_priority"
+CONFIG_REALTIME_PRIORITY_DEFAULT = DEFAULT_PRIORITY
+CONFIG_REALTIME_NICE = "realtime_nice"
+CONFIG_REALTIME_NICE_DEFAULT = DEFAULT_NICE
+CONFIG_REALTIME_CPUS = "realtime_cpus"
+CONFIG_REALTIME_CPUS_DEFAULT = ""
+CONFIG_REALTIME_LOCK_MEMORY = "realtime_lock_memory"
+CONFIG_REALTIME_LOCK_MEMORY_DEFAULT = True
+CONFIG_REALTIME_GC_THRESHOLD = "realtime_gc_threshold"
+CONFIG_REALTIME_GC_THRESHOLD_DEFAULT = ""
+
+config_file_path = None
 config = configparser.ConfigParser()
 config_lock = threading.Lock()
-
-# Start monitoring the touchpad
-fd_t = open('/dev/input/event' + str(touchpad), 'rb')
-d_t = Device(fd_t)
-
-# Get touchpad dimensions
-abs_x = d_t.absinfo[EV_ABS.ABS_X]
-abs_y = d_t.absinfo[EV_ABS.ABS_Y]
-min_x, max_x = abs_x.minimum, abs_x.maximum
-min_y, max_y = abs_y.minimum, abs_y.maximum
-log.info('Touchpad min-max: x %d-%d, y %d-%d', min_x, max_x, min_y, max_y)
+# how many times the driver wrote the config file and the stat of the file after the last write
+config_generation = 0
+config_written_stat = None
 
 last_event_time = 0
 
+# frames handled by all DialPads since start
+frames_handled = 0
+service_notifier = ServiceNotifier()
+# last gesture decisions and keys sent, dumped on SIGUSR2 or by trace-dump control command
+trace_buffer = TraceBuffer()
+# latency of the pipeline stages, exported by metrics control command
+latency_stats = LatencyStats()
+control_server = None
+# link to the desktop agent of the user session (agent.py)
+agent_link = None
+# without an agent nothing tells the core about focus changes on e.g. GNOME
+# Wayland, a gesture right after one may still use the previous window
+CORE_FOCUS_POLL_INTERVAL = 0.5
+# how long the exit waits for the touch loop thread to end
+TOUCH_LOOP_STOP_TIMEOUT = 2
+profiler = RuntimeProfiler()
+# wakeup and processing time of the last frames, reported by realtime control command
+frame_jitter = FrameJitter()
+# applied once to the touch loop thread when is realtime enabled in the config
+realtime_mode = None
+capture_writer = None
+# functions other threads want to run in the touch loop between frames, see call_in_loop()
+loop_calls = deque()
+
+# SYN_DROPPED statistics (how many times the kernel buffer overflowed)
+events_dropped_count = {}
+events_dropped_last_time = {}
+
 def parse_value_from_config(value):
     if value == '0':
         return False
@@ -253,13 +199,24 @@ def parse_value_to_config(value):
     else:
         return str(value)
 
+def config_file_stat():
+    try:
+        stat = os.stat(config_file_path)
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+    except OSError:
+        return None
+
 def config_save():
-    global config_file_dir, config_file_path
+    global config_file_dir, config_file_path, config_generation, config_written_stat
 
     try:
         with open(config_file_path, 'w') as configFile:
             config.write(configFile)
             log.debug('Writting to config file: \"%s\"', configFile)
+
+        # inotify reports own writes too, they are recognized by the stat of the written file
+        config_generation += 1
+        config_written_stat = config_file_stat()
     except:
         log.error('Error during writting to config file: \"%s\"', config_file_path)
         pass
@@ -279,8 +236,6 @@ def config_set(key, value, no_save=False, already_has_lock=False):
         config_save()
 
     if not already_has_lock:
-        # because inotify (deadlock)
-        sleep(0.1)
         config_lock.release()
 
     return value
@@ -314,6 +269,8 @@ def load_all_config_values():
     global config_lock
     global slices_count
     global suppress_app_specifics_shortcuts
+    global raw_event_reader
+    global realtime, realtime_priority, realtime_nice, realtime_cpus, realtime_lock_memory, realtime_gc_threshold
 
     #log.debug("load_all_config_values: config_lock.acquire will be called")
     config_lock.acquire()
@@ -327,31 +284,39 @@ def load_all_config_values():
     enabled = config_get(CONFIG_ENABLED, CONFIG_ENABLED_DEFAULT)
     slices_count = int(config_get(CONFIG_SLICES_COUNT, CONFIG_SLICES_COUNT_DEFAULT))
     suppress_app_specifics_shortcuts = int(config_get(CONFIG_SUPPRESS_APP_SPECIFICS_SHORTCUTS, CONFIG_SUPPRESS_APP_SPECIFICS_SHORTCUTS_DEFAULT))
+    raw_event_reader = config_get(CONFIG_RAW_EVENT_READER, CONFIG_RAW_EVENT_READER_DEFAULT)
+    # realtime options are applied once at start
+    realtime = config_get(CONFIG_REALTIME, CONFIG_REALTIME_DEFAULT)
+    realtime_priority = int(config_get(CONFIG_REALTIME_PRIORITY, CONFIG_REALTIME_PRIORITY_DEFAULT))
+    realtime_nice = int(config_get(CONFIG_REALTIME_NICE, CONFIG_REALTIME_NICE_DEFAULT))
+    realtime_cpus = config_get(CONFIG_REALTIME_CPUS, CONFIG_REALTIME_CPUS_DEFAULT)
+    realtime_lock_memory = config_get(CONFIG_REALTIME_LOCK_MEMORY, CONFIG_REALTIME_LOCK_MEMORY_DEFAULT)
+    realtime_gc_threshold = config_get(CONFIG_REALTIME_GC_THRESHOLD, CONFIG_REALTIME_GC_THRESHOLD_DEFAULT)
 
     config_lock.release()
 
+    for engine in engines:
+        engine.set_config(slices_count, activation_time)
+
     if enabled is not dialpad:
         toggle_top_right_icon(dialpad)
 
-def send_value_to_touchpad_via_i2c(value):
-    global device_id, device_addr
-
-    try:
-        with SMBus(int(device_id)) as bus:
-            data = [0x05, 0x00, 0x3d, 0x03, 0x06, 0x00, 0x07, 0x00, 0x0d, 0x14, 0x03, int(value, 16), 0xad]
-            msg = i2c_msg.write(device_addr, data)
-            bus.i2c_rdwr(msg)
-    except Exception as e:
-        log.error('Error during sending via i2c: \"%s\"', e)
-
 def initialize_virtual_device():
-    global uinput_device, dev, modifiers
+    global uinput_device, dev, modifiers, key_sink
 
     try:
         # Create the virtual device
         dev = Device()
+        touchpad_name = engines[0].name
         dev.name = touchpad_name.split(" ")[0] + " " + touchpad_name.split(" ")[1] + " DialPad"
 
+        # Enable all KEY_* codes up front so no keyboard layout change
+        # needs to re-create the device (BTN_* are left out, libinput would
+        # treat the device as a pointer)
+        for key in EV_KEY.codes:
+            if is_keyboard_key(key.value):
+                enable_key(key)
+
         # Enable all keys from the configuration
         for shortcuts in app_shortcuts.values():
             for action, configs in shortcuts.items():
@@ -359,12 +324,19 @@ def initialize_virtual_device():
                     configs = [configs]  # Ensure consistency with list-based structure
 
                 for config in configs:
-                    field = config["key"]
+                    if "text" in config:
+                        # keys of the text are resolved with the keymap, see compile_macros()
+                        macro_texts.add(config["text"])
+                        for name in get_macro_compiler().keysym_names(config["text"]):
+                            if name not in get_keysym_name_associated_to_evdev_key_reflecting_current_layout():
+                                set_evdev_key_for_char(name, '')
+                    else:
+                        field = config["key"]
 
-                    if not isEvent(field) and not isEventList(field):
-                        set_evdev_key_for_char(field, '')
-                    if isEvent(field):
-                        enable_key(field)
+                        if not isEvent(field) and not isEventList(field):
+                            set_evdev_key_for_char(field, '')
+                        if isEvent(field):
+                            enable_key(field)
 
                     # Also enable any modifiers defined in the shortcut
                     if "modifier" in config:
@@ -372,164 +344,93 @@ def initialize_virtual_device():
                         modifiers.add(modifier)
 
         # Create the uinput device
-        uinput_device = dev.create_uinput_device()
+        uinput_file = open_uinput()
+        uinput_device = dev.create_uinput_device(uinput_file)
+        key_sink = UinputKeySink(uinput_device, uinput_file)
         log.info("Virtual device initialized successfully.")
-        sleep(0.5)  # Allow time for the device to initialize
+        # Allow time for the device to initialize
+        if not wait_for_udev_device(uinput_device.devnode, UINPUT_READY_TIMEOUT):
+            log.debug("Virtual device %s not announced by udev in %ss", uinput_device.devnode, UINPUT_READY_TIMEOUT)
     except Exception as e:
         log.error(f"Error initializing virtual device: {e}")
         sys.exit(1)  # Exit if initialization fails
 
-def get_window_kde_wayland_title(window_id):
-    try:
-        cmd = ['qdbus', 'org.kde.KWin', f'/org/kde/KWin/Window/{window_id}', 'org.kde.KWin.Window.caption']
-        output = subprocess.check_output(cmd).decode().strip()
-        return output
-    except Exception as e:
-        log.error("Error getting KDE window title: %s", e)
-        return None
-
-def get_active_window_kde_wayland_title_using_qdbus():
-    global qdbus_failure_count, qdbus_max_failure_count
-
-    if qdbus_failure_count >= qdbus_max_failure_count:
-        return None
-
-    try:
-        cmd = ['qdbus', 'org.kde.KWin', '/KWin', 'org.kde.KWin.activeWindow']
-        output = subprocess.check_output(cmd).decode().strip()
-        match = re.search(r"(\d+)", output)
-        if match:
-            window_id = match.group(1)
-            return get_window_kde_wayland_title(window_id)
-    except Exception as e:
-        qdbus_failure_count += 1
-        log.error("QDbus KDE title fetch failed (%d/%d): %s", qdbus_failure_count, qdbus_max_failure_count, e)
-        return None
-
-def get_active_window_kde_wayland_title_using_kdotool():
-    global kdotool_failure_count, kdotool_max_failure_count
-
-    if kdotool_failure_count >= kdotool_max_failure_count:
-        return None
-
-    try:
-        window_uuid = subprocess.check_output(['kdotool', 'getactivename']).decode().strip()
-        title = subprocess.check_output(['kdotool', 'getwindowname', window_uuid]).decode().strip()
-        return title
-    except Exception as e:
-        kdotool_failure_count += 1
-        log.error("Kdotool title fetch failed (%d/%d): %s", kdotool_failure_count, kdotool_max_failure_count, e)
-        return None
+class SessionFocusProvider:
+    """
+    Active window of the X11 or Wayland session (hal.FocusProvider).
 
-def get_active_window_gnome_wayland_title():
-    global gnome_failure_count, gnome_max_failure_count
+    The one the desktop agent reported when an agent is connected, otherwise
+    the one the focus_watch.FocusWatcher thread of watch() saw last (None
+    without a session, e.g. the driver started at boot). The touchpad events
+    loop never waits for the session.
+    """
 
-    if gnome_failure_count >= gnome_max_failure_count:
-        return None
+    def __init__(self):
+        self.window_title = None
+        self.generation = 0
 
-    try:
-        session_bus = dbus.SessionBus()
-        shell = session_bus.get_object('org.gnome.Shell', '/org/gnome/Shell')
-        active_window = shell.Get('org.gnome.Shell', 'focusWindow')
-        return active_window.get('title', None)
-    except Exception as e:
-        gnome_failure_count += 1
-        log.error("GNOME window title fetch failed (%d/%d): %s", gnome_failure_count, gnome_max_failure_count, e)
-        return None
+    def active_window_title(self):
+        if agent_link and agent_link.connected:
+            return agent_link.window_title
 
-def get_active_window_title():
-    if xdg_session_type == "x11" and display:
-        try:
-            root = display.screen().root
-            window_id = root.get_full_property(display.intern_atom('_NET_ACTIVE_WINDOW'), Xlib.X.AnyPropertyType).value[0]
-            window = display.create_resource_object('window', window_id)
-            window_name = window.get_full_property(display.intern_atom('_NET_WM_NAME'), Xlib.X.AnyPropertyType)
-            return window_name.value.decode() if window_name else None
-        except Exception as e:
-            log.error("Error retrieving active window title (X11): %s", e)
-            return None
-    else:
-        kde_title = get_active_window_kde_wayland_title_using_qdbus()
-        if kde_title:
-            return kde_title
+        return self.window_title
 
-        kde_title = get_active_window_kde_wayland_title_using_kdotool()
-        if kde_title:
-            return kde_title
+    def set_window_title(self, title):
+        self.window_title = title
 
-        gnome_title = get_active_window_gnome_wayland_title()
-        if gnome_title:
-            return gnome_title
+    def watch(self):
+        """
+        Starts following the focused window, the thread ends while an agent reports it or when watch() is called again.
+        """
+        self.generation += 1
+        generation = self.generation
+        watcher = FocusWatcher(self.set_window_title, CORE_FOCUS_POLL_INTERVAL, kwin_script=False)
 
-    log.error("Unsupported session type or display not connected.")
-    return None
+        start_thread(lambda: watcher.run(lambda: stop_threads or self.generation != generation or (agent_link is not None and agent_link.connected)))
 
-def emulate_shortcuts(touch_input, event_code, active_modifiers, duration_held=0):
-    global suppress_app_specifics_shortcuts
+focus_provider = SessionFocusProvider()
 
-    # Get active window title
-    window_title = get_active_window_title()
-
-    # Determine app-specific shortcuts
-    app_name = next((app for app in app_shortcuts if app in window_title.lower()), None) if window_title else None
-    shortcuts = app_shortcuts.get(app_name, app_shortcuts["none"])
-
-    matched_shortcuts = shortcuts.get(touch_input, [])
-    if not isinstance(matched_shortcuts, list):
-        matched_shortcuts = [matched_shortcuts]
-
-    prioritized_shortcuts = sorted(matched_shortcuts, key=lambda s: "modifier" not in s)
-
-    for shortcut in prioritized_shortcuts:
-        key_code = shortcut["key"]
-        trigger_mode = shortcut.get("trigger", "release")
-        modifier = shortcut.get("modifier")
-        required_duration = shortcut.get("duration", 0)  # Default to 0 (immediate)
-
-        # Ensure correct modifiers
-        if (modifier and modifier in active_modifiers) or (not modifier and not active_modifiers):
-            if duration_held >= required_duration:
-                if trigger_mode == "immediate" and event_code:
-                    send_key_event(key_code, press=True)
-                    send_key_event(key_code, press=False)
-                elif trigger_mode == "release" and not event_code:
-                    send_key_event(key_code, press=True)
-                    send_key_event(key_code, press=False)
-
-                log.info(f"Executed shortcut: {key_code.name} with modifier {modifier} (Held for {duration_held:.2f}s)")
-                return  # Stop after first valid shortcut
-            else:
-                #log.info(trigger_mode)
-                #log.info(event_code)
-                if (trigger_mode == "immediate" and not event_code) or (trigger_mode == "release" and not event_code):
-                    log.info(f"Shortcut {key_code.name} requires {required_duration}s, but was held for {duration_held:.2f}s")
-
-    #log.info(f"No valid shortcut mapped for touch input: {touch_input} with modifiers {active_modifiers}")
+def emulate_shortcuts(touch_input, event_code, active_modifiers, duration_held=0, latency=None):
+    dispatcher.dispatch(touch_input, event_code, active_modifiers, duration_held, latency)
 
 def send_key_event(key_code, press=True):
-    global uinput_device
-
-    if not uinput_device:
+    if not key_sink:
         log.error("Virtual device is not initialized. Cannot send key events.")
         return
 
+    # same clock as the touchpad event timestamps
+    send_start = monotonic()
+    trace_buffer.record(send_start, TRACE_KEY_PRESS if press else TRACE_KEY_RELEASE, 0, 0, -1, -1, key_code.value)
+
     try:
-        event_value = 1 if press else 0  # 1 for key press, 0 for key release
-        uinput_device.send_events([
-            InputEvent(key_code, event_value),
-            InputEvent(EV_SYN.SYN_REPORT, 0)  # Sync event
-        ])
-        log.info(f"Sent key {'press' if press else 'release'} event: {key_code.name}")
+        key_sink.send_key(key_code, press)
+        latency_stats.observe(STAGE_SEND_EVENTS, monotonic() - send_start)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Sent key %s event: %s", "press" if press else "release", key_code.name, extra={"KEY": key_code.name})
     except Exception as e:
         log.error(f"Error sending key event: {e}")
 
+def send_text(text):
+    buffer = macro_buffers.get(text)
+    if not key_sink or buffer is None:
+        log.error("Text macro %r is not compiled. Cannot send it.", text)
+        return
+
+    send_start = monotonic()
+    try:
+        # the whole text by one write
+        key_sink.send_buffer(buffer)
+        latency_stats.observe(STAGE_SEND_EVENTS, monotonic() - send_start)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Sent text %r", text)
+    except Exception as e:
+        log.error(f"Error sending text: {e}")
+
 def activate_dialpad():
     global dialpad
 
-    # unlock
-    send_value_to_touchpad_via_i2c("0x60")
-    # activate
-    send_value_to_touchpad_via_i2c("0x01")
+    for engine in engines:
+        engine.activate()
 
     config_set(CONFIG_ENABLED, True)
 
@@ -538,10 +439,8 @@ def activate_dialpad():
 def deactivate_dialpad():
     global dialpad
 
-    # lock
-    send_value_to_touchpad_via_i2c("0x61")
-    # deactivate
-    send_value_to_touchpad_via_i2c("0x00")
+    for engine in engines:
+        engine.deactivate()
 
     config_set(CONFIG_ENABLED, False)
 
@@ -573,13 +472,7 @@ def handle_rotation(direction):
         send_key_event(EV_KEY.KEY_VOLUMEDOWN)  # Replace with your specific action
 
 def is_pressed_touchpad_top_right_icon():
-    global top_right_icon_width, top_right_icon_height, abs_mt_slot_x_values, abs_mt_slot_y_values, abs_mt_slot_value, maxx
-
-    if abs_mt_slot_x_values[abs_mt_slot_value] >= maxx - top_right_icon_width and\
-        abs_mt_slot_y_values[abs_mt_slot_value] >= 0 and abs_mt_slot_y_values[abs_mt_slot_value] <= top_right_icon_height:
-            return True
-
-    return False
+    return any(engine.gesture is not None and engine.gesture.is_pressed_top_right_icon() for engine in engines)
 
 def check_dialpad_automatical_disable_or_idle_due_inactivity():
     global disable_due_inactivity_time, last_event_time, dialpad, stop_threads
@@ -598,261 +491,286 @@ def check_dialpad_automatical_disable_or_idle_due_inactivity():
         sleep(1)
 
 
-gsettings_failure_count = 0
-gsettings_max_failure_count = 1
+class DesktopTouchpadToggler:
+    """
+    Touchpad pointer toggled by the desktop (hal.TouchpadToggler), through the desktop agent when one is connected.
 
-qdbus_failure_count = 0
-qdbus_max_failure_count = 1
+    Without an agent the touchpad events loop only queues the request, the
+    desktop calls (gsettings, qdbus, xinput, synclient) are made by run().
+    """
 
-kdotool_failure_count = 0
-kdotool_max_failure_count = 1
+    def __init__(self):
+        self.requests = SimpleQueue()
 
-gnome_failure_count = 0
-gnome_max_failure_count = 1
+    def set_send_events(self, engine, enabled):
+        if agent_link and agent_link.send_touchpad_send_events(engine.name, engine.input_device.event, enabled):
+            return
 
-xinput_failure_count = 0
-xinput_max_failure_count = 1
+        if not xdg_session_type:
+            log.debug("Touchpad pointer is left as it is, there is no desktop agent nor session")
+            return
 
-synclient_status_failure_count = 0
-synclient_status_max_failure_count = 1
+        self.requests.put((engine, enabled))
 
-def qdbusSet(cmd):
-    global qdbus_failure_count, qdbus_max_failure_count, touchpad
+    def run(self):
+        while not stop_threads:
+            try:
+                engine, enabled = self.requests.get(timeout=1)
+            except Empty:
+                continue
 
-    if qdbus_failure_count < qdbus_max_failure_count:
-        try:
-            subprocess.call(cmd)
-        except Exception as e:
-            log.debug(e, exc_info=True)
-            qdbus_failure_count+=1
-    else:
-        log.debug('Qdbus failed more than: "%s" so is not trying anymore', qdbus_max_failure_count)
-
-def qdbusSetTouchpadEnabled(value):
-    cmd = [
-        'qdbus',
-        'org.kde.KWin',
-        f'/org/kde/KWin/InputDevice/event{touchpad}',
-        'org.freedesktop.DBus.Properties.Set',
-        'org.kde.KWin.InputDevice',
-        'enabled',
-        str(bool(value)).lower()
-    ]
-    qdbusSet(cmd)
-
-def gsettingsSet(path, name, value):
-    global gsettings_failure_count, gsettings_max_failure_count
-
-    if gsettings_failure_count < gsettings_max_failure_count:
-        try:
-            sudo_user = os.environ.get('SUDO_USER')
-            if sudo_user is not None:
-                cmd = ['runuser', '-u', sudo_user, 'gsettings', 'set', path, name, str(value)]
-            else:
-                cmd = ['gsettings', 'set', path, name, str(value)]
-
-            log.debug(cmd)
-            subprocess.call(cmd)
-        except Exception as e:
-            log.debug(e, exc_info=True)
-            gsettings_failure_count+=1
-    else:
-        log.debug('Gsettings failed more than: "%s" so is not trying anymore', gsettings_max_failure_count)
+            try:
+                desktop.set_touchpad_prop_send_events(engine, enabled)
+            except Exception:
+                log.exception("Touchpad pointer can not be toggled")
+
+touchpad_toggler = DesktopTouchpadToggler()
+
+first_gesture_handled = False
+
+def on_gesture(engine, touch_input, pressed, duration_held):
+    global first_gesture_handled
+
+    decision_time = engine.clock()
+    latency_stats.observe(STAGE_FRAME_TO_DECISION, decision_time - engine.frame_time)
+
+    # from the kernel timestamp of the frame which completed the gesture
+    emulate_shortcuts(touch_input, pressed, active_modifiers, duration_held, decision_time - engine.gesture.last_timestamp)
+
+    latency_stats.observe(STAGE_KERNEL_TO_SENT, engine.clock() - engine.gesture.last_timestamp)
+
+    if not first_gesture_handled:
+        first_gesture_handled = True
+        log.info("First gesture handled %.3fs after launch", monotonic() - launch_time)
 
-def gsettingsSetTouchpadSendEvents(value):
-    gsettingsSet('org.gnome.desktop.peripherals.touchpad', 'send-events', 'enabled' if value else 'disabled')
+def on_icon(engine):
+    toggle_top_right_icon(dialpad)
 
-def set_touchpad_prop_send_events(value):
-    global touchpad_name, gsettings_failure_count, gsettings_max_failure_count, qdbus_max_failure_count, qdbus_failure_count, xinput_failure_count, xinput_max_failure_count, synclient_status_failure_count, synclient_status_max_failure_count
+def on_events_dropped(engine, events_count):
+    log_events_dropped(repr(engine), events_count)
 
-    # 1. priority - gsettings (gnome) or qdbus (kde)
-    if gsettings_failure_count < gsettings_max_failure_count:
-        gsettingsSetTouchpadSendEvents(value)
-    if qdbus_failure_count < qdbus_max_failure_count:
-        qdbusSetTouchpadEnabled(value)
+def log_events_dropped(name, events_count):
+    global events_dropped_count, events_dropped_last_time
 
-    # 2. priority - xinput
-    if xinput_failure_count > xinput_max_failure_count:
-        log.debug('Setting libinput Send Events via xinput failed more than: "%s" times so is not trying anymore', xinput_max_failure_count)
+    now = time()
+    events_dropped_count[name] = events_dropped_count.get(name, 0) + 1
+    if events_dropped_last_time.get(name):
+        log.warning("Events dropped by kernel on %s (%d times in total), %d events in %.1fs since the previous drop", name, events_dropped_count[name], events_count, now - events_dropped_last_time[name])
     else:
-        try:
-            cmd = ["xinput", "enable" if value else "disable", touchpad_name]
-            log.debug(cmd)
-            subprocess.call(cmd)
+        log.warning("Events dropped by kernel on %s (%d times in total), %d events since start", name, events_dropped_count[name], events_count)
+    events_dropped_last_time[name] = now
+
+def wait_for_input_device(find):
+    """
+    Blocks until find(read_input_devices()) returns a device, returns None when the driver is stopping.
+    """
+    while not stop_threads:
+        found_device = find(read_input_devices())
+        if found_device:
+            if not wait_for_udev_device(found_device.devnode, DEVICE_READY_TIMEOUT):
+                log.debug("Device %s not announced by udev in %ss", found_device.devnode, DEVICE_READY_TIMEOUT)
+            return found_device
+
+        with input_devices_changed:
+            input_devices_changed.wait(1)
+
+    return None
+
+def find_dialpad_touchpads(devices):
+    """
+    Touchpads with a DialPad, only the virtual one of the self-test (python -m selftest) when it runs.
+    """
+    selftest_touchpad = os.environ.get('DIALPAD_SELFTEST_TOUCHPAD')
+    if selftest_touchpad:
+        return [device for device in devices if device.devnode == selftest_touchpad]
+
+    return find_touchpads(devices)
+
+def create_engine(input_device):
+    selftest = input_device.devnode == os.environ.get('DIALPAD_SELFTEST_TOUCHPAD')
+
+    return DialPadEngine(
+        input_device,
+        model_layout,
+        on_gesture=on_gesture,
+        on_icon=on_icon,
+        on_touchpad_send_events=lambda engine, enabled: touchpad_toggler.set_send_events(engine, enabled),
+        on_events_dropped=on_events_dropped,
+        is_enabled=lambda: dialpad,
+        trace=trace_buffer,
+        latency=latency_stats,
+        jitter=frame_jitter,
+        # virtual touchpad has no I2C and its touches must not reach the session
+        controller=FakeDialPadController() if selftest else None,
+        exclusive=selftest
+    )
+
+def attach_engine(engine, selector):
+    engine.set_config(slices_count, activation_time)
+    engine.open(raw_event_reader)
+    if capture_writer:
+        engine.start_capture(capture_writer)
+    selector.register(engine, selectors.EVENT_READ, engine)
+
+def detach_engine(engine, selector, reason):
+    log.warning("Touchpad %s is not available (%s), waiting until it is back", engine, reason)
+
+    selector.unregister(engine)
+    engine.close()
+    engines.remove(engine)
+
+def attach_new_touchpads(selector):
+    """
+    Attaches touchpads which are not served yet (resume from suspend, driver re-bound, another DialPad connected, ...).
+
+    Waiting for udev and the I2C check are done by a thread of every touchpad,
+    the touchpad events loop only attaches it then.
+    """
+    attached = set(engine.input_device.devnode for engine in engines) | touchpads_being_attached
+
+    for input_device in find_dialpad_touchpads(read_input_devices()):
+        if input_device.devnode in attached:
+            continue
+
+        touchpads_being_attached.add(input_device.devnode)
+        threading.Thread(target=prepare_new_touchpad, args=(input_device, selector), daemon=True).start()
+
+def prepare_new_touchpad(input_device, selector):
+    try:
+        if not wait_for_udev_device(input_device.devnode, DEVICE_READY_TIMEOUT):
+            log.debug("Device %s not announced by udev in %ss", input_device.devnode, DEVICE_READY_TIMEOUT)
+
+        engine = create_engine(input_device)
+        if engine.check_i2c():
+            loop_calls.append(lambda: attach_new_engine(engine, selector))
             return
-        except:
-            xinput_failure_count+=1
-            log.error('Setting libinput Send Events via xinput failed')
+    except Exception:
+        log.exception("Touchpad %s can not be prepared", input_device.devnode)
+
+    touchpads_being_attached.discard(input_device.devnode)
+
+def attach_new_engine(engine, selector):
+    touchpads_being_attached.discard(engine.input_device.devnode)
 
-    # 3. priority - synclient
-    if synclient_status_failure_count > synclient_status_max_failure_count:
-        log.debug('Setting libinput Send Events via synclient failed more than: "%s" times so is not trying anymore', xinput_max_failure_count)
     try:
-        cmd = ["synclient", "TouchpadOff=" + str(value)]
-        log.debug(cmd)
-        subprocess.call(cmd)
+        attach_engine(engine, selector)
+    except OSError as e:
+        # found the old one which is being removed right now
+        log.debug("Touchpad %s can not be opened: %s", engine, e)
         return
-    except:
-        synclient_status_failure_count+=1
 
-# Store key press start times
-key_press_times = {}
+    engines.append(engine)
+
+    # touchpad forgets the DialPad state when is powered off
+    if dialpad:
+        engine.activate()
+
+    log.info("Touchpad %s attached", engine)
+
+def on_uevent(uevent, selector):
+    if not uevent or uevent.get('ACTION') != 'add' or not uevent_input_device(uevent):
+        return
+
+    with input_devices_changed:
+        input_devices_changed.notify_all()
+
+    attach_new_touchpads(selector)
+
+def service_status():
+    return "DialPad {}, {} touchpad(s), {} frames handled, events dropped {} times".format(
+        "enabled" if dialpad else "disabled", len(engines), frames_handled, sum(events_dropped_count.values())
+    )
 
 def listen_touchpad_events():
-    global slices_count, activation_time, last_event_time, dialpad, active_modifiers
+    """
+    Shared event loop of all DialPads and the input devices hotplug.
+
+    The service watchdog is pinged from here, so a stuck gesture handling
+    (e.g. a hung subprocess call) gets the driver restarted.
+    """
+    global last_event_time, listening_touchpad_events_started, frames_handled
+
+    selector = selectors.DefaultSelector()
+    monitor = None
 
     try:
+        for engine in engines.copy():
+            try:
+                attach_engine(engine, selector)
+            except OSError as e:
+                log.error("Touchpad %s can not be opened: %s", engine, e)
+                engines.remove(engine)
 
-            # Define circle and slices
-            circle_radius = circle_diameter / 2
-            center_button_radius = center_button_diameter / 2
-
-
-            # Define the bounds for the top-right icon
-            top_right_icon_bounds = {
-                "x_min": max_x - top_right_icon_width,
-                "x_max": max_x,
-                "y_min": 0,
-                "y_max": top_right_icon_height
-            }
-
-            log.info("Listening to touchpad events...")
-
-            touch_x, touch_y = None, None
-            finger_detected = False  # Track finger presence
-            touch_start_time = None  # Track the time when the touch started
-            within_top_right_icon = False  # Track if the touch is within the top-right icon bounds
-            icon_activated = False  # Track if the icon has already been activated during this touch
-            last_slice = None  # Track the last active slice in the circle
-            center_button_triggered = False
-            tap_disabled = False  # Track tap-to-click status
-
-            for event in d_t.events():
-
-                last_event_time = time()
-
-                # Handle finger detection
-                if event.matches(EV_KEY.BTN_TOOL_FINGER):
-                    if event.value == 1:  # Finger down
-                        key_press_times[event.code] = time()
-                        finger_detected = True
-                        touch_start_time = time()  # Record the touch start time
-                        within_top_right_icon = False  # Reset the flag
-                        icon_activated = False  # Reset activation status
-                        last_slice = None  # Reset the last slice
-                        log.debug("Finger detected.")
-                    elif event.value == 0:  # Finger up
-                        finger_detected = False
-                        touch_start_time = None  # Reset the touch start time
-                        within_top_right_icon = False  # Reset the flag
-                        icon_activated = False  # Reset activation status
-                        last_slice = None  # Reset the last slice
-                        log.debug("Finger lifted.")
-                        # Reset touch coordinates
-                        touch_x, touch_y = None, None
-
-                        duration_held = time() - key_press_times.get(event.code, 0)
-                        if center_button_triggered:
-                            emulate_shortcuts("center", event.value, active_modifiers, duration_held)
-                            center_button_triggered = False
-                        # Re-enable tap-to-click
-                        if tap_disabled:
-                            set_touchpad_prop_send_events(1)
-                            tap_disabled = False
-
-                # Detect touch positions
-                if event.matches(EV_ABS.ABS_MT_POSITION_X):
-                    touch_x = event.value
-                elif event.matches(EV_ABS.ABS_MT_POSITION_Y):
-                    touch_y = event.value
-
-                # Check if the touch is in the top-right icon bounds
-                if touch_x is not None and touch_y is not None and finger_detected:
-                    if (top_right_icon_bounds["x_min"] <= touch_x <= top_right_icon_bounds["x_max"] and
-                            top_right_icon_bounds["y_min"] <= touch_y <= top_right_icon_bounds["y_max"]):
-                        if not within_top_right_icon:
-                            log.debug("Touch entered top-right icon bounds.")
-                        within_top_right_icon = True  # Mark that the touch is inside the bounds
-
-                        # Check if the touch duration exceeds the threshold and hasn't been activated yet
-                        if touch_start_time and not icon_activated:
-                            if (time() - touch_start_time) >= activation_time:
-                                log.info("Top-right icon held for the required duration.")
-                                # Toggle the top-right icon state
-                                toggle_top_right_icon(dialpad)
-                                icon_activated = True  # Mark that the icon has been activated
-                    else:
-                        if within_top_right_icon:
-                            log.debug("Touch left top-right icon bounds. Canceling the action.")
-                        within_top_right_icon = False  # Mark that the touch has left the bounds
-                        touch_start_time = None  # Cancel the action by resetting the start time
-                        icon_activated = False  # Reset the activation status to allow future activation
-
-                # Calculate distance and angle for circle-based detection
-                if touch_x is not None and touch_y is not None and finger_detected:
-                    dx = touch_x - circle_center_x
-                    dy = touch_y - circle_center_y
-                    distance = math.sqrt(dx**2 + dy**2)
-                    angle = (math.atan2(dy, dx) * 180 / math.pi) % 360
-
-                    if distance <= circle_radius and dialpad:
-
-                        # Disable tap-to-click
-                        if not tap_disabled:
-                            set_touchpad_prop_send_events(0)
-                            tap_disabled = True
-
-                        #log.info("Distance: %f, Center button radius: %f", distance, center_button_radius)
-                        if distance < center_button_radius and dialpad:  # Center button area
-                            # Only trigger if it has not been triggered already in this touch cycle
-                            if not center_button_triggered:
-                                log.debug("Touch detected in center button area.")
-                                # Trigger the center button shortcut
-                                emulate_shortcuts("center", event.value, active_modifiers)
-                                center_button_triggered = True  # Set flag to indicate the button has been pressed
-                                icon_activated = True  # Ensure it only triggers once per touch
-                        else:
-                            # Reset the center button triggered flag if the finger leaves the circle (but not the button area)
-                            if center_button_triggered:
-                                center_button_triggered = False
-                                icon_activated = False  # Allow the center button action to be triggered again
-
-                            # Determine the current slice based on the angle
-                            current_slice = int(angle // (360 / slices_count))
-                            if current_slice != last_slice:
-                                if last_slice is not None:
-                                    # Determine the direction of rotation
-                                    direction = "clockwise" if (current_slice - last_slice) % slices_count == 1 else "counterclockwise"
-                                    log.debug(f"Detected circular motion: {direction}")
-                                    # Trigger rotation logic based on the direction
-                                    emulate_shortcuts(direction, event.value, active_modifiers)
-                                last_slice = current_slice
-                    else:
-                        pass
-                        #log.debug("Touch outside the circle. Ignoring.")
+        try:
+            monitor = UeventMonitor()
+            selector.register(monitor, selectors.EVENT_READ, monitor)
+        except OSError as e:
+            log.warning("Input devices hotplug is not available: %s", e)
+            monitor = None
+
+        log.info("Listening to touchpad events of %d DialPad(s)... (%.3fs after launch)", len(engines), monotonic() - launch_time)
+        listening_touchpad_events_started = True
+        service_notifier.ready(service_status())
+
+        select_timeout = service_notifier.select_timeout(1)
+
+        while not stop_threads:
+            for key, mask in selector.select(timeout=select_timeout):
+
+                if key.data is monitor:
+                    on_uevent(monitor.receive(), selector)
+                    continue
+
+                engine = key.data
+                try:
+                    frames_count = engine.process()
+                    if frames_count:
+                        frames_handled += frames_count
+                        last_event_time = time()
+                except (OSError, EOFError) as e:
+                    # touchpad is gone, e.g. suspended or unbound
+                    detach_engine(engine, selector, e)
+
+            # without hotplug is a lost touchpad looked for every second
+            if monitor is None and not engines:
+                attach_new_touchpads(selector)
+
+            service_notifier.heartbeat(service_status)
+            profiler.poll()
+
+            while loop_calls:
+                loop_calls.popleft()()
 
-    except device.EventsDroppedException:
-        for e in dev.sync(True):
-            pass
     except Exception as e:
         log.error(f"Error in listen_touchpad_events: {e}")
+    finally:
+        selector.close()
+        if monitor:
+            monitor.close()
+
+def on_config_dir_event(event):
+    global config_lock, config_generation, config_written_stat
+
+    if event.pathname != os.path.abspath(config_file_path):
+        return
+
+    with config_lock:
+        own_write = config_file_stat() == config_written_stat
+
+    if own_write:
+        log.debug("check_config_values_changes: detected internal change of config file (generation %d) -> do nothing", config_generation)
+    else:
+        log.info("check_config_values_changes: detected external change of config file -> loading changes")
+        load_all_config_values()
 
 def check_config_values_changes():
-    global config_lock, stop_threads, event_notifier
+    global stop_threads, event_notifier
 
     while not stop_threads:
         try:
-            event_notifier.process_events()
             if event_notifier.check_events():
                 event_notifier.read_events()
-
-                if not config_lock.locked():
-                    log.info("check_config_values_changes: detected external change of config file -> loading changes")
-                    # because file might be read so fast that changes will not be there yet
-                    sleep(0.1)
-                    load_all_config_values()
-                else:
-                    log.info("check_config_values_changes: detected internal change of config file -> do nothing -> would be deadlock")
+                event_notifier.process_events()
 
         except KeyboardInterrupt:
             break
@@ -860,31 +778,47 @@ def check_config_values_changes():
     log.info("check_config_values_changes: inotify watching config file ended")
 
 
-def gsettingsGet(path, name):
-    global gsettings_failure_count, gsettings_max_failure_count
-
-    if gsettings_failure_count < gsettings_max_failure_count:
-        try:
-            cmd = ['gsettings', 'get', path, name]
-            result = subprocess.check_output(cmd).rstrip()
-            return result
-        except Exception as e:
-            log.debug(e, exc_info=True)
-            gsettings_failure_count+=1
-    else:
-        log.debug('Gsettings failed more then: \"%s\" so is not try anymore', gsettings_max_failure_count)
-
-udev = None
 threads = []
 stop_threads = False
-enabled_evdev_keys = []
+enabled_evdev_keys = set()
 
-# only to avoid first - x11 only
+# GNOME input source loaded on Wayland (X11 layout is followed by desktop.update_gnome_layout())
 gnome_current_layout = None
-# only to avoid first - x11 even wayland (e.g. Ubuntu 22.04)
 gnome_current_layout_index = None
 keysym_name_associated_to_evdev_key_reflecting_current_layout = None
+keymap_index = None
+keyboard_state = None
+keymap_cache = KeymapCache()
+# hash of the last keymap sent by the compositor
+wl_keymap_digest = None
+
+
+# X11 modifier mapping, requested again only after MappingNotify
+x11_modifier_mapping = None
+# X11 keysym -> keysym name
+x11_keysym_names = None
+
+def get_x11_modifier_mapping():
+    global x11_modifier_mapping
+
+    if x11_modifier_mapping is None:
+        x11_modifier_mapping = display.get_modifier_mapping()
+
+    return x11_modifier_mapping
 
+def get_x11_keysym_names():
+    global x11_keysym_names
+
+    if x11_keysym_names is None:
+        # ISO_Level3_Shift etc. (AltGr) are not loaded by default
+        Xlib.XK.load_keysym_group('xkb')
+
+        x11_keysym_names = {}
+        for name, keysym in Xlib.XK.__dict__.items():
+            if name.startswith("XK_"):
+                x11_keysym_names.setdefault(keysym, name[3:])
+
+    return x11_keysym_names
 
 def mod_name_to_specific_keysym_name(mod_name):
     global display_wayland
@@ -922,60 +856,51 @@ def mod_name_to_specific_keysym_name(mod_name):
         "Mod3": Xlib.X.Mod3MapIndex,
         "Mod4": Xlib.X.Mod4MapIndex,
         "Mod5": Xlib.X.Mod5MapIndex
-    }
+    } if display else {}
 
-    if display and mod_name in mods_to_indexes_x11:
+    if mod_name in mods_to_indexes_x11:
 
-      mods = display.get_modifier_mapping()
+      mods = get_x11_modifier_mapping()
       first_keycode = mods[mods_to_indexes_x11[mod_name]][0]
       if first_keycode:
-        key = EV_KEY.codes[int(first_keycode) - 8]
         keysym = display.keycode_to_keysym(first_keycode, 0)
-        for key in Xlib.XK.__dict__:
-          if key.startswith("XK") and Xlib.XK.__dict__[key] == keysym:
-            return key[3:]
+        return get_x11_keysym_names().get(keysym)
       else:
         return mod_to_specific_keysym_name[mod_name]
-    elif display_wayland:
-
-        keymap = keyboard_state.get_keymap()
-        num_mods = keymap.num_mods()
-
-        for keycode in keymap:
-            keyboard_state_clean = keymap.state_new()
-            key_state = keyboard_state_clean.update_key(keycode, xkb.KeyDirection.XKB_KEY_DOWN)
+    elif display_wayland and get_keymap_index():
 
-            num_layouts = keymap.num_layouts_for_key(keycode)
-            for layout in range(0, num_layouts):
+        def is_layout_active(layout):
+            if gnome_current_layout_index is not None and gnome_current_layout_index == layout:
+                return True
+            return keymap_index.state_clean.layout_index_is_active(layout, xkb.StateComponent.XKB_STATE_LAYOUT_EFFECTIVE)
 
-                if gnome_current_layout_index is not None and gnome_current_layout_index == layout:
-                    layout_is_active = True
-                else:
-                    layout_is_active = keyboard_state_clean.layout_index_is_active(layout, xkb.StateComponent.XKB_STATE_LAYOUT_EFFECTIVE)
+        return keymap_index.modifier_keysym_name(mod_name, is_layout_active)
 
-                if layout_is_active:
-                    for mod_index in range(0, num_mods):
-
-                        is_key_mod = key_state & xkb.StateComponent.XKB_STATE_MODS_DEPRESSED
-                        if is_key_mod:
-
-                            is_mod_active = keyboard_state_clean.mod_index_is_active(mod_index, xkb.StateComponent.XKB_STATE_MODS_DEPRESSED)
-                            if is_mod_active:
-                                if keymap.mod_get_name(mod_index) == mod_name:
+    else:
+      return mod_to_specific_keysym_name[mod_name]
 
-                                    keysyms = keymap.key_get_syms_by_level(keycode, layout, 0)
+def reattach_keyboard():
+    """
+    Waits until is the keyboard back and opens it again, returns None when the driver is stopping.
+    """
+    while not stop_threads:
+        keyboard_device = wait_for_input_device(find_keyboard)
+        if keyboard_device is None:
+            return None
 
-                                    if len(keysyms) != 1:
-                                        continue
+        try:
+            fd_k = open(keyboard_device.devnode, 'rb')
+        except OSError as e:
+            # found the old one which is being removed right now
+            log.debug("Keyboard %s can not be opened: %s", keyboard_device.devnode, e)
+            with input_devices_changed:
+                input_devices_changed.wait(1)
+            continue
 
-                                    keysym_name = xkb.keysym_get_name(keysyms[0])
-                                    #log.info(mod_name)
-                                    #log.info(keycode)
-                                    #log.info(keysym_name)
-                                    return keysym_name
+        set_keyboard(keyboard_device)
+        return fd_k
 
-    else:
-      return mod_to_specific_keysym_name[mod_name]
+    return None
 
 def listen_keyboard_events():
     """
@@ -992,22 +917,54 @@ def listen_keyboard_events():
     try:
         fd_k = open('/dev/input/event' + str(keyboard), 'rb')
         d_k = Device(fd_k)
+        events_count = 0
 
-        for event in d_k.events():
-            if event.code in modifiers:
+        while not stop_threads:
+            try:
+                for event in d_k.events():
+                    events_count += 1
 
-                if event.value == 1:  # Key Pressed
-                    active_modifiers.add(event.code)
-                elif event.value == 0:  # Key Released
-                    active_modifiers.discard(event.code)
+                    if event.code in modifiers:
 
-                log.debug(f"Active modifiers: {active_modifiers}")
+                        if capture_writer:
+                            capture_writer.keyboard(monotonic(), event.type.value, event.code.value, event.value)
+
+                        if event.value == 1:  # Key Pressed
+                            active_modifiers.add(event.code)
+                        elif event.value == 0:  # Key Released
+                            active_modifiers.discard(event.code)
+
+                        if log.isEnabledFor(logging.DEBUG):
+                            log.debug("Active modifiers: %s", active_modifiers)
+
+            except device.EventsDroppedException:
+                # kernel buffer overflowed, rebuild held modifiers from the device and continue
+                log_events_dropped("keyboard", events_count)
+                events_count = 0
+
+                for _ in d_k.sync():
+                    pass
+
+                active_modifiers.clear()
+                active_modifiers.update(modifier for modifier in modifiers if d_k.value[modifier])
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug("Active modifiers: %s", active_modifiers)
+
+            except OSError as e:
+                # keyboard is gone, e.g. suspended or unbound
+                log.warning("Keyboard %s is not available (%s), waiting until it is back", keyboard, e)
+                fd_k.close()
+                active_modifiers.clear()
+
+                fd_k = reattach_keyboard()
+                if fd_k is None:
+                    break
+
+                d_k = Device(fd_k)
+                log.info("Keyboard %s re-attached", keyboard)
 
-    except device.EventsDroppedException:
-        for e in dev.sync(True):
-            pass
     except Exception as e:
-        log.error(f"Error in listen_touchpad_events: {e}")
+        log.error(f"Error in listen_keyboard_events: {e}")
 
 # default are for unicode shortcuts + is loaded layout during start (BackSpace, Return - enter, asterisk, minus etc. can be found using xev)
 def set_defaults_keysym_name_associated_to_evdev_key_reflecting_current_layout():
@@ -1048,165 +1005,181 @@ def get_keysym_name_associated_to_evdev_key_reflecting_current_layout():
 
     return keysym_name_associated_to_evdev_key_reflecting_current_layout
 
-def load_evdev_key_for_wayland(char, keyboard_state):
-    global gnome_current_layout_index
-
-    keysym = xkb.keysym_from_name(char)
-
-    keymap = keyboard_state.get_keymap()
-    num_mods = keymap.num_mods()
-
-    for keycode in keymap:
-
-        num_layouts = keymap.num_layouts_for_key(keycode)
-        for layout in range(0, num_layouts):
-
-            num_levels = keymap.num_levels_for_key(keycode, layout)
-
-            for level in range(0, num_levels):
-                mod_masks_for_level = keymap.key_get_mods_for_level(keycode, layout, level)
+def char_to_keysym_name(char):
+    """
+    Keysym name of char in the session, e.g. "a", "eacute", None when X11 has no name for it.
+    """
+    if char in ('\n', '\t'):
+        return 'Return' if char == '\n' else 'Tab'
 
-                if len(mod_masks_for_level) < 1:
-                    continue
+    # Latin-1 keysyms are the code points, the others are Unicode keysyms
+    codepoint = ord(char)
+    keysym = codepoint if codepoint < 0x100 else 0x1000000 | codepoint
 
-                keysyms = keymap.key_get_syms_by_level(keycode, layout, level)
+    if xdg_session_type == "x11":
+        return get_x11_keysym_names().get(keysym)
 
-                if len(keysyms) != 1 or keysyms[0] != keysym:
-                    continue
+    return xkb.keysym_get_name(keysym)
 
-                for mod_mask_index in range(0, len(mod_masks_for_level)):
+def get_macro_compiler():
+    global macro_compiler
 
-                    mod_evdev_keys = []
-                    for mod_index in range(0, num_mods):
+    # same modifier names as the unicode shortcut entries of the keysym table
+    if macro_compiler is None:
+        macro_compiler = MacroCompiler(
+            lambda name: get_keysym_name_associated_to_evdev_key_reflecting_current_layout().get(name, ''),
+            char_to_keysym_name,
+            control=mod_name_to_specific_keysym_name('Control'),
+            shift=mod_name_to_specific_keysym_name('Shift')
+        )
 
-                        if (mod_masks_for_level[mod_mask_index] & (1 << mod_index) == 0):
-                            continue
+    return macro_compiler
 
-                        mod_name = keymap.mod_get_name(mod_index)
+def compile_macros():
+    global macro_buffers
 
-                        mod_as_evdev_key = load_evdev_key_for_wayland(mod_name_to_specific_keysym_name(mod_name), keyboard_state)
-                        mod_evdev_keys.append(mod_as_evdev_key)
+    if macro_texts:
+        # replaced at once, the touchpad events loop may be sending one right now
+        macro_buffers = get_macro_compiler().compile_all(macro_texts)
+        log.debug("Text macros compiled: %s", {text: len(buffer) for text, buffer in macro_buffers.items()})
 
-                        if not mod_as_evdev_key:
-                            continue
+def get_keymap_index():
+    global keymap_index, keyboard_state
 
-                    if len(mod_evdev_keys) > 0:
-                        key = mod_evdev_keys + [EV_KEY.codes[int(keycode - 8)]]
-                    else:
-                        key = EV_KEY.codes[int(keycode - 8)]
+    # one walk over the whole keymap, then are all keysym and modifier lookups O(1)
+    if keymap_index is None and keyboard_state is not None:
+        keymap_index = KeymapIndex(keyboard_state.get_keymap())
 
+    return keymap_index
 
-                    if gnome_current_layout_index is not None and gnome_current_layout_index == layout:
-                        layout_is_active = True
-                    else:
-                        layout_is_active = keyboard_state.layout_index_is_active(layout, xkb.StateComponent.XKB_STATE_LAYOUT_EFFECTIVE)
+def evdev_key_to_cache(key):
+    if isEvent(key):
+        return key.name
+    elif type(key) is list:
+        return [evdev_key_to_cache(k) for k in key]
+    else:
+        return ''
 
-                    enable_key(key)
+def evdev_key_from_cache(value):
+    if type(value) is list:
+        return [evdev_key_from_cache(v) for v in value]
+    elif value:
+        return getattr(EV_KEY, value)
+    else:
+        return ''
 
-                    if layout_is_active:
-                        set_evdev_key_for_char(char, key)
-                        return key
+def keymap_cache_key(*keymap):
+    return keymap_digest(xdg_session_type, *keymap, sorted(get_keysym_name_associated_to_evdev_key_reflecting_current_layout()))
 
-def wl_load_keymap_state():
-    global keyboard_state, keymap_loaded, udev
-
-    log.debug("Wayland will try to load keymap")
+def load_keymap_from_cache(cache_key):
+    mapping = keymap_cache.get(cache_key)
+    if not isinstance(mapping, dict):
+        return False
 
-    enabled_keys = len(enabled_evdev_keys)
+    try:
+        keys = {char: evdev_key_from_cache(value) for char, value in mapping.items()}
+    except (AttributeError, TypeError):
+        log.warning("Keymap cache entry is not valid, resolving keymap again")
+        return False
 
-    for char in get_keysym_name_associated_to_evdev_key_reflecting_current_layout().copy():
-        load_evdev_key_for_wayland(char, keyboard_state)
+    for char, key in keys.items():
+        set_evdev_key_for_char(char, key)
+        enable_key(key)
 
-    # one or more changed to something not enabled yet to send using udev device? -> udev device has to be re-created
-    #
-    # BUT only reset if event is not first one - driver is starting and keymap is not loaded yet
-    if len(enabled_evdev_keys) > enabled_keys and keymap_loaded and udev:
-        reset_udev_device()
+    log.debug("Keymap loaded from cache %s", keymap_cache.path)
+    return True
 
-    keymap_loaded = True
+def save_keymap_to_cache(cache_key):
+    mapping = {char: evdev_key_to_cache(key) for char, key in get_keysym_name_associated_to_evdev_key_reflecting_current_layout().items()}
+    keymap_cache.set(cache_key, mapping)
 
-    log.debug("Wayland loaded keymap succesfully")
-    log.debug(get_keysym_name_associated_to_evdev_key_reflecting_current_layout())
+def load_evdev_key_for_wayland(char, keyboard_state):
+    global gnome_current_layout_index
 
+    keysym = xkb.keysym_from_name(char)
+    keymap_index = get_keymap_index()
 
-def check_gnome_layout():
-    global stop_threads, gnome_current_layout, gnome_current_layout_index, keyboard_state, display_wayland_var, display_var
+    for keycode, layout, level, mod_mask in keymap_index.lookup(keysym):
 
-    while not stop_threads:
+        mod_evdev_keys = []
+        for mod_name in keymap_index.mod_names_for_mask(mod_mask):
 
-        mru_sources = gsettingsGet('org.gnome.desktop.input-sources', 'mru-sources')
-        try:
-          mru_sources_evaluated = ast.literal_eval(mru_sources.decode())
-        except:
-          mru_sources_evaluated = []
+            mod_keysym_name = mod_name_to_specific_keysym_name(mod_name)
+            if not mod_keysym_name:
+                continue
 
-        sources = gsettingsGet('org.gnome.desktop.input-sources', 'sources')
-        try:
-          sources_evaluated = ast.literal_eval(sources.decode())
-        except:
-          sources_evaluated = []
+            mod_as_evdev_key = load_evdev_key_for_wayland(mod_keysym_name, keyboard_state)
+            if mod_as_evdev_key:
+                mod_evdev_keys.append(mod_as_evdev_key)
 
-        if len(mru_sources_evaluated) > 0:
+        if len(mod_evdev_keys) > 0:
+            key = mod_evdev_keys + [EV_KEY.codes[int(keycode - 8)]]
+        else:
+            key = EV_KEY.codes[int(keycode - 8)]
 
-            mru_layout_index = sources_evaluated.index(mru_sources_evaluated[0])
-            mru_layout = mru_sources_evaluated[0][1].split("+")[0]
+        if gnome_current_layout_index is not None and gnome_current_layout_index == layout:
+            layout_is_active = True
+        else:
+            layout_is_active = keyboard_state.layout_index_is_active(layout, xkb.StateComponent.XKB_STATE_LAYOUT_EFFECTIVE)
 
-            if display_wayland_var:
-                if keyboard_state and gnome_current_layout_index is not mru_layout_index:
+        enable_key(key)
 
-                    gnome_current_layout_index =  mru_layout_index
-                    gnome_current_layout = mru_layout
-                    wl_load_keymap_state()
+        if layout_is_active:
+            set_evdev_key_for_char(char, key)
+            return key
 
-            elif gnome_current_layout != mru_layout:
+def wl_load_keymap_state():
+    global keyboard_state, keymap_loaded, uinput_device
 
-                    try:
-                        cmd = ['setxkbmap', mru_layout, '-display', display_var]
+    log.debug("Wayland will try to load keymap")
 
-                        log.debug(cmd)
-                        subprocess.call(cmd)
+    enabled_keys = len(enabled_evdev_keys)
 
-                        gnome_current_layout = mru_layout
-                        gnome_current_layout_index =  mru_layout_index
-                    except:
-                        log.exception('setxkbmap set failed')
+    cache_key = keymap_cache_key(wl_keymap_digest, gnome_current_layout_index)
+    if not load_keymap_from_cache(cache_key):
+        for char in get_keysym_name_associated_to_evdev_key_reflecting_current_layout().copy():
+            load_evdev_key_for_wayland(char, keyboard_state)
+        save_keymap_to_cache(cache_key)
 
-        else:
+    # one or more changed to something not provisioned on the virtual device? -> it has to be re-created
+    #
+    # BUT only reset if event is not first one - driver is starting and keymap is not loaded yet
+    if len(enabled_evdev_keys) > enabled_keys and keymap_loaded and uinput_device:
+        reset_udev_device()
 
-            current = gsettingsGet('org.gnome.desktop.input-sources', 'current')
+    compile_macros()
 
-            current_evaluated = None
-            try:
-              current_evaluated = ast.literal_eval(current.decode().split(" ")[1])
-            except:
-              pass
+    keymap_loaded = True
+    keymap_loaded_event.set()
 
-            if current_evaluated is not None and current_evaluated < len(sources_evaluated):
-                layout = sources_evaluated[current_evaluated][1].split("+")[0]
+    log.debug("Wayland loaded keymap succesfully")
+    log.debug(get_keysym_name_associated_to_evdev_key_reflecting_current_layout())
 
-                # first run, would be unnecessary duplicated loading x11 keymap because X.org server notify all clients at start about Mapping and setxkbmap would trigger new second notify
-                if gnome_current_layout == None:
-                    gnome_current_layout = layout
 
-                elif gnome_current_layout != layout:
+def set_gnome_wayland_layout(index, layout):
+    global gnome_current_layout, gnome_current_layout_index
 
-                    try:
-                        cmd = ['setxkbmap', layout, '-display', display_var]
+    if keyboard_state and gnome_current_layout_index is not index:
 
-                        log.debug(cmd)
-                        subprocess.call(cmd)
+        gnome_current_layout_index = index
+        gnome_current_layout = layout
+        wl_load_keymap_state()
 
-                        gnome_current_layout = layout
-                    except:
-                        log.exception('setxkbmap set failed')
+def update_gnome_layout():
+    # the desktop agent watches the layout and reports it
+    if (agent_link and agent_link.connected) or not xdg_session_type:
+        return
 
-        sleep(0.5)
+    desktop.update_gnome_layout(set_gnome_wayland_layout)
 
+def check_gnome_layout():
+    desktop.check_gnome_layout(update_gnome_layout, lambda: stop_threads)
 
 def cleanup():
     global dialpad, display, display_wayland, stop_threads, event_notifier
 
     log.info("Clean up started")
+    service_notifier.stopping()
 
     # try deactivate first
     try:
@@ -1232,6 +1205,15 @@ def cleanup():
         if watch_manager:
             watch_manager.close()
 
+        if control_server:
+            control_server.close()
+        if agent_link:
+            agent_link.close()
+        profiler.close()
+        log.info("Frame jitter: %s", frame_jitter.report())
+        if capture_writer:
+            capture_writer.close()
+
         log.info("Clean up finished")
     except:
         log.exception("Clean up error")
@@ -1258,22 +1240,22 @@ def isEventList(events):
         return False
 
 def enable_key(key_or_key_combination, reset_udev = False):
-    global enabled_evdev_keys, dev, udev
+    global enabled_evdev_keys, dev
 
     enabled_keys_count = len(enabled_evdev_keys)
 
     if isEvent(key_or_key_combination):
       if key_or_key_combination not in enabled_evdev_keys:
-          enabled_evdev_keys.append(key_or_key_combination)
+          enabled_evdev_keys.add(key_or_key_combination)
           dev.enable(key_or_key_combination)
 
     elif isEventList(key_or_key_combination):
       for key in key_or_key_combination:
         if key not in enabled_evdev_keys:
-          enabled_evdev_keys.append(key)
+          enabled_evdev_keys.add(key)
           dev.enable(key)
 
-    # one or more changed to something not enabled yet to send using udev device? -> udev device has to be re-created
+    # one or more changed to something not provisioned on the virtual device? -> it has to be re-created
     if len(enabled_evdev_keys) > enabled_keys_count and reset_udev:
       reset_udev_device()
 
@@ -1316,52 +1298,74 @@ def load_evdev_key_for_x11(char):
 
     return key
 
-# necessary when are new keys enabled
+# necessary only when is enabled a key outside of the provisioned ones
 def reset_udev_device():
-    global dev, udev
+    global dev, uinput_device, uinput_device_generation
 
-    log.info("Old device at {} ({})".format(udev.devnode, udev.syspath))
-    udev = dev.create_uinput_device()
-    log.info("New device at {} ({})".format(udev.devnode, udev.syspath))
+    # double buffered - events keep going to the old device until the new one is ready
+    old_uinput_device = uinput_device
+    new_uinput_file = open_uinput()
+    new_uinput_device = dev.create_uinput_device(new_uinput_file)
+    log.info("New device at {} ({})".format(new_uinput_device.devnode, new_uinput_device.syspath))
 
-    # Sleep for a little bit so udev, libinput, Xorg, Wayland, ... all have had
-    # a chance to see the device and initialize it. Otherwise the event
+    # Wait until udev processed the device so libinput, Xorg, Wayland, ... all
+    # have had a chance to see the device and initialize it. Otherwise the event
     # will be sent by the kernel but nothing is ready to listen to the
     # device yet
-    sleep(0.5)
+    if not wait_for_udev_device(new_uinput_device.devnode, UINPUT_READY_TIMEOUT):
+        log.debug("Virtual device %s not announced by udev in %ss", new_uinput_device.devnode, UINPUT_READY_TIMEOUT)
+
+    uinput_device = new_uinput_device
+    key_sink.device = new_uinput_device
+    key_sink.uinput_file = new_uinput_file
+    uinput_device_generation += 1
+    log.info("Old device at {} ({}) replaced, generation {}".format(old_uinput_device.devnode, old_uinput_device.syspath, uinput_device_generation))
 
 def load_evdev_keys_for_x11():
-  global enabled_evdev_keys, keymap_loaded, udev
+  global enabled_evdev_keys, keymap_loaded, uinput_device
 
   log.debug("X11 will try to load keymap")
 
   enabled_keys_count = len(enabled_evdev_keys)
 
-  for char in get_keysym_name_associated_to_evdev_key_reflecting_current_layout().copy():
-    load_evdev_key_for_x11(char)
+  min_keycode = display.display.info.min_keycode
+  keyboard_mapping = display.get_keyboard_mapping(min_keycode, display.display.info.max_keycode - min_keycode + 1)
+  modifier_mapping = get_x11_modifier_mapping()
+  cache_key = keymap_cache_key([list(keysyms) for keysyms in keyboard_mapping], [list(keycodes) for keycodes in modifier_mapping])
 
-  # one or more changed to something not enabled yet to send using udev device? -> udev device has to be re-created
+  if not load_keymap_from_cache(cache_key):
+    for char in get_keysym_name_associated_to_evdev_key_reflecting_current_layout().copy():
+      load_evdev_key_for_x11(char)
+    save_keymap_to_cache(cache_key)
+
+  # one or more changed to something not provisioned on the virtual device? -> it has to be re-created
   #
   # BUT only reset if event is not first one - driver is starting and keymap is not loaded yet
-  if len(enabled_evdev_keys) > enabled_keys_count and keymap_loaded and udev:
+  if len(enabled_evdev_keys) > enabled_keys_count and keymap_loaded and uinput_device:
     reset_udev_device()
 
+  compile_macros()
+
   keymap_loaded = True
+  keymap_loaded_event.set()
 
   log.debug("X11 loaded keymap succesfully")
   log.debug(get_keysym_name_associated_to_evdev_key_reflecting_current_layout())
 
 def wl_keyboard_keymap_handler(keyboard, format_, fd, size):
-    global keyboard_state
+    global keyboard_state, keymap_index, wl_keymap_digest
 
     keymap_data = mmap.mmap(
        fd, size, prot=mmap.PROT_READ, flags=mmap.MAP_PRIVATE
     )
+    wl_keymap_digest = keymap_digest(keymap_data)
     xkb_context = xkb.Context()
     keymap = xkb_context.keymap_new_from_buffer(keymap_data, length=size - 1)
     keymap_data.close()
 
     keyboard_state = keymap.state_new()
+    # built when is needed first time, keymap loaded from the cache does not need it
+    keymap_index = None
 
     wl_load_keymap_state()
 
@@ -1393,14 +1397,26 @@ def load_keymap_listener_wayland():
         os.kill(os.getpid(), signal.SIGUSR1)
 
 def load_keymap_listener_x11():
-    global stop_threads, display, listening_touchpad_events_started
+    global stop_threads, display, listening_touchpad_events_started, x11_modifier_mapping
 
     try:
 
       while not stop_threads:
 
         event = display.next_event()
-        if event.type == Xlib.X.MappingNotify and event.count > 0 and event.request == Xlib.X.MappingKeyboard:
+        if event.type != Xlib.X.MappingNotify:
+          continue
+
+        if event.request == Xlib.X.MappingModifier:
+          x11_modifier_mapping = None
+
+          if listening_touchpad_events_started or not keymap_loaded:
+            load_evdev_keys_for_x11()
+
+        elif event.count > 0 and event.request == Xlib.X.MappingKeyboard:
+
+          # keysyms of modifier keycodes might be changed too
+          x11_modifier_mapping = None
 
           if listening_touchpad_events_started or not keymap_loaded:
             display.refresh_keyboard_mapping(event)
@@ -1410,68 +1426,410 @@ def load_keymap_listener_x11():
       log.exception("X11 load keymap listener error. Exiting")
       os.kill(os.getpid(), signal.SIGUSR1)
 
-try:
 
-    # Initialize the device
-    initialize_virtual_device()
+def detect_session():
+    global xdg_session_type
 
-    if xdg_session_type == "wayland":
-        t = threading.Thread(target=load_keymap_listener_wayland)
-        t.daemon = True
-        threads.append(t)
-        t.start()
+    xdg_session_type = os.environ.get('XDG_SESSION_TYPE')
+    if not xdg_session_type:
+        # e.g. a system service started before the login, the desktop agent brings the session later
+        log.warning("XDG session type is not set, the focused window and the touchpad toggling are left to the desktop agent and text macros are not available")
 
-    if xdg_session_type == "x11" and display:
+def import_device_modules():
+    """
+    Imports libevdev and pyinotify when the driver starts, not with this file.
+    """
+    global EV_KEY, Device, device, WatchManager, Notifier, IN_CLOSE_WRITE, IN_IGNORED, IN_MOVED_TO
 
-        # when is the driver starting event is not received
-        load_evdev_keys_for_x11()
+    from libevdev import EV_KEY, Device, device
+    from pyinotify import WatchManager, IN_CLOSE_WRITE, IN_IGNORED, IN_MOVED_TO, Notifier
 
-        t = threading.Thread(target=load_keymap_listener_x11)
-        t.daemon = True
-        threads.append(t)
-        t.start()
+def import_session_modules():
+    """
+    Imports what only the detected session needs.
+    """
+    global Xlib, xkb, Display, WlSeat, KeymapIndex
 
-    # wait until is keymap loaded
-    while not keymap_loaded:
-        sleep(0.5)
+    if xdg_session_type == "x11":
+        import Xlib.display
+        import Xlib.X
+        import Xlib.XK
+    else:
+        from pywayland.client import Display
+        from pywayland.protocol.wayland import WlSeat
+        from xkbcommon import xkb
+        from keymap_index import KeymapIndex
 
-    # Load config values
-    load_all_config_values()
-    config_lock.acquire()
-    config_save()
-    config_lock.release()
-    # because inotify (deadlock)
-    sleep(0.5)
+def connect_display():
+    global display, display_var, display_wayland, display_wayland_var
 
-    watch_manager = WatchManager()
+    if xdg_session_type == "x11":
+        try:
+            display_var = os.environ.get('DISPLAY')
+            display = Xlib.display.Display(display_var)
+            log.info("X11 session detected and connected.")
+        except Exception as e:
+            log.error(f"Failed to connect to X11 display: {e}")
+            sys.exit(1)
+    else:
+        try:
+            display_wayland_var = os.environ.get('WAYLAND_DISPLAY')
+            display_wayland = Display(display_wayland_var)
+            display_wayland.connect()
+            log.info("Wayland session detected and connected.")
+        except Exception as e:
+            log.error(f"Failed to connect to Wayland display: {e}")
+            sys.exit(1)
 
-    path = os.path.abspath(config_file_dir)
-    mask = IN_CLOSE_WRITE | IN_IGNORED | IN_MOVED_TO
-    watch_manager.add_watch(path, mask)
+    desktop.use_session(xdg_session_type, display, display_var, display_wayland_var)
 
-    event_notifier = AsyncNotifier(watch_manager)
+def load_layout():
+    global model, model_layout, config_file_dir, config_file_path, app_shortcuts, dispatcher
 
-    t = threading.Thread(target=check_dialpad_automatical_disable_or_idle_due_inactivity)
-    t.daemon = True
-    threads.append(t)
-    t.start()
+    if len(sys.argv) > 1:
+        model = sys.argv[1]
+    try:
+        model_layout = importlib.import_module('layouts.' + model)
+    except:
+        log.error("DialPad layout *.py from dir layouts is required as first argument. Re-run install script or add missing first argument (valid value is default).")
+        sys.exit(1)
+
+    if len(sys.argv) > 2:
+        config_file_dir = sys.argv[2]
+    # When is given config dir empty or is used default -> to ./ because inotify needs check folder (nor nothing = "")
+    if config_file_dir == "":
+         config_file_dir = "./"
+
+    config_file_path = config_file_dir + CONFIG_FILE_NAME
+
+    # App-specific configuration (add more mappings as needed)
+    app_shortcuts = getattr(model_layout, "app_shortcuts", {})
+    dispatcher = ShortcutDispatcher(app_shortcuts, lambda: focus_provider.active_window_title(), send_key_event, latency_stats, send_text)
+
+def set_keyboard(device):
+    global keyboard
+
+    keyboard = str(device.event)
+    log.info('Set keyboard %s \"%s\"', device.devnode, device.name)
 
-    if keyboard:
-        t = threading.Thread(target=listen_keyboard_events)
-        t.daemon = True
-        threads.append(t)
-        t.start()
+def find_devices():
+    devices = read_input_devices()
+    touchpad_devices = find_dialpad_touchpads(devices)
 
-    t = threading.Thread(target=check_gnome_layout)
+    # might be still probed (e.g. right after boot)
+    if not touchpad_devices:
+        wait_for_change('/dev/input', DEVICES_WAIT_TIMEOUT, done=lambda: len(find_dialpad_touchpads(read_input_devices())) > 0)
+        devices = read_input_devices()
+        touchpad_devices = find_dialpad_touchpads(devices)
+
+    keyboard_device = find_keyboard(devices)
+    if keyboard_device:
+        set_keyboard(keyboard_device)
+    else:
+        # keyboard is optional, no sys.exit(1)!
+        log.error("Can't find keyboard")
+
+    for touchpad_device in touchpad_devices:
+        engine = create_engine(touchpad_device)
+        log.info('Found touchpad %s (i2c bus %s, %s, address 0x%x)', engine, engine.i2c_bus, touchpad_device.i2c_client, engine.i2c_address)
+
+        # Open a handle to "/dev/i2c-x", representing the I2C bus
+        if engine.check_i2c():
+            engines.append(engine)
+
+    if not engines:
+        log.error("Can't find touchpad connected via I2C, input devices: %s", ", ".join('\"{}\"'.format(device.name) for device in devices))
+        sys.exit(1)
+
+def dump_trace(args=()):
+    path = trace_buffer.dump(args[0] if args else None)
+    log.info("Trace of the last %d records dumped to %s", min(trace_buffer.count, trace_buffer.capacity), path)
+    return path
+
+def metrics(args=()):
+    if args:
+        latency_stats.write(args[0])
+        return args[0]
+
+    return latency_stats.prometheus_text()
+
+def on_trace_dump_signal(signum, frame):
+    try:
+        dump_trace()
+    except OSError as e:
+        log.error("Trace dump failed: %s", e)
+
+def profile(args=()):
+    if not args or args[0] == "status":
+        return profiler.status()
+
+    if args[0] == "start":
+        mode = args[1] if len(args) > 1 else MODE_CPROFILE
+        if len(args) > 2:
+            return profiler.start(mode, float(args[2]) / 1000)
+        return profiler.start(mode)
+
+    if args[0] == "stop":
+        return profiler.stop()
+
+    return "usage: profile start [{}|{}] [interval ms] | stop | status".format(MODE_CPROFILE, MODE_SAMPLE)
+
+def call_in_loop(function, timeout=2):
+    """
+    Runs function in the touch loop thread between frames and returns its result.
+    """
+    done = threading.Event()
+    result = []
+
+    def call():
+        try:
+            result.append(function())
+        except Exception as e:
+            log.exception("Call in the touchpad events loop failed")
+            result.append(e)
+        done.set()
+
+    loop_calls.append(call)
+    if not done.wait(timeout):
+        raise TimeoutError("the touchpad events loop did not respond in {}s".format(timeout))
+
+    if isinstance(result[0], Exception):
+        raise result[0]
+
+    return result[0]
+
+def start_capture(path=None):
+    global capture_writer
+
+    if capture_writer:
+        return "capture is already running, {}".format(capture_writer.path)
+
+    capture_writer = CaptureWriter(path)
+    # modifiers which are already held
+    for modifier in active_modifiers.copy():
+        capture_writer.keyboard(monotonic(), EV_KEY.value, modifier.value, 1)
+    for engine in engines:
+        engine.start_capture(capture_writer)
+
+    log.info("Capturing touchpad events to %s", capture_writer.path)
+    return capture_writer.path
+
+def stop_capture():
+    global capture_writer
+
+    if not capture_writer:
+        return "capture is not running"
+
+    for engine in engines:
+        engine.stop_capture()
+
+    writer = capture_writer
+    capture_writer = None
+    writer.close()
+
+    log.info("Capture of %d records written to %s", writer.records_count, writer.path)
+    return writer.path
+
+def capture(args=()):
+    if args and args[0] == "start":
+        return call_in_loop(lambda: start_capture(args[1] if len(args) > 1 else None))
+
+    if args and args[0] == "stop":
+        return call_in_loop(stop_capture)
+
+    if args and args[0] != "status":
+        return "usage: capture start [path] | stop | status"
+
+    if capture_writer:
+        return "capturing to {}, {} records".format(capture_writer.path, capture_writer.records_count)
+
+    return "capture is not running"
+
+def apply_realtime_mode():
+    global realtime_mode
+
+    try:
+        realtime_mode = RealtimeMode(realtime_priority, realtime_nice, parse_cpus(realtime_cpus), realtime_lock_memory, parse_gc_threshold(realtime_gc_threshold))
+    except ValueError as e:
+        log.error("Realtime mode is misconfigured: %s", e)
+        return
+
+    realtime_mode.apply()
+
+def run_touch_loop():
+    # SCHED_FIFO, the niceness and the CPU affinity are per thread, the touch
+    # loop alone gets them, the startup allocations are done by now
+    if realtime:
+        apply_realtime_mode()
+
+    try:
+        listen_touchpad_events()
+    finally:
+        # a running cProfile can be written only by the thread it profiles
+        profiler.close()
+
+def realtime_status(args=()):
+    if realtime_mode:
+        return realtime_mode.status(frame_jitter)
+
+    return "realtime mode: disabled\n" + frame_jitter.report()
+
+def on_profile_signal(signum, frame):
+    # stopping waits for the touch loop, not in a signal handler
+    threading.Thread(target=lambda: log.info(profiler.toggle()), daemon=True).start()
+
+def start_control_server():
+    global control_server
+
+    control_server = ControlServer()
+    control_server.register("trace-dump", dump_trace, "writes the trace ring buffer to a file ([path]), prints the path")
+    control_server.register("metrics", metrics, "latency histograms of the pipeline stages in Prometheus text format, written to [path] when is given")
+    control_server.register("capture", capture, "start [path] | stop | status, records touchpad frames and modifier keys for python -m replay")
+    control_server.register("realtime", realtime_status, "realtime mode of the touch loop and p50/p99 wakeup and processing jitter of the last frames")
+    control_server.register("profile", profile, "start [cprofile|sample] [interval ms] | stop | status, profile of the running driver, stop prints the file written")
+
+    try:
+        control_server.open()
+    except OSError as e:
+        log.warning("Control socket %s is not available: %s", control_server.path, e)
+        control_server = None
+        return
+
+    start_thread(lambda: control_server.serve(lambda: stop_threads))
+
+def on_agent_disconnect():
+    # the core follows the session itself again
+    if xdg_session_type:
+        focus_provider.watch()
+
+    update_gnome_layout()
+
+def start_agent_link():
+    global agent_link
+
+    # layout changes were left to the agent, the one of now is not known
+    agent_link = AgentLink(on_layout=set_gnome_wayland_layout, on_disconnect=on_agent_disconnect)
+
+    try:
+        agent_link.open()
+    except OSError as e:
+        log.warning("Desktop agent socket %s is not available: %s", agent_link.path, e)
+        agent_link = None
+        return
+
+    start_thread(lambda: agent_link.serve(lambda: stop_threads))
+
+def startup_phase(name):
+    if startup_profile:
+        return startup_profile.phase(name)
+
+    return nullcontext()
+
+def start_thread(target):
+    t = threading.Thread(target=target)
     t.daemon = True
     threads.append(t)
     t.start()
 
-    # Start the touchpad listener in a separate thread
-    listen_touchpad_events()
-except:
-    logging.exception("Listening touchpad events unexpectedly failed")
-finally:
-    cleanup()
-    log.info("Exiting")
-    sys.exit(1)
\ No newline at end of file
+def main():
+    global watch_manager, event_notifier, stop_threads
+
+    setup_logging()
+
+    with startup_phase("session"):
+        detect_session()
+        if xdg_session_type:
+            import_session_modules()
+            connect_display()
+
+    with startup_phase("layout"):
+        # the layout imports libevdev too
+        import_device_modules()
+        load_layout()
+
+    with startup_phase("devices"):
+        find_devices()
+
+    exit_code = 1
+
+    try:
+
+        # Initialize the device
+        with startup_phase("virtual device"):
+            initialize_virtual_device()
+
+        with startup_phase("keymap"):
+            if xdg_session_type == "wayland":
+                start_thread(load_keymap_listener_wayland)
+
+            if xdg_session_type == "x11" and display:
+
+                # when is the driver starting event is not received
+                load_evdev_keys_for_x11()
+
+                start_thread(load_keymap_listener_x11)
+
+            # without a session only the default keys of the layout are sent
+            if not xdg_session_type:
+                keymap_loaded_event.set()
+
+            # wait until is keymap loaded
+            keymap_loaded_event.wait()
+
+        with startup_phase("config"):
+            # Load config values
+            load_all_config_values()
+            config_lock.acquire()
+            config_save()
+            config_lock.release()
+
+            watch_manager = WatchManager()
+
+            path = os.path.abspath(config_file_dir)
+            mask = IN_CLOSE_WRITE | IN_IGNORED | IN_MOVED_TO
+            watch_manager.add_watch(path, mask)
+
+            event_notifier = Notifier(watch_manager, default_proc_fun=on_config_dir_event)
+
+        with startup_phase("threads"):
+            start_thread(check_config_values_changes)
+            start_thread(check_dialpad_automatical_disable_or_idle_due_inactivity)
+
+            if keyboard:
+                start_thread(listen_keyboard_events)
+
+            if xdg_session_type:
+                start_thread(check_gnome_layout)
+                # the desktop fallbacks without an agent, off the touch loop thread
+                focus_provider.watch()
+                start_thread(touchpad_toggler.run)
+
+            start_control_server()
+            start_agent_link()
+            signal.signal(signal.SIGUSR2, on_trace_dump_signal)
+            signal.signal(signal.SIGRTMIN, on_profile_signal)
+
+        # profiling run ends when the driver would start listening
+        if startup_profile:
+            exit_code = 0 if startup_profile.report() else 1
+            return
+
+        # this thread only waits and runs the signal handlers
+        touch_loop = threading.Thread(target=run_touch_loop, name='touch-loop', daemon=True)
+        touch_loop.start()
+        try:
+            while touch_loop.is_alive():
+                touch_loop.join(1)
+        finally:
+            # e.g. Ctrl+C here, the loop ends within its select timeout
+            stop_threads = True
+            touch_loop.join(TOUCH_LOOP_STOP_TIMEOUT)
+    except:
+        logging.exception("Listening touchpad events unexpectedly failed")
+    finally:
+        cleanup()
+        log.info("Exiting")
+        sys.exit(exit_code)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+
+import logging
+import os
+import re
+import socket
+from typing import NamedTuple, Optional
+
+log = logging.getLogger('asus-dialpad-driver')
+
+SYS_CLASS_INPUT = '/sys/class/input'
+DEV_INPUT = '/dev/input'
+
+NETLINK_KOBJECT_UEVENT = 15
+# multicast group of uevents sent by the kernel itself (udev re-broadcasts them in group 2)
+UEVENT_KERNEL_GROUP = 1
+UEVENT_BUFFER_SIZE = 64 * 1024
+
+# https://github.com/mohamed-badaoui/asus-touchpad-numpad-driver/issues/87
+# https://github.com/asus-linux-drivers/asus-numberpad-driver/issues/95
+# https://github.com/asus-linux-drivers/asus-numberpad-driver/issues/110
+# https://github.com/asus-linux-drivers/asus-numberpad-driver/issues/161
+# https://github.com/asus-linux-drivers/asus-numberpad-driver/issues/198
+TOUCHPAD_NAME_PREFIXES = ("ASUE", "ELAN", "ASUP", "ASUF", "ASCE", "ASCF", "ASCP")
+KEYBOARD_NAME_PREFIXES = ("ASUE", "Asus", "ASUP", "ASUF")
+# https://github.com/asus-linux-drivers/asus-numberpad-driver/issues/161
+TOUCHPAD_NAMES_WITH_ADDR_0X38 = ("ASUF1416", "ASUF1205", "ASUF1204")
+
+EVENT_NODE_RE = re.compile(r'^event(\d+)$')
+I2C_BUS_RE = re.compile(r'^i2c-(\d+)$')
+
+
+class InputDevice(NamedTuple):
+    """
+    One evdev node with what is known about it from sysfs.
+    """
+    name: str
+    event: int  # N of /dev/input/eventN
+    devnode: str
+    sysfs_path: str  # resolved path of the event node in /sys/devices
+    i2c_bus: Optional[int]  # N of /dev/i2c-N the device is connected to
+    i2c_client: Optional[str]  # e.g. "i2c-ASUE140D:00"
+
+
+def read_sysfs_attribute(path):
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def read_input_device(event_path):
+    """
+    Record of the event node at event_path (/sys/class/input/eventN or its
+    /sys/devices path), None when it is not an event node or it is gone.
+    """
+    match = EVENT_NODE_RE.match(os.path.basename(event_path))
+    if not match:
+        return None
+
+    name = read_sysfs_attribute(os.path.join(event_path, 'device', 'name'))
+    if name is None:
+        return None
+
+    sysfs_path = os.path.realpath(event_path)
+
+    # the closest i2c adapter and client on the way up to the root
+    i2c_bus = None
+    i2c_client = None
+    for part in reversed(sysfs_path.split(os.sep)):
+        bus_match = I2C_BUS_RE.match(part)
+        if bus_match:
+            i2c_bus = int(bus_match.group(1))
+            break
+        if part.startswith('i2c-') and i2c_client is None:
+            i2c_client = part
+
+    return InputDevice(
+        name=name,
+        event=int(match.group(1)),
+        devnode=os.path.join(DEV_INPUT, match.group(0)),
+        sysfs_path=sysfs_path,
+        i2c_bus=i2c_bus,
+        i2c_client=i2c_client if i2c_bus is not None else None
+    )
+
+
+def read_input_devices(sys_class_input=SYS_CLASS_INPUT):
+    """
+    Records of all event nodes, sorted by event number.
+    """
+    try:
+        entries = os.listdir(sys_class_input)
+    except OSError:
+        return []
+
+    devices = []
+    for entry in entries:
+        device = read_input_device(os.path.join(sys_class_input, entry))
+        if device:
+            devices.append(device)
+
+    devices.sort(key=lambda device: device.event)
+    return devices
+
+
+def is_touchpad(device):
+    return device.name.startswith(TOUCHPAD_NAME_PREFIXES) and "Touchpad" in device.name and "9009" not in device.name
+
+
+def is_keyboard(device):
+    return device.name.startswith("AT Translated Set 2 keyboard") or\
+        (device.name.startswith(KEYBOARD_NAME_PREFIXES) and "Keyboard" in device.name)
+
+
+def find_touchpads(devices):
+    """
+    Touchpads connected via I2C (the DialPad is driven over its I2C bus).
+    """
+    return [device for device in devices if is_touchpad(device) and device.i2c_bus is not None]
+
+
+def find_touchpad(devices):
+    return next(iter(find_touchpads(devices)), None)
+
+
+def find_keyboard(devices):
+    return next((device for device in devices if is_keyboard(device)), None)
+
+
+def touchpad_i2c_address(device):
+    if any(name in device.name for name in TOUCHPAD_NAMES_WITH_ADDR_0X38):
+        return 0x38
+
+    return 0x15
+
+
+class UeventMonitor:
+    """
+    Kernel uevents over netlink, e.g. an input device added after resume from
+    suspend or after its driver was re-bound.
+    """
+
+    def __init__(self, timeout=1):
+        self.socket = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM | socket.SOCK_CLOEXEC, NETLINK_KOBJECT_UEVENT)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, UEVENT_BUFFER_SIZE)
+        self.socket.bind((0, UEVENT_KERNEL_GROUP))
+        self.socket.settimeout(timeout)
+
+    def receive(self):
+        """
+        Next uevent as {"ACTION": "add", "DEVPATH": ..., "SUBSYSTEM": ..., ...},
+        None when nothing arrived within timeout.
+        """
+        try:
+            data = self.socket.recv(UEVENT_BUFFER_SIZE)
+        except socket.timeout:
+            return None
+
+        return parse_uevent(data)
+
+    def fileno(self):
+        return self.socket.fileno()
+
+    def close(self):
+        self.socket.close()
+
+
+def parse_uevent(data):
+    # "ACTION@DEVPATH\0KEY=VALUE\0KEY=VALUE\0..."
+    uevent = {}
+    for field in data.split(b'\0')[1:]:
+        key, sep, value = field.partition(b'=')
+        if sep:
+            uevent[key.decode(errors='replace')] = value.decode(errors='replace')
+
+    return uevent
+
+
+def uevent_input_device(uevent):
+    """
+    Record of the event node the uevent is about, None for other devices.
+    """
+    if uevent.get('SUBSYSTEM') != 'input' or not EVENT_NODE_RE.match(os.path.basename(uevent.get('DEVPATH', ''))):
+        return None
+
+    return read_input_device('/sys' + uevent['DEVPATH'])
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+import logging
+from time import monotonic
+
+from latency import STAGE_FOCUS_RESOLUTION
+
+log = logging.getLogger('asus-dialpad-driver')
+
+
+def shortcut_name(shortcut):
+    # key or text of a macro
+    return shortcut["key"].name if "key" in shortcut else repr(shortcut["text"])
+
+
+class ShortcutDispatcher:
+    """
+    Turns gestures into key events of the shortcut of the focused application.
+
+    focus() - title of the active window or None
+    send_key(key_code, press) - sends one key event
+    latency - latency.LatencyStats the focus resolution is observed by
+    send_text(text) - types the text of a {"text": ...} shortcut (macro.MacroCompiler)
+
+    The driver passes the window manager and the virtual device, the replay
+    (python -m replay) a fixed window title and a recording sink.
+    """
+
+    def __init__(self, app_shortcuts, focus, send_key, latency=None, send_text=None):
+        self.app_shortcuts = app_shortcuts
+        self.focus = focus
+        self.send_key = send_key
+        self.latency = latency
+        self.send_text = send_text
+
+    def send(self, shortcut):
+        if "text" in shortcut:
+            if self.send_text:
+                self.send_text(shortcut["text"])
+            return
+
+        self.send_key(shortcut["key"], True)
+        self.send_key(shortcut["key"], False)
+
+    def dispatch(self, touch_input, event_code, active_modifiers, duration_held=0, latency=None):
+        resolution_start = monotonic()
+
+        # Get active window title
+        window_title = self.focus()
+
+        # Determine app-specific shortcuts
+        app_name = next((app for app in self.app_shortcuts if app in window_title.lower()), None) if window_title else None
+        shortcuts = self.app_shortcuts.get(app_name, self.app_shortcuts["none"])
+
+        matched_shortcuts = shortcuts.get(touch_input, [])
+        if not isinstance(matched_shortcuts, list):
+            matched_shortcuts = [matched_shortcuts]
+
+        prioritized_shortcuts = sorted(matched_shortcuts, key=lambda s: "modifier" not in s)
+
+        if self.latency is not None:
+            self.latency.observe(STAGE_FOCUS_RESOLUTION, monotonic() - resolution_start)
+
+        for shortcut in prioritized_shortcuts:
+            trigger_mode = shortcut.get("trigger", "release")
+            modifier = shortcut.get("modifier")
+            required_duration = shortcut.get("duration", 0)  # Default to 0 (immediate)
+
+            # Ensure correct modifiers
+            if (modifier and modifier in active_modifiers) or (not modifier and not active_modifiers):
+                if duration_held >= required_duration:
+                    if (trigger_mode == "immediate" and event_code) or (trigger_mode == "release" and not event_code):
+                        self.send(shortcut)
+
+                        # one record per executed shortcut, the key events themselves are logged at DEBUG
+                        key_name = shortcut_name(shortcut)
+                        log.info("Executed shortcut: %s with modifier %s (Held for %.2fs)", key_name, modifier.name if modifier else None, duration_held, extra={
+                            "GESTURE": touch_input,
+                            "APP": app_name or "none",
+                            "KEY": key_name,
+                            "MODIFIER": modifier.name if modifier else "",
+                            "DURATION_HELD": duration_held,
+                            "LATENCY_MS": latency * 1000 if latency is not None else ""
+                        })
+                    return  # Stop after first valid shortcut
+                else:
+                    if (trigger_mode == "immediate" and not event_code) or (trigger_mode == "release" and not event_code):
+                        if log.isEnabledFor(logging.DEBUG):
+                            key_name = shortcut_name(shortcut)
+                            log.debug("Shortcut %s requires %ss, but was held for %.2fs", key_name, required_duration, duration_held, extra={
+                                "GESTURE": touch_input,
+                                "APP": app_name or "none",
+                                "KEY": key_name,
+                                "DURATION_HELD": duration_held
+                            })
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+
+import logging
+import os
+from time import CLOCK_MONOTONIC, monotonic, time
+
+from discovery import touchpad_i2c_address
+from evdev_reader import EventReader, grab, query_touchpad_state, set_clock_id
+from gesture import DialGesture
+from latency import STAGE_KERNEL_TO_FRAME
+
+log = logging.getLogger('asus-dialpad-driver')
+
+
+class EvdevTouchpadSource:
+    """
+    Frames of a touchpad evdev node (hal.InputSource).
+
+    raw_event_reader - read in bulk by evdev_reader.EventReader, otherwise
+    event by event by libevdev
+    exclusive - nobody else gets the events of the touchpad (the self-test
+    touchpad must not move the pointer of the session)
+
+    libevdev is imported when the source is opened, the engine itself runs
+    without it (e.g. with hal.FakeTouchpadSource).
+    """
+
+    def __init__(self, devnode, raw_event_reader=True, exclusive=False):
+        self.devnode = devnode
+        self.raw_event_reader = raw_event_reader
+        self.exclusive = exclusive
+        self.fd = None
+        self.d = None
+        self.reader = None
+        self.max_x = 0
+        self.num_slots = 1
+        # clock of the event timestamps, monotonic when the kernel could be switched to it
+        self.clock = time
+        # events of an unfinished frame read by libevdev
+        self.libevdev_events = []
+
+    def open(self):
+        from libevdev import EV_ABS, Device
+
+        self.fd = open(self.devnode, 'rb')
+
+        # timestamps comparable with time.monotonic(), immune to wall clock changes
+        try:
+            set_clock_id(self.fd.fileno(), CLOCK_MONOTONIC)
+            self.clock = monotonic
+        except OSError as e:
+            log.debug("Touchpad %s keeps realtime event timestamps: %s", self.devnode, e)
+            self.clock = time
+
+        if self.exclusive:
+            grab(self.fd.fileno())
+
+        self.d = Device(self.fd)
+
+        # Get touchpad dimensions
+        abs_x = self.d.absinfo[EV_ABS.ABS_X]
+        abs_y = self.d.absinfo[EV_ABS.ABS_Y]
+        self.max_x = abs_x.maximum
+        log.info('Touchpad %s min-max: x %d-%d, y %d-%d', self.devnode, abs_x.minimum, abs_x.maximum, abs_y.minimum, abs_y.maximum)
+        abs_mt_slot = self.d.absinfo[EV_ABS.ABS_MT_SLOT]
+        self.num_slots = abs_mt_slot.maximum + 1 if abs_mt_slot else 1
+
+        if self.raw_event_reader:
+            self.reader = EventReader(self.fd.fileno())
+        else:
+            # libevdev reads until nothing is left instead of blocking
+            os.set_blocking(self.fd.fileno(), False)
+
+    def fileno(self):
+        return self.fd.fileno()
+
+    def read_frames(self):
+        if self.reader:
+            return self.reader.read_frames()
+
+        from libevdev import EV_SYN, device
+
+        frames = []
+        try:
+            for event in self.d.events():
+                if event.matches(EV_SYN.SYN_REPORT):
+                    frames.append((event.sec + event.usec / 1000000, self.libevdev_events))
+                    self.libevdev_events = []
+                else:
+                    self.libevdev_events.append((event.type.value, event.code.value, event.value))
+        except device.EventsDroppedException:
+            # kernel buffer overflowed, libevdev rebuilds its state from the device
+            for _ in self.d.sync():
+                pass
+            self.libevdev_events = []
+            return frames, True
+
+        return frames, False
+
+    def has_pending(self):
+        # events following SYN_DROPPED are already in the buffer
+        return self.reader is not None and self.reader.unsplit
+
+    def touchpad_state(self):
+        if self.reader:
+            return query_touchpad_state(self.fd.fileno(), self.num_slots)
+
+        from libevdev import EV_ABS
+
+        # Current touchpad state tracked by libevdev in the same shape as evdev_reader.query_touchpad_state()
+        slot_values = {}
+        for code in (EV_ABS.ABS_MT_TRACKING_ID, EV_ABS.ABS_MT_POSITION_X, EV_ABS.ABS_MT_POSITION_Y, EV_ABS.ABS_MT_TOOL_TYPE):
+            if self.d.has(code):
+                slot_values[code.value] = [self.d.slots[slot][code] for slot in range(self.num_slots)]
+
+        return self.d.current_slot, slot_values
+
+    def close(self):
+        if self.fd:
+            try:
+                self.fd.close()
+            except OSError:
+                pass
+            self.fd = None
+
+
+class I2CDialPadController:
+    """
+    DialPad turned on and off over its I2C bus (hal.DialPadController), smbus2 is imported on first use.
+    """
+
+    def __init__(self, i2c_bus, i2c_address, name=""):
+        self.i2c_bus = i2c_bus
+        self.i2c_address = i2c_address
+        self.name = name
+
+    def check(self):
+        """
+        Whether the I2C bus of the DialPad can be opened.
+        """
+        try:
+            from smbus2 import SMBus
+
+            bus = SMBus()
+            bus.open(self.i2c_bus)
+            bus.close()
+            return True
+        except Exception as e:
+            log.error("Can't open the I2C bus connection (id: %s) of %s: %s", self.i2c_bus, self.name, e)
+            return False
+
+    def send(self, value):
+        try:
+            from smbus2 import SMBus, i2c_msg
+
+            with SMBus(self.i2c_bus) as bus:
+                data = [0x05, 0x00, 0x3d, 0x03, 0x06, 0x00, 0x07, 0x00, 0x0d, 0x14, 0x03, int(value, 16), 0xad]
+                msg = i2c_msg.write(self.i2c_address, data)
+                bus.i2c_rdwr(msg)
+        except Exception as e:
+            log.error('Error during sending via i2c to %s: \"%s\"', self.name, e)
+
+    def activate(self):
+        # unlock
+        self.send("0x60")
+        # activate
+        self.send("0x01")
+
+    def deactivate(self):
+        # lock
+        self.send("0x61")
+        # deactivate
+        self.send("0x00")
+
+
+class DialPadEngine:
+    """
+    One DialPad - its touchpad, I2C controller and gesture state.
+
+    The touchpad fd is meant to be watched by a shared selector, process() then
+    handles whatever the touchpad has sent so far and never blocks. Output
+    (shortcuts, the virtual device) is shared by all engines of the driver.
+
+    Callbacks get the engine as the first argument:
+    on_gesture(engine, name, pressed, duration_held)
+    on_icon(engine)
+    on_touchpad_send_events(engine, enabled)
+    on_events_dropped(engine, events_count)
+    is_enabled()
+
+    trace - tracebuffer.TraceBuffer the gesture decisions are recorded to
+    latency - latency.LatencyStats the kernel to frame latency is observed by
+    jitter - realtime.FrameJitter the wakeup and processing time of every frame is observed by
+    capture - capture.CaptureSource the frames are recorded to, see start_capture()
+    controller - hal.DialPadController, I2C of the input device by default
+    source - hal.InputSource, the evdev node of the input device by default
+    exclusive - the default source grabs the touchpad
+    """
+
+    def __init__(self, input_device, layout, on_gesture, on_icon, on_touchpad_send_events, on_events_dropped, is_enabled, slices_count=4, activation_time=1, trace=None, latency=None, jitter=None, controller=None, source=None, exclusive=False):
+        self.input_device = input_device
+        self.name = input_device.name
+        self.i2c_bus = input_device.i2c_bus
+        self.i2c_address = touchpad_i2c_address(input_device)
+        self.layout = layout
+
+        self.on_gesture = on_gesture
+        self.on_icon = on_icon
+        self.on_touchpad_send_events = on_touchpad_send_events
+        self.on_events_dropped = on_events_dropped
+        self.is_enabled = is_enabled
+        self.slices_count = slices_count
+        self.activation_time = activation_time
+        self.trace = trace
+        self.latency = latency
+        self.jitter = jitter
+        self.capture = None
+
+        self.controller = controller or I2CDialPadController(self.i2c_bus, self.i2c_address, repr(self))
+        # the default one is created by open(), the reader depends on the config
+        self.source = source
+        self.exclusive = exclusive
+        self.gesture = None
+        # events since start or the last drop
+        self.events_count = 0
+        # when was the frame being processed read (by self.clock)
+        self.frame_time = 0
+
+    def __repr__(self):
+        return '{} "{}"'.format(self.input_device.devnode, self.name)
+
+    @property
+    def clock(self):
+        return self.source.clock if self.source else time
+
+    def check_i2c(self):
+        return self.controller.check()
+
+    def activate(self):
+        self.controller.activate()
+
+        if self.capture:
+            self.capture.state(self.clock(), self.slices_count, self.activation_time, True)
+
+    def deactivate(self):
+        self.controller.deactivate()
+
+        if self.capture:
+            self.capture.state(self.clock(), self.slices_count, self.activation_time, False)
+
+    def open(self, raw_event_reader=True):
+        if self.source is None or isinstance(self.source, EvdevTouchpadSource):
+            self.source = EvdevTouchpadSource(self.input_device.devnode, raw_event_reader, self.exclusive)
+        self.source.open()
+
+        self.gesture = DialGesture(
+            self.layout,
+            self.source.max_x,
+            on_gesture=lambda name, pressed, duration_held: self.on_gesture(self, name, pressed, duration_held),
+            on_icon=lambda: self.on_icon(self),
+            on_touchpad_send_events=lambda enabled: self.on_touchpad_send_events(self, enabled),
+            is_enabled=self.is_enabled,
+            slices_count=self.slices_count,
+            activation_time=self.activation_time,
+            num_slots=self.source.num_slots,
+            trace=self.trace
+        )
+
+        # contacts which are already on the touchpad
+        self.resync()
+
+    def close(self):
+        if self.gesture:
+            self.gesture.cancel()
+
+        if self.source:
+            self.source.close()
+
+    def fileno(self):
+        return self.source.fileno()
+
+    def set_config(self, slices_count, activation_time):
+        self.slices_count = slices_count
+        self.activation_time = activation_time
+        if self.gesture:
+            self.gesture.slices_count = slices_count
+            self.gesture.activation_time = activation_time
+
+        if self.capture:
+            self.capture.state(self.clock(), slices_count, activation_time, self.is_enabled())
+
+    def start_capture(self, writer):
+        """
+        Records everything the gesture gets from now on by writer (capture.CaptureWriter).
+
+        Call it between frames, from the thread which processes them.
+        """
+        self.capture = writer.add_touchpad(self.clock(), self.name, self.source.max_x, self.source.num_slots, self.slices_count, self.activation_time, self.is_enabled())
+        self.capture.resync(self.clock(), *self.touchpad_state())
+
+    def stop_capture(self):
+        self.capture = None
+
+    def touchpad_state(self):
+        return self.source.touchpad_state()
+
+    def resync(self):
+        state = self.touchpad_state()
+        if self.capture:
+            self.capture.resync(self.clock(), *state)
+        self.gesture.resync(*state)
+
+    def events_dropped(self):
+        # kernel buffer overflowed, rebuild state from the device and continue
+        self.on_events_dropped(self, self.events_count)
+        self.events_count = 0
+
+        self.resync()
+
+    def process(self):
+        """
+        Handles the events the touchpad has sent so far, returns the number of frames.
+
+        Raises OSError (or EOFError) when is the touchpad gone.
+        """
+        frames_count = 0
+
+        while True:
+            frames, dropped = self.source.read_frames()
+            if frames:
+                self.frame_time = self.clock()
+            for timestamp, events in frames:
+                self.events_count += len(events) + 1
+                if self.latency is not None:
+                    self.latency.observe(STAGE_KERNEL_TO_FRAME, self.frame_time - timestamp)
+                if self.capture:
+                    self.capture.frame(timestamp, events)
+                if self.jitter is not None:
+                    processing_start = self.clock()
+                    self.gesture.process_frame(timestamp, events)
+                    self.jitter.observe(self.frame_time - timestamp, self.clock() - processing_start)
+                else:
+                    self.gesture.process_frame(timestamp, events)
+            frames_count += len(frames)
+
+            if dropped:
+                self.events_dropped()
+
+            if not self.source.has_pending():
+                break
+
+        return frames_count
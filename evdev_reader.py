@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+
+import fcntl
+import os
+import struct
+
+import numpy as np
+
+# Event types and codes from linux/input-event-codes.h (only the ones used without libevdev)
+EV_SYN = 0x00
+EV_KEY = 0x01
+EV_ABS = 0x03
+SYN_REPORT = 0
+SYN_DROPPED = 3
+KEY_MAX = 0x2ff
+BTN_TOOL_FINGER = 0x145
+ABS_MT_SLOT = 0x2f
+ABS_MT_POSITION_X = 0x35
+ABS_MT_POSITION_Y = 0x36
+ABS_MT_TOOL_TYPE = 0x37
+ABS_MT_TRACKING_ID = 0x39
+MT_TOOL_PALM = 0x02
+
+# struct input_event { struct timeval time; __u16 type; __u16 code; __s32 value; }
+INPUT_EVENT_FORMAT = '@llHHi'
+INPUT_EVENT_SIZE = struct.calcsize(INPUT_EVENT_FORMAT)
+INPUT_EVENT_DTYPE = np.dtype([
+    ('sec', np.dtype('l')),
+    ('usec', np.dtype('l')),
+    ('type', np.uint16),
+    ('code', np.uint16),
+    ('value', np.int32),
+], align=True)
+
+assert INPUT_EVENT_DTYPE.itemsize == INPUT_EVENT_SIZE
+
+# struct input_absinfo { __s32 value; __s32 minimum; __s32 maximum; __s32 fuzz; __s32 flat; __s32 resolution; }
+INPUT_ABSINFO_FORMAT = '@6i'
+INPUT_ABSINFO_SIZE = struct.calcsize(INPUT_ABSINFO_FORMAT)
+
+# default count of events which fits into one read
+DEFAULT_CAPACITY = 1024
+
+
+# ioctl request numbers from linux/input.h
+def _IOR(type_, nr, size):
+    return (2 << 30) | (size << 16) | (ord(type_) << 8) | nr
+
+def _IOW(type_, nr, size):
+    return (1 << 30) | (size << 16) | (ord(type_) << 8) | nr
+
+def EVIOCGKEY(length):
+    return _IOR('E', 0x18, length)
+
+def EVIOCGABS(code):
+    return _IOR('E', 0x40 + code, INPUT_ABSINFO_SIZE)
+
+def EVIOCGMTSLOTS(length):
+    return _IOR('E', 0x0a, length)
+
+EVIOCSCLOCKID = _IOW('E', 0xa0, struct.calcsize('i'))
+EVIOCGRAB = _IOW('E', 0x90, struct.calcsize('i'))
+
+
+def set_clock_id(fd, clock_id):
+    """
+    Switches the clock of the event timestamps (EVIOCSCLOCKID), e.g. to
+    time.CLOCK_MONOTONIC so they can be compared with time.monotonic().
+    """
+    fcntl.ioctl(fd, EVIOCSCLOCKID, struct.pack('i', clock_id))
+
+
+def grab(fd, exclusive=True):
+    """
+    Events of the device go only to fd (EVIOCGRAB), nothing else (libinput, X.org) gets them.
+    """
+    fcntl.ioctl(fd, EVIOCGRAB, 1 if exclusive else 0)
+
+def query_keys(fd):
+    """
+    Returns set of codes of currently pressed keys (EVIOCGKEY).
+    """
+    bits = bytearray((KEY_MAX + 7) // 8 + 1)
+    fcntl.ioctl(fd, EVIOCGKEY(len(bits)), bits, True)
+
+    return set(np.flatnonzero(np.unpackbits(np.frombuffer(bits, dtype=np.uint8), bitorder='little')).tolist())
+
+def query_abs(fd, code):
+    """
+    Returns current value of an absolute axis (EVIOCGABS).
+    """
+    absinfo = bytearray(INPUT_ABSINFO_SIZE)
+    fcntl.ioctl(fd, EVIOCGABS(code), absinfo, True)
+
+    return struct.unpack(INPUT_ABSINFO_FORMAT, absinfo)[0]
+
+def query_mt_slots(fd, code, num_slots):
+    """
+    Returns values of a multitouch axis for every slot (EVIOCGMTSLOTS).
+    """
+    request = np.zeros(num_slots + 1, dtype=np.int32)
+    request[0] = code
+    fcntl.ioctl(fd, EVIOCGMTSLOTS(request.nbytes), request, True)
+
+    return request[1:].tolist()
+
+def query_touchpad_state(fd, num_slots):
+    """
+    Reads the whole current touchpad state from the kernel as expects DialGesture.resync().
+    """
+    slot = query_abs(fd, ABS_MT_SLOT)
+    slot_values = {}
+    for code in (ABS_MT_TRACKING_ID, ABS_MT_POSITION_X, ABS_MT_POSITION_Y, ABS_MT_TOOL_TYPE):
+        slot_values[code] = query_mt_slots(fd, code, num_slots)
+
+    return slot, slot_values
+
+
+class EventsDroppedError(Exception):
+    """
+    The kernel buffer of the device overflowed (SYN_DROPPED) and events were lost.
+    """
+
+
+class EventReader:
+    """
+    Reads struct input_event records from an evdev fd in bulk.
+
+    Every read goes into one preallocated buffer which is decoded in place through
+    a NumPy structured view, so no Python object is created per kernel event
+    except the final (type, code, value) tuples of a frame.
+
+    A frame is everything between two SYN_REPORT events and is returned as
+    (timestamp, [(type, code, value), ...]) where timestamp is the time of the
+    SYN_REPORT in seconds. The list does not contain the SYN_REPORT itself.
+    """
+
+    def __init__(self, fd, capacity=DEFAULT_CAPACITY):
+        self.fd = fd
+        self.capacity = capacity
+        self.buffer = bytearray(capacity * INPUT_EVENT_SIZE)
+        self.view = memoryview(self.buffer)
+        self.events = np.frombuffer(self.buffer, dtype=INPUT_EVENT_DTYPE)
+        self.fields = self.events[['type', 'code', 'value']]
+        # events of an unfinished frame are kept at the start of the buffer
+        self.pending = 0
+        # after SYN_DROPPED everything up to the next SYN_REPORT is invalid
+        self.dropping = False
+        self.events_count = 0
+        self.frames_count = 0
+        # events left in the buffer after SYN_DROPPED which were not split yet
+        self.unsplit = False
+
+    def read(self):
+        """
+        Blocks until at least one event is available and returns the number of events now in the buffer.
+        """
+        size = os.readv(self.fd, [self.view[self.pending * INPUT_EVENT_SIZE:]])
+        if size == 0:
+            raise EOFError("evdev device was closed")
+
+        count = size // INPUT_EVENT_SIZE
+        self.events_count += count
+
+        return self.pending + count
+
+    def split(self, count):
+        """
+        Decodes the first count events of the buffer and returns the complete frames
+        and whether SYN_DROPPED was found in between.
+
+        Decoding stops at SYN_DROPPED, events after it stay in the buffer and are
+        split again (and skipped up to the next SYN_REPORT) before the next read.
+        """
+        events = self.events[:count]
+        is_syn = events['type'] == EV_SYN
+        syn_indexes = np.flatnonzero(is_syn)
+
+        frames = []
+        start = 0
+        dropped = False
+
+        syn_codes = events['code'][syn_indexes].tolist()
+
+        for index, code in zip(syn_indexes.tolist(), syn_codes):
+
+            if code == SYN_DROPPED:
+                self.dropping = True
+                dropped = True
+                start = index + 1
+                break
+
+            if code != SYN_REPORT:
+                continue
+
+            if self.dropping:
+                self.dropping = False
+            else:
+                sec = int(events['sec'][index])
+                usec = int(events['usec'][index])
+                frames.append((sec + usec / 1000000, self.fields[start:index].tolist()))
+
+            start = index + 1
+
+        # frame larger than the whole buffer, hand over what we have instead of stalling
+        # (unless it is being dropped, then it is discarded below)
+        if start == 0 and count == self.capacity and not self.dropping:
+            sec = int(events['sec'][count - 1])
+            usec = int(events['usec'][count - 1])
+            frames.append((sec + usec / 1000000, self.fields[:count].tolist()))
+            start = count
+
+        # keep unfinished frame for next read, events being dropped are not needed
+        if self.dropping and not dropped:
+            self.pending = 0
+        else:
+            self.pending = count - start
+        if self.pending:
+            self.buffer[:self.pending * INPUT_EVENT_SIZE] = self.buffer[start * INPUT_EVENT_SIZE:count * INPUT_EVENT_SIZE]
+
+        self.frames_count += len(frames)
+        self.unsplit = dropped and self.pending > 0
+
+        return frames, dropped
+
+    def read_frames(self):
+        """
+        One read (or split of the events left after SYN_DROPPED) for callers which wait
+        in select()/poll() themselves, returns the same as split().
+
+        When unsplit is True afterwards, call it again before waiting for the fd.
+        """
+        count = self.pending if self.unsplit else self.read()
+        return self.split(count)
+
+    def frames(self):
+        """
+        Yields frames forever, equivalent of Device.events() grouped by SYN_REPORT.
+        """
+        while True:
+            frames, dropped = self.read_frames()
+            for frame in frames:
+                yield frame
+
+            if dropped:
+                raise EventsDroppedError()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+
+# Changes of the focused window, pushed instead of polled
+#
+# X11 - PropertyNotify of _NET_ACTIVE_WINDOW on the root window and of
+#       _NET_WM_NAME on the active window, on an own display connection
+# KDE Wayland - a KWin script calls back over D-Bus whenever a window is
+#       activated or the caption of the active one changes
+# otherwise (e.g. GNOME Wayland, or the above not available) the focused
+# window is looked up every poll interval by desktop.get_active_window_title()
+
+import logging
+import os
+import select
+import tempfile
+from time import sleep
+
+import desktop
+
+log = logging.getLogger('asus-dialpad-driver')
+
+# fallback polling when the session reports no focus changes
+FOCUS_POLL_INTERVAL = 2
+# how often is_stopped() is checked by the waiting loops
+STOP_CHECK_INTERVAL = 1
+
+FOCUS_BUS_NAME = 'org.asus_dialpad_driver.Focus'
+FOCUS_OBJECT_PATH = '/org/asus_dialpad_driver/Focus'
+KWIN_SCRIPT_NAME = 'asus-dialpad-driver-focus'
+# KWin 6 (windowActivated, activeWindow) and KWin 5 (clientActivated, activeClient)
+KWIN_SCRIPT = '''
+var current = null;
+
+function report() {
+    callDBus("%(bus)s", "%(path)s", "%(bus)s", "Changed", current ? current.caption : "");
+}
+
+function activated(window) {
+    if (current) {
+        current.captionChanged.disconnect(report);
+    }
+    current = window;
+    if (current) {
+        current.captionChanged.connect(report);
+    }
+    report();
+}
+
+(workspace.windowActivated || workspace.clientActivated).connect(activated);
+activated(workspace.activeWindow || workspace.activeClient);
+''' % {'bus': FOCUS_BUS_NAME, 'path': FOCUS_OBJECT_PATH}
+
+
+class FocusReceiver:
+    """
+    <node>
+        <interface name='org.asus_dialpad_driver.Focus'>
+            <method name='Changed'>
+                <arg type='s' name='title' direction='in'/>
+            </method>
+        </interface>
+    </node>
+    """
+
+    def __init__(self, changed):
+        self.changed = changed
+
+    def Changed(self, title):
+        self.changed(title or None)
+
+
+class FocusWatcher:
+    """
+    Calls on_change(title) from run() whenever the title of the focused window changes
+    (None when there is no focused window or it can not be read).
+
+    poll_interval - seconds between the lookups when the session reports no changes
+    kwin_script - False leaves the KWin script to the desktop agent (one per session)
+    """
+
+    def __init__(self, on_change, poll_interval=FOCUS_POLL_INTERVAL, kwin_script=True):
+        self.on_change = on_change
+        self.poll_interval = poll_interval
+        self.kwin_script = kwin_script
+        self.title = None
+
+    def run(self, is_stopped):
+        """
+        Watches until is_stopped() returns True, by the session events or by polling when they are not available.
+        """
+        try:
+            if desktop.xdg_session_type == "x11":
+                self.run_x11(is_stopped)
+                return
+            if self.kwin_script and 'KDE' in os.environ.get('XDG_CURRENT_DESKTOP', '').split(':'):
+                self.run_kwin(is_stopped)
+                return
+        except Exception as e:
+            log.info("Focus change events are not available (%s), the focused window is polled instead", e)
+
+        self.run_polling(is_stopped)
+
+    def changed(self, title):
+        if title != self.title:
+            self.title = title
+            # a failing receiver must not end the watching
+            try:
+                self.on_change(title)
+            except Exception:
+                log.exception("Focus change handling failed")
+
+    def run_polling(self, is_stopped):
+        while not is_stopped():
+            self.changed(desktop.get_active_window_title())
+            sleep(self.poll_interval)
+
+    def run_x11(self, is_stopped):
+        import Xlib.display
+        from Xlib import X
+
+        # own connection, Xlib displays are not shared between threads
+        display = Xlib.display.Display(desktop.display_var)
+        root = display.screen().root
+        net_active_window = display.intern_atom('_NET_ACTIVE_WINDOW')
+        net_wm_name = display.intern_atom('_NET_WM_NAME')
+        root.change_attributes(event_mask=X.PropertyChangeMask)
+        window = None
+
+        try:
+            log.info("Watching the focused window by X11 events")
+            while not is_stopped():
+                try:
+                    window_id = root.get_full_property(net_active_window, X.AnyPropertyType).value[0]
+                    if window is None or window.id != window_id:
+                        window = display.create_resource_object('window', window_id)
+                        # title changes of the focused window, e.g. another browser tab
+                        window.change_attributes(event_mask=X.PropertyChangeMask)
+                    name = window.get_full_property(net_wm_name, X.AnyPropertyType)
+                    self.changed(name.value.decode() if name else None)
+                except Exception as e:
+                    log.debug("Focused window can not be read: %s", e)
+                    window = None
+                    self.changed(None)
+
+                # wait for a change of the active window or of its title
+                while not is_stopped():
+                    if not display.pending_events() and not select.select([display], [], [], STOP_CHECK_INTERVAL)[0]:
+                        continue
+                    event = display.next_event()
+                    if event.type == X.PropertyNotify and event.atom in (net_active_window, net_wm_name):
+                        break
+        finally:
+            display.close()
+
+    def run_kwin(self, is_stopped):
+        from gi.repository import GLib
+        from pydbus import SessionBus
+
+        bus = SessionBus()
+        publication = bus.publish(FOCUS_BUS_NAME, (FOCUS_OBJECT_PATH, FocusReceiver(self.changed)))
+        scripting = bus.get('org.kde.KWin', '/Scripting')
+
+        # KWin reads the script when it runs it, the file is kept until the end
+        with tempfile.NamedTemporaryFile('w', prefix=KWIN_SCRIPT_NAME, suffix='.js', dir=os.environ.get('XDG_RUNTIME_DIR')) as script:
+            script.write(KWIN_SCRIPT)
+            script.flush()
+
+            # one left by an agent which did not end cleanly
+            if scripting.isScriptLoaded(KWIN_SCRIPT_NAME):
+                scripting.unloadScript(KWIN_SCRIPT_NAME)
+            script_id = scripting.loadScript(script.name, KWIN_SCRIPT_NAME)
+
+            loop = GLib.MainLoop()
+            GLib.timeout_add_seconds(STOP_CHECK_INTERVAL, lambda: loop.quit() if is_stopped() else True)
+
+            try:
+                try:
+                    kwin_script = bus.get('org.kde.KWin', '/Scripting/Script{}'.format(script_id))
+                except Exception:
+                    # KWin 5
+                    kwin_script = bus.get('org.kde.KWin', '/{}'.format(script_id))
+                kwin_script.run()
+
+                log.info("Watching the focused window by a KWin script")
+                loop.run()
+            finally:
+                scripting.unloadScript(KWIN_SCRIPT_NAME)
+                publication.unpublish()
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+
+import logging
+import math
+from array import array
+
+from evdev_reader import ABS_MT_POSITION_X, ABS_MT_POSITION_Y, ABS_MT_SLOT, ABS_MT_TOOL_TYPE, ABS_MT_TRACKING_ID, EV_ABS, MT_TOOL_PALM
+from tracebuffer import (
+    TRACE_CANCEL, TRACE_CENTER, TRACE_CLOCKWISE, TRACE_COUNTERCLOCKWISE, TRACE_FINGER_DOWN, TRACE_FINGER_UP,
+    TRACE_FIRST_SLICE, TRACE_ICON, TRACE_OUTSIDE, TRACE_RESYNC, TRACE_SAME_SLICE, no_trace
+)
+
+log = logging.getLogger('asus-dialpad-driver')
+
+NO_SLOT = -1
+
+# Jitter filter defaults, a layout can override them
+DEFAULT_DIAL_SMOOTHING = 0.8
+DEFAULT_DIAL_HYSTERESIS = 5
+
+
+class DialGesture:
+    """
+    Gesture engine of one DialPad, consumes whole touchpad frames.
+
+    Frames are (timestamp, [(type, code, value), ...]) as produced by
+    evdev_reader.EventReader. All durations are measured using frame
+    timestamps so the same input always produces the same gestures.
+
+    Every multitouch slot is tracked in preallocated arrays. While no contact
+    owns the dial, the first one inside the circle or the top-right icon takes
+    it (palms are never owners): a finger landing there, a finger which landed
+    outside and slides in, or a contact already down when the previous owner is
+    lifted. The owner keeps the dial until it is lifted, other contacts are
+    ignored meanwhile, so a second finger can not move the dial.
+
+    Callbacks:
+    on_gesture(name, pressed, duration_held) - "center", "clockwise" or "counterclockwise"
+    on_icon() - top-right icon was held for activation time
+    on_touchpad_send_events(enabled) - tap-to-click has to be disabled while touching the dial
+    is_enabled() - whether is the DialPad activated
+
+    Every decision is recorded to trace (tracebuffer.TraceBuffer) when is given.
+    """
+
+    def __init__(self, layout, max_x, on_gesture, on_icon, on_touchpad_send_events, is_enabled, slices_count=4, activation_time=1, num_slots=1, trace=None):
+        self.circle_radius = getattr(layout, "circle_diameter", 0) / 2
+        self.center_button_radius = getattr(layout, "center_button_diameter", 0) / 2
+        self.circle_center_x = getattr(layout, "circle_center_x", 0)
+        self.circle_center_y = getattr(layout, "circle_center_y", 0)
+
+        top_right_icon_width = getattr(layout, "top_right_icon_width", 0)
+        top_right_icon_height = getattr(layout, "top_right_icon_height", 0)
+
+        # Define the bounds for the top-right icon
+        self.top_right_icon_x_min = max_x - top_right_icon_width
+        self.top_right_icon_x_max = max_x
+        self.top_right_icon_y_min = 0
+        self.top_right_icon_y_max = top_right_icon_height
+
+        self.on_gesture = on_gesture
+        self.on_icon = on_icon
+        self.on_touchpad_send_events = on_touchpad_send_events
+        self.is_enabled = is_enabled
+        self.trace = trace.record if trace is not None else no_trace
+
+        self.slices_count = slices_count
+        self.activation_time = activation_time
+
+        # Jitter filter in angle space
+        # dial_smoothing - weight of the newest angle in the moving average (1 = no smoothing)
+        # dial_hysteresis - degrees the angle has to get past a slice boundary before the slice changes
+        self.smoothing = min(max(getattr(layout, "dial_smoothing", DEFAULT_DIAL_SMOOTHING), 0.01), 1)
+        self.hysteresis = max(getattr(layout, "dial_hysteresis", DEFAULT_DIAL_HYSTERESIS), 0)
+        self.filtered_angle = 0
+
+        # Multitouch slots
+        self.num_slots = max(num_slots, 1)
+        self.slot = 0  # Current slot, NO_SLOT while the kernel has one selected which is not tracked
+        self.slot_tracking_ids = array('i', [-1] * self.num_slots)
+        self.slot_x = array('i', [0] * self.num_slots)
+        self.slot_y = array('i', [0] * self.num_slots)
+        self.slot_tool_types = array('i', [0] * self.num_slots)
+        self.owner = NO_SLOT  # Slot of the contact which owns the dial
+
+        self.finger_down_time = None  # Time when the owning finger was put down
+        self.touch_start_time = None  # Time when the touch started inside the top-right icon
+        self.within_top_right_icon = False  # Track if the touch is within the top-right icon bounds
+        self.icon_activated = False  # Track if the icon has already been activated during this touch
+        self.last_slice = None  # Track the last active slice in the circle
+        self.center_button_triggered = False
+        self.tap_disabled = False  # Track tap-to-click status
+        self.resynced_touch = False  # Touch continues after lost events, center button and icon are ignored
+        self.last_timestamp = 0
+
+    @property
+    def finger_detected(self):
+        return self.owner != NO_SLOT
+
+    def process_frame(self, timestamp, events):
+        self.last_timestamp = timestamp
+
+        slot = self.slot
+        tracking_ids = self.slot_tracking_ids
+        owner_lifted = False
+
+        for type_, code, value in events:
+            if type_ != EV_ABS:
+                continue
+
+            if code == ABS_MT_SLOT:
+                slot = value if 0 <= value < self.num_slots else NO_SLOT
+            elif slot == NO_SLOT:
+                # contact of a slot which is not tracked, ignored until a tracked slot is selected
+                continue
+            elif code == ABS_MT_POSITION_X:
+                self.slot_x[slot] = value
+            elif code == ABS_MT_POSITION_Y:
+                self.slot_y[slot] = value
+            elif code == ABS_MT_TRACKING_ID:
+                if value == -1 and slot == self.owner:
+                    owner_lifted = True
+                tracking_ids[slot] = value
+            elif code == ABS_MT_TOOL_TYPE:
+                self.slot_tool_types[slot] = value
+
+        self.slot = slot
+
+        if owner_lifted:
+            self.finger_up(timestamp)
+
+        if self.owner == NO_SLOT:
+            for slot in range(self.num_slots):
+                if tracking_ids[slot] != -1 and self.slot_tool_types[slot] != MT_TOOL_PALM and self.is_dial_area(self.slot_x[slot], self.slot_y[slot]):
+                    self.finger_down(timestamp, slot)
+                    break
+
+        if self.owner != NO_SLOT:
+            # the owner turned out to be a palm, cancel the touch
+            if self.slot_tool_types[self.owner] == MT_TOOL_PALM:
+                self.cancel()
+            else:
+                self.process_position(timestamp, self.slot_x[self.owner], self.slot_y[self.owner])
+
+    def finger_down(self, timestamp, slot):
+        self.trace(timestamp, TRACE_FINGER_DOWN, 0, 0, -1, slot, 0)
+        self.owner = slot
+        self.finger_down_time = timestamp
+        self.touch_start_time = timestamp
+        self.within_top_right_icon = False
+        self.icon_activated = False
+        self.last_slice = None
+        self.resynced_touch = False
+        log.debug("Finger detected in slot %d.", slot)
+
+    def finger_up(self, timestamp):
+        self.trace(timestamp, TRACE_FINGER_UP, 0, 0, -1, self.owner, 0)
+        self.owner = NO_SLOT
+        self.touch_start_time = None
+        self.within_top_right_icon = False
+        self.icon_activated = False
+        self.last_slice = None
+        self.resynced_touch = False
+        log.debug("Finger lifted.")
+
+        duration_held = timestamp - self.finger_down_time if self.finger_down_time is not None else 0
+        self.finger_down_time = None
+
+        if self.center_button_triggered:
+            self.on_gesture("center", False, duration_held)
+            self.center_button_triggered = False
+        # Re-enable tap-to-click
+        if self.tap_disabled:
+            self.on_touchpad_send_events(True)
+            self.tap_disabled = False
+
+    def cancel(self):
+        """
+        Drops the touch in progress without emitting anything.
+        """
+        self.trace(self.last_timestamp, TRACE_CANCEL, 0, 0, -1, self.owner, 0)
+        self.owner = NO_SLOT
+        self.finger_down_time = None
+        self.touch_start_time = None
+        self.within_top_right_icon = False
+        self.icon_activated = False
+        self.last_slice = None
+        self.center_button_triggered = False
+        self.resynced_touch = False
+
+        # Re-enable tap-to-click
+        if self.tap_disabled:
+            self.on_touchpad_send_events(True)
+            self.tap_disabled = False
+
+    def resync(self, slot, slot_values):
+        """
+        Rebuilds the touch state after events were dropped by the kernel.
+
+        slot - current multitouch slot
+        slot_values - {ABS_MT_* code: [value for every slot]}
+
+        The gesture in progress is cancelled without emitting anything because it
+        can not be known what happened in between. When the owning contact is
+        still down, rotation continues from its current position and the center
+        button and the top-right icon are ignored until it is lifted.
+        """
+        owner = self.owner
+        owner_tracking_id = self.slot_tracking_ids[owner] if owner != NO_SLOT else -1
+
+        self.slot = slot if 0 <= slot < self.num_slots else NO_SLOT
+        for code, values in ((ABS_MT_TRACKING_ID, self.slot_tracking_ids), (ABS_MT_POSITION_X, self.slot_x), (ABS_MT_POSITION_Y, self.slot_y), (ABS_MT_TOOL_TYPE, self.slot_tool_types)):
+            if code in slot_values:
+                values[:] = array('i', slot_values[code][:self.num_slots])
+
+        if owner != NO_SLOT and owner_tracking_id != -1 and self.slot_tracking_ids[owner] == owner_tracking_id:
+            self.last_slice = None
+            self.center_button_triggered = False
+            self.within_top_right_icon = False
+            self.touch_start_time = None
+            self.icon_activated = True
+            self.resynced_touch = True
+        else:
+            self.cancel()
+
+        self.trace(self.last_timestamp, TRACE_RESYNC, 0, 0, -1, self.owner, 0)
+        log.debug("Touch state re-synced, finger detected: %s", self.finger_detected)
+
+    def is_top_right_icon_area(self, x, y):
+        return self.top_right_icon_x_min <= x <= self.top_right_icon_x_max and\
+            self.top_right_icon_y_min <= y <= self.top_right_icon_y_max
+
+    def is_dial_area(self, x, y):
+        dx = x - self.circle_center_x
+        dy = y - self.circle_center_y
+
+        return dx * dx + dy * dy <= self.circle_radius * self.circle_radius or self.is_top_right_icon_area(x, y)
+
+    def is_pressed_top_right_icon(self):
+        if self.owner == NO_SLOT:
+            return False
+
+        return self.is_top_right_icon_area(self.slot_x[self.owner], self.slot_y[self.owner])
+
+    def process_position(self, timestamp, touch_x, touch_y):
+        # Check if the touch is in the top-right icon bounds
+        if self.is_top_right_icon_area(touch_x, touch_y):
+            if not self.within_top_right_icon:
+                log.debug("Touch entered top-right icon bounds.")
+            self.within_top_right_icon = True
+
+            # Check if the touch duration exceeds the threshold and hasn't been activated yet
+            if self.touch_start_time is not None and not self.icon_activated:
+                if (timestamp - self.touch_start_time) >= self.activation_time:
+                    log.info("Top-right icon held for the required duration.")
+                    self.trace(timestamp, TRACE_ICON, 0, 0, -1, self.owner, 0)
+                    self.on_icon()
+                    self.icon_activated = True
+        else:
+            if self.within_top_right_icon:
+                log.debug("Touch left top-right icon bounds. Canceling the action.")
+            self.within_top_right_icon = False
+            self.touch_start_time = None  # Cancel the action by resetting the start time
+            self.icon_activated = False
+
+        # Calculate distance and angle for circle-based detection
+        dx = touch_x - self.circle_center_x
+        dy = touch_y - self.circle_center_y
+        distance = math.sqrt(dx**2 + dy**2)
+
+        if distance > self.circle_radius or not self.is_enabled():
+            self.trace(timestamp, TRACE_OUTSIDE, distance, 0, -1, self.owner, 0)
+            return
+
+        # Disable tap-to-click
+        if not self.tap_disabled:
+            self.on_touchpad_send_events(False)
+            self.tap_disabled = True
+
+        if distance < self.center_button_radius:
+            self.trace(timestamp, TRACE_CENTER, distance, 0, -1, self.owner, 0)
+
+            # Only trigger if it has not been triggered already in this touch cycle
+            if not self.center_button_triggered and not self.resynced_touch:
+                log.debug("Touch detected in center button area.")
+                self.on_gesture("center", True, 0)
+                self.center_button_triggered = True
+                self.icon_activated = True  # Ensure it only triggers once per touch
+        else:
+            # Reset the center button triggered flag if the finger leaves the button area
+            if self.center_button_triggered:
+                self.center_button_triggered = False
+                self.icon_activated = False
+
+            angle = (math.atan2(dy, dx) * 180 / math.pi) % 360
+
+            # Low-pass filter of the angle, always the shorter way around the circle
+            if self.last_slice is None:
+                self.filtered_angle = angle
+            else:
+                delta = (angle - self.filtered_angle + 180) % 360 - 180
+                self.filtered_angle = (self.filtered_angle + self.smoothing * delta) % 360
+            angle = self.filtered_angle
+
+            slice_width = 360 / self.slices_count
+
+            # Stay in the last slice until the angle gets far enough past its boundaries
+            if self.last_slice is not None:
+                hysteresis = min(self.hysteresis, slice_width / 2)
+                offset = (angle - self.last_slice * slice_width) % 360
+                if offset < slice_width + hysteresis or offset > 360 - hysteresis:
+                    self.trace(timestamp, TRACE_SAME_SLICE, distance, angle, self.last_slice, self.owner, 0)
+                    return
+
+            # Determine the current slice based on the angle
+            current_slice = int(angle // slice_width) % self.slices_count
+            if current_slice != self.last_slice:
+                if self.last_slice is not None:
+                    # Determine the direction of rotation
+                    clockwise = (current_slice - self.last_slice) % self.slices_count == 1
+                    direction = "clockwise" if clockwise else "counterclockwise"
+                    self.trace(timestamp, TRACE_CLOCKWISE if clockwise else TRACE_COUNTERCLOCKWISE, distance, angle, current_slice, self.owner, 0)
+                    log.debug("Detected circular motion: %s", direction)
+                    self.on_gesture(direction, True, 0)
+                else:
+                    self.trace(timestamp, TRACE_FIRST_SLICE, distance, angle, current_slice, self.owner, 0)
+                self.last_slice = current_slice
+            else:
+                self.trace(timestamp, TRACE_SAME_SLICE, distance, angle, current_slice, self.owner, 0)
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+
+# Interfaces of the I/O edges of the driver and deterministic in-memory fakes of them.
+#
+# Production implementations:
+# InputSource - engine.EvdevTouchpadSource (/dev/input/eventN)
+# DialPadController - engine.I2CDialPadController (/dev/i2c-N)
+# KeySink - keysink.UinputKeySink (the virtual device)
+# FocusProvider - dialpad.SessionFocusProvider (X11 or Wayland session)
+# TouchpadToggler - dialpad.DesktopTouchpadToggler (gsettings, qdbus, xinput, synclient)
+#
+# The fakes need neither the hardware nor a display or root, so the gesture
+# engine and the dispatch can run with them anywhere, e.g. in tests/
+# (DialPadEngine(..., controller=FakeDialPadController(),
+# source=FakeTouchpadSource())). engine.py imports libevdev and smbus2 only
+# when its production source and controller are used; dialpad.py itself still
+# needs libevdev.
+
+import os
+from collections import deque
+from typing import Callable, List, NamedTuple, Optional, Protocol, Tuple
+
+# (timestamp, [(type, code, value), ...]) as evdev_reader.EventReader produces it
+Frame = Tuple[float, List[Tuple[int, int, int]]]
+
+
+class InputSource(Protocol):
+    """
+    Frames of one touchpad, the fd is watched by the selector of the events loop.
+    """
+    max_x: int
+    num_slots: int
+    clock: Callable[[], float]  # clock of the frame timestamps
+
+    def open(self) -> None: ...
+
+    def fileno(self) -> int: ...
+
+    def read_frames(self) -> Tuple[List[Frame], bool]:
+        """
+        Frames available now and whether events were dropped (the touch state has to be re-read).
+        """
+
+    def has_pending(self) -> bool:
+        """
+        Whether read_frames() has more to return without waiting for the fd.
+        """
+
+    def touchpad_state(self) -> Tuple[int, dict]:
+        """
+        Current slot and {ABS_MT_* code: [value of every slot]} as DialGesture.resync() expects.
+        """
+
+    def close(self) -> None: ...
+
+
+class DialPadController(Protocol):
+    """
+    Turns the DialPad (its backlight and the touchpad mode) on and off.
+    """
+
+    def check(self) -> bool: ...
+
+    def activate(self) -> None: ...
+
+    def deactivate(self) -> None: ...
+
+
+class KeySink(Protocol):
+
+    def send_key(self, key_code, press: bool) -> None: ...
+
+    def send_buffer(self, buffer: bytes) -> None:
+        """
+        input_event structs written at once (macro.MacroCompiler).
+        """
+
+
+class FocusProvider(Protocol):
+
+    def active_window_title(self) -> Optional[str]: ...
+
+
+class TouchpadToggler(Protocol):
+    """
+    Disables the touchpad pointer (tap-to-click) while the DialPad is touched.
+    """
+
+    def set_send_events(self, engine, enabled: bool) -> None: ...
+
+
+class FakeTouchpadDrop(NamedTuple):
+    slot: int
+    slot_values: dict
+
+
+class FakeTouchpadSource:
+    """
+    Touchpad fed by push(), its fileno() is readable while frames are queued.
+    """
+
+    def __init__(self, max_x=3946, num_slots=5):
+        self.max_x = max_x
+        self.num_slots = num_slots
+        # frames and drops (the state after them) in the order they were pushed
+        self.queue = deque()
+        self.state = (0, {})
+        # deterministic clock, the time of the last frame pushed
+        self.now = 0
+        self.read_fd = None
+        self.write_fd = None
+        # one byte in the pipe is enough to wake the selector
+        self.signalled = False
+
+    def clock(self):
+        return self.now
+
+    def open(self):
+        self.read_fd, self.write_fd = os.pipe2(os.O_NONBLOCK | os.O_CLOEXEC)
+        self.signalled = False
+        if self.queue:
+            self.wake()
+
+    def fileno(self):
+        return self.read_fd
+
+    def push(self, timestamp, events):
+        self.queue.append((timestamp, events))
+        self.now = timestamp
+        self.wake()
+
+    def drop(self, slot, slot_values):
+        """
+        Like SYN_DROPPED of the kernel, touchpad_state() returns slot and slot_values once
+        the frames pushed so far are read.
+        """
+        self.queue.append(FakeTouchpadDrop(slot, slot_values))
+        self.wake()
+
+    def wake(self):
+        if self.write_fd is not None and not self.signalled:
+            os.write(self.write_fd, b'\0')
+            self.signalled = True
+
+    def read_frames(self):
+        if self.signalled:
+            os.read(self.read_fd, 1)
+            self.signalled = False
+
+        frames = []
+        while self.queue:
+            item = self.queue.popleft()
+            if isinstance(item, FakeTouchpadDrop):
+                self.state = (item.slot, item.slot_values)
+                return frames, True
+            frames.append(item)
+
+        return frames, False
+
+    def has_pending(self):
+        return bool(self.queue)
+
+    def touchpad_state(self):
+        return self.state
+
+    def close(self):
+        for fd in (self.read_fd, self.write_fd):
+            if fd is not None:
+                os.close(fd)
+        self.read_fd = self.write_fd = None
+
+
+class FakeDialPadController:
+    """
+    Records the commands, check() returns available.
+    """
+
+    def __init__(self, available=True):
+        self.available = available
+        self.commands = []
+
+    def check(self):
+        return self.available
+
+    def activate(self):
+        self.commands.append("activate")
+
+    def deactivate(self):
+        self.commands.append("deactivate")
+
+
+class RecordingKeySink:
+    """
+    keys - [(timestamp by clock, key code, press), ...]
+    buffers - [(timestamp by clock, input_event structs), ...]
+    """
+
+    def __init__(self, clock=lambda: 0):
+        self.clock = clock
+        self.keys = []
+        self.buffers = []
+
+    def send_key(self, key_code, press):
+        self.keys.append((self.clock(), key_code, press))
+
+    def send_buffer(self, buffer):
+        self.buffers.append((self.clock(), buffer))
+
+
+class FixedFocusProvider:
+    """
+    The active window is always the one set in title.
+    """
+
+    def __init__(self, title=None):
+        self.title = title
+
+    def active_window_title(self):
+        return self.title
+
+
+class RecordingTouchpadToggler:
+    """
+    calls - [(engine, enabled), ...]
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def set_send_events(self, engine, enabled):
+        self.calls.append((engine, enabled))
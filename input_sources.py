@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+# Changes of the GNOME input sources, pushed instead of polled
+#
+# dconf announces every write to the user database on the session bus
+# (ca.desrt.dconf.Writer.Notify with the keys written), so the input sources
+# are read again only when a key under /org/gnome/desktop/input-sources/
+# changed. Without D-Bus (pydbus or GLib missing, no session bus) the dconf
+# database file is watched by inotify instead - dconf replaces it on every
+# write, which key changed is not known then.
+
+import logging
+import os
+import pwd
+
+log = logging.getLogger('asus-dialpad-driver')
+
+INPUT_SOURCES_DCONF_DIR = '/org/gnome/desktop/input-sources/'
+DCONF_WRITER_INTERFACE = 'ca.desrt.dconf.Writer'
+DCONF_WRITER_USER_PATH = '/ca/desrt/dconf/Writer/user'
+# how often is_stopped() is checked by the waiting loops
+STOP_CHECK_INTERVAL = 1
+
+
+def dconf_user_database_path():
+    # driver started by sudo follows the database of the user, not of root
+    sudo_user = os.environ.get('SUDO_USER')
+    if sudo_user:
+        config_home = os.path.join(pwd.getpwnam(sudo_user).pw_dir, '.config')
+    else:
+        config_home = os.environ.get('XDG_CONFIG_HOME') or os.path.expanduser('~/.config')
+
+    return os.path.join(config_home, 'dconf', 'user')
+
+
+def is_input_sources_change(prefix, changes):
+    """
+    Whether a dconf Notify of prefix and changes (keys relative to it) touches the input sources.
+    """
+    for change in changes or ['']:
+        key = prefix + change
+        # a key inside or a whole dir above it (e.g. dconf reset -f /org/gnome/)
+        if key.startswith(INPUT_SOURCES_DCONF_DIR) or INPUT_SOURCES_DCONF_DIR.startswith(key):
+            return True
+
+    return False
+
+
+class InputSourcesWatcher:
+    """
+    Calls on_change() from run() whenever the GNOME input sources may have changed.
+    """
+
+    def __init__(self, on_change, database_path=None):
+        self.on_change = on_change
+        self.database_path = database_path or dconf_user_database_path()
+
+    def run(self, is_stopped):
+        """
+        Watches until is_stopped() returns True, by D-Bus or by inotify when D-Bus is not available.
+        """
+        try:
+            self.run_dbus(is_stopped)
+            return
+        except Exception as e:
+            log.info("dconf change notifications on D-Bus are not available (%s), watching %s instead", e, self.database_path)
+
+        self.run_inotify(is_stopped)
+
+    def on_dconf_notify(self, sender, object_path, interface, signal, parameters):
+        prefix, changes, tag = parameters
+        if is_input_sources_change(prefix, changes):
+            log.debug("dconf input sources changed: %s %s", prefix, changes)
+            self.changed()
+
+    def run_dbus(self, is_stopped):
+        from gi.repository import GLib
+        from pydbus import SessionBus
+
+        bus = SessionBus()
+        loop = GLib.MainLoop()
+        subscription = bus.subscribe(
+            iface=DCONF_WRITER_INTERFACE,
+            signal='Notify',
+            object=DCONF_WRITER_USER_PATH,
+            signal_fired=self.on_dconf_notify
+        )
+        GLib.timeout_add_seconds(STOP_CHECK_INTERVAL, lambda: loop.quit() if is_stopped() else True)
+
+        try:
+            log.info("Watching GNOME input sources on D-Bus")
+            loop.run()
+        finally:
+            subscription.unsubscribe()
+
+    def run_inotify(self, is_stopped):
+        from pyinotify import IN_CLOSE_WRITE, IN_MOVED_TO, Notifier, WatchManager
+
+        directory = os.path.dirname(self.database_path)
+        if not os.path.isdir(directory):
+            log.warning("dconf database %s does not exist, GNOME input sources are not followed", self.database_path)
+            return
+
+        watch_manager = WatchManager()
+        watch_manager.add_watch(directory, IN_CLOSE_WRITE | IN_MOVED_TO)
+        notifier = Notifier(watch_manager, default_proc_fun=self.on_database_event)
+
+        try:
+            while not is_stopped():
+                if notifier.check_events(STOP_CHECK_INTERVAL * 1000):
+                    notifier.read_events()
+                    notifier.process_events()
+        finally:
+            notifier.stop()
+
+    def on_database_event(self, event):
+        if event.pathname == self.database_path:
+            self.changed()
+
+    def changed(self):
+        # a layout which can not be read must not end the watching
+        try:
+            self.on_change()
+        except Exception:
+            log.exception("GNOME input sources update failed")
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+
+log = logging.getLogger('asus-dialpad-driver')
+
+CACHE_FILE_NAME = "keymap_cache.json"
+# how many resolved keymaps are kept (one per layout the user switches between)
+CACHE_MAX_ENTRIES = 8
+
+
+def cache_dir():
+    xdg_cache_home = os.environ.get('XDG_CACHE_HOME')
+    if not xdg_cache_home:
+        xdg_cache_home = os.path.join(os.path.expanduser('~'), '.cache')
+
+    return os.path.join(xdg_cache_home, 'asus-dialpad-driver')
+
+
+def digest(*parts):
+    """
+    Hash of everything the resolution depends on (keymap content, active layout, requested chars).
+    """
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode()
+        elif not isinstance(part, (bytes, bytearray, mmap.mmap)):
+            part = repr(part).encode()
+
+        h.update(len(part).to_bytes(8, 'little'))
+        h.update(part)
+
+    return h.hexdigest()
+
+
+class KeymapCache:
+    """
+    Persistent cache of resolved char -> evdev key name(s) mappings keyed by keymap digest.
+
+    Values are plain key names (e.g. "KEY_A"), lists of them for combinations
+    (e.g. ["KEY_LEFTSHIFT", "KEY_A"]) or "" when the char was not found.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(cache_dir(), CACHE_FILE_NAME)
+        self.entries = None
+
+    def read(self):
+        if self.entries is not None:
+            return self.entries
+
+        try:
+            with open(self.path, 'r') as f:
+                self.entries = json.load(f)
+            if not isinstance(self.entries, dict):
+                self.entries = {}
+        except FileNotFoundError:
+            self.entries = {}
+        except Exception as e:
+            log.warning('Keymap cache "%s" can not be read, ignoring it: %s', self.path, e)
+            self.entries = {}
+
+        return self.entries
+
+    def get(self, key):
+        return self.read().get(key)
+
+    def set(self, key, mapping):
+        entries = self.read()
+
+        # most recently used is the last one
+        entries.pop(key, None)
+        entries[key] = mapping
+        while len(entries) > CACHE_MAX_ENTRIES:
+            del entries[next(iter(entries))]
+
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            log.warning('Keymap cache "%s" can not be written: %s', self.path, e)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+from xkbcommon import xkb
+
+
+class KeymapIndex:
+    """
+    Reverse index of one xkb keymap built in a single pass over all keycodes.
+
+    keysym -> [(keycode, layout, level, mod_mask), ...] in the same order as
+    walking the keymap keycode by keycode, layout by layout and level by level
+    finds them, so the first entry of an active layout is the one which
+    the former full walk returned.
+
+    modifier name -> [(layout, keysym name), ...] of keys which set that
+    modifier when are pressed (e.g. "Shift" -> [(0, "Shift_L"), ...]).
+    """
+
+    def __init__(self, keymap):
+        self.keymap = keymap
+        # state without anything pressed
+        self.state_clean = keymap.state_new()
+        self.num_mods = keymap.num_mods()
+        self.mod_names = [keymap.mod_get_name(mod_index) for mod_index in range(self.num_mods)]
+        self.keysyms = {}
+        self.modifiers = {}
+        self.mask_mod_names_cache = {}
+
+        for keycode in keymap:
+
+            num_layouts = keymap.num_layouts_for_key(keycode)
+            for layout in range(0, num_layouts):
+
+                num_levels = keymap.num_levels_for_key(keycode, layout)
+                for level in range(0, num_levels):
+
+                    mod_masks_for_level = keymap.key_get_mods_for_level(keycode, layout, level)
+                    if len(mod_masks_for_level) < 1:
+                        continue
+
+                    keysyms = keymap.key_get_syms_by_level(keycode, layout, level)
+                    if len(keysyms) != 1:
+                        continue
+
+                    entries = self.keysyms.setdefault(keysyms[0], [])
+                    for mod_mask in mod_masks_for_level:
+                        entries.append((keycode, layout, level, mod_mask))
+
+            self.index_modifier_key(keycode, num_layouts)
+
+    def index_modifier_key(self, keycode, num_layouts):
+        keyboard_state_clean = self.keymap.state_new()
+        key_state = keyboard_state_clean.update_key(keycode, xkb.KeyDirection.XKB_KEY_DOWN)
+
+        if not key_state & xkb.StateComponent.XKB_STATE_MODS_DEPRESSED:
+            return
+
+        active_mod_names = [
+            self.mod_names[mod_index] for mod_index in range(0, self.num_mods)
+            if keyboard_state_clean.mod_index_is_active(mod_index, xkb.StateComponent.XKB_STATE_MODS_DEPRESSED)
+        ]
+
+        for layout in range(0, num_layouts):
+            keysyms = self.keymap.key_get_syms_by_level(keycode, layout, 0)
+            if len(keysyms) != 1:
+                continue
+
+            keysym_name = xkb.keysym_get_name(keysyms[0])
+            for mod_name in active_mod_names:
+                self.modifiers.setdefault(mod_name, []).append((layout, keysym_name))
+
+    def lookup(self, keysym):
+        return self.keysyms.get(keysym, ())
+
+    def mod_names_for_mask(self, mod_mask):
+        mod_names = self.mask_mod_names_cache.get(mod_mask)
+        if mod_names is None:
+            mod_names = [self.mod_names[mod_index] for mod_index in range(0, self.num_mods) if mod_mask & (1 << mod_index)]
+            self.mask_mod_names_cache[mod_mask] = mod_names
+
+        return mod_names
+
+    def modifier_keysym_name(self, mod_name, is_layout_active):
+        for layout, keysym_name in self.modifiers.get(mod_name, ()):
+            if is_layout_active(layout):
+                return keysym_name
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+import os
+
+from evdev_reader import EV_KEY, KEY_MAX
+from macro import INPUT_EVENT, SYN_REPORT_EVENT
+
+UINPUT_PATH = '/dev/uinput'
+# BTN_MISC..BTN_GEAR_UP, BTN_DPAD_*, BTN_TRIGGER_HAPPY* - with one of them
+# libinput treats the virtual device as a pointer or a joystick
+BUTTON_CODE_RANGES = ((0x100, 0x15f), (0x220, 0x223), (0x2c0, 0x2e7))
+
+
+def open_uinput():
+    """
+    /dev/uinput opened by the driver (not by libevdev), so prepared events can be written to it directly.
+    """
+    return open(UINPUT_PATH, 'r+b', buffering=0)
+
+
+def is_keyboard_key(code):
+    """
+    Whether the virtual keyboard provisions code, every KEY_* up to KEY_MAX (incl. KEY_OK and above, e.g. KEY_BRIGHTNESS_MENU).
+    """
+    return 0 < code <= KEY_MAX and not any(first <= code <= last for first, last in BUTTON_CODE_RANGES)
+
+
+class UinputKeySink:
+    """
+    Keys sent by the virtual device of the driver (hal.KeySink).
+
+    device and uinput_file (from open_uinput(), the device was created with) are
+    replaced when the virtual device is re-created. Events are written to
+    uinput_file as the input_event structs libevdev would write, device only
+    keeps the virtual device alive.
+    """
+
+    def __init__(self, device, uinput_file):
+        self.device = device
+        self.uinput_file = uinput_file
+
+    def send_key(self, key_code, press):
+        # key event and SYN_REPORT by one write
+        os.write(self.uinput_file.fileno(), INPUT_EVENT.pack(0, 0, EV_KEY, key_code.value, 1 if press else 0) + SYN_REPORT_EVENT)
+
+    def send_buffer(self, buffer):
+        """
+        input_event structs incl. the SYN_REPORTs (e.g. a compiled text macro) by one write.
+        """
+        os.write(self.uinput_file.fileno(), buffer)
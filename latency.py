@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+import os
+from array import array
+from bisect import bisect_left
+
+# upper bounds of the buckets in seconds (Prometheus "le"), the last bucket is +Inf
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+
+METRIC_NAME = 'dialpad_stage_latency_seconds'
+
+# Stages of the pipeline from the kernel to the virtual device
+STAGE_KERNEL_TO_FRAME = 'kernel_to_frame'  # kernel event timestamp -> frame read and assembled
+STAGE_FRAME_TO_DECISION = 'frame_to_decision'  # frame assembled -> gesture decided
+STAGE_FOCUS_RESOLUTION = 'focus_resolution'  # active window and its shortcuts resolved
+STAGE_SEND_EVENTS = 'send_events'  # uinput send_events() of one key
+STAGE_KERNEL_TO_SENT = 'kernel_to_sent'  # kernel event timestamp -> all keys of the gesture sent
+
+STAGES = (STAGE_KERNEL_TO_FRAME, STAGE_FRAME_TO_DECISION, STAGE_FOCUS_RESOLUTION, STAGE_SEND_EVENTS, STAGE_KERNEL_TO_SENT)
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket histogram, observe() only increments preallocated counters.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = list(buckets)
+        self.counts = array('Q', [0] * (len(self.buckets) + 1))
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+
+class LatencyStats:
+    """
+    One histogram per pipeline stage, exported in the Prometheus text format.
+    """
+
+    def __init__(self, stages=STAGES, buckets=DEFAULT_BUCKETS):
+        self.histograms = {stage: LatencyHistogram(buckets) for stage in stages}
+
+    def observe(self, stage, seconds):
+        self.histograms[stage].observe(seconds)
+
+    def prometheus_text(self):
+        lines = [
+            '# HELP {} Latency of the DialPad pipeline stages.'.format(METRIC_NAME),
+            '# TYPE {} histogram'.format(METRIC_NAME),
+        ]
+
+        for stage, histogram in self.histograms.items():
+            cumulative = 0
+            for le, count in zip(histogram.buckets + ['+Inf'], histogram.counts):
+                cumulative += count
+                lines.append('{}_bucket{{stage="{}",le="{}"}} {}'.format(METRIC_NAME, stage, le, cumulative))
+            lines.append('{}_sum{{stage="{}"}} {}'.format(METRIC_NAME, stage, repr(histogram.sum)))
+            lines.append('{}_count{{stage="{}"}} {}'.format(METRIC_NAME, stage, histogram.count))
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """
+        Writes the metrics atomically (e.g. for the node_exporter textfile collector).
+        """
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
@@ -9,6 +9,12 @@ center_button_diameter = 250
 circle_center_x = 770
 circle_center_y = 750
 
+# jitter filter of the dial angle
+# weight of the newest angle in the moving average (1 = no smoothing)
+dial_smoothing = 0.8
+# degrees the finger has to get past a slice boundary before the next step is sent
+dial_hysteresis = 5
+
 app_shortcuts = {
     "code": {
         "center": [
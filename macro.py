@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+# Text macros - a layout action typing a string ({"text": "…"} instead of {"key": ...})
+#
+# Every text is compiled against the current keymap into the input_event
+# structs of the whole string, ready to be written to the uinput fd of the
+# virtual device by one write(). Characters the keymap has no key for are
+# typed by the Ctrl+Shift+U unicode sequence (hex code point, space).
+# Texts are compiled again whenever the keymap changes.
+
+import logging
+import struct
+
+from evdev_reader import EV_KEY, EV_SYN, INPUT_EVENT_FORMAT, SYN_REPORT
+
+log = logging.getLogger('asus-dialpad-driver')
+
+INPUT_EVENT = struct.Struct(INPUT_EVENT_FORMAT)
+# the kernel sets the time of the events written to uinput
+SYN_REPORT_EVENT = INPUT_EVENT.pack(0, 0, EV_SYN, SYN_REPORT, 0)
+
+
+def flatten_keys(key):
+    """
+    evdev key or [modifier keys..., key] (modifiers may be lists too) -> [key codes], modifiers first.
+    """
+    if isinstance(key, list):
+        return [code for k in key for code in flatten_keys(k)]
+
+    return [key.value] if key else []
+
+
+def key_stroke(codes):
+    """
+    Presses codes in order, releases them in reverse order.
+    """
+    return b''.join(
+        [INPUT_EVENT.pack(0, 0, EV_KEY, code, 1) for code in codes] + [SYN_REPORT_EVENT] +
+        [INPUT_EVENT.pack(0, 0, EV_KEY, code, 0) for code in reversed(codes)] + [SYN_REPORT_EVENT]
+    )
+
+
+class MacroCompiler:
+    """
+    keys(keysym name) - evdev key or [modifier keys..., key] typing it on the current keymap, '' when there is none
+    keysym_name(char) - keysym name of char
+    control, shift - keysym names of the modifiers of the unicode sequence
+    """
+
+    def __init__(self, keys, keysym_name, control='Control_L', shift='Shift_L'):
+        self.keys = keys
+        self.keysym_name = keysym_name
+        self.control = control
+        self.shift = shift
+
+    def keysym_names(self, text):
+        """
+        Keysym names the keymap has to resolve for text, incl. the unicode sequence.
+        """
+        names = {self.keysym_name(char) for char in text}
+        names.update((self.control, self.shift, 'u', 'space'))
+        names.update('0123456789abcdef')
+        names.discard(None)
+        return names
+
+    def unicode_sequence(self, char):
+        """
+        Ctrl+Shift+U, the hex code point and space (GTK, Qt and IBus input methods).
+        """
+        start = flatten_keys(self.keys(self.control)) + flatten_keys(self.keys(self.shift)) + flatten_keys(self.keys('u'))
+        digits = [flatten_keys(self.keys(digit)) for digit in '{:x}'.format(ord(char))]
+        end = flatten_keys(self.keys('space'))
+
+        if len(start) < 3 or not all(digits) or not end:
+            return None
+
+        return key_stroke(start) + b''.join(key_stroke(codes) for codes in digits) + key_stroke(end)
+
+    def compile(self, text):
+        """
+        input_event structs typing text, characters which can not be typed at all are left out.
+        """
+        buffer = []
+        for char in text:
+            name = self.keysym_name(char)
+            codes = flatten_keys(self.keys(name)) if name else []
+            if codes:
+                buffer.append(key_stroke(codes))
+                continue
+
+            sequence = self.unicode_sequence(char)
+            if sequence is None:
+                log.warning("Character %r of text macro %r can not be typed on the current keymap", char, text)
+                continue
+            buffer.append(sequence)
+
+        return b''.join(buffer)
+
+    def compile_all(self, texts):
+        """
+        {text: input_event structs} of every text.
+        """
+        return {text: self.compile(text) for text in texts}
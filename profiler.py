@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+
+import cProfile
+import logging
+import os
+import sys
+import tempfile
+import threading
+from collections import Counter
+from time import sleep, strftime
+
+log = logging.getLogger('asus-dialpad-driver')
+
+MODE_CPROFILE = 'cprofile'
+MODE_SAMPLE = 'sample'
+DEFAULT_SAMPLE_INTERVAL = 0.005
+# how long stop() waits for the touch loop to write the cProfile stats
+STOP_TIMEOUT = 2
+
+
+def profile_path(suffix):
+    directory = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    return os.path.join(directory, 'asus-dialpad-driver-profile-{}-{}.{}'.format(os.getpid(), strftime('%Y%m%d-%H%M%S'), suffix))
+
+
+def collapsed_stack(thread_name, frame):
+    # root first, "thread;module:function;module:function"
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append('{}:{}'.format(os.path.basename(code.co_filename), code.co_name))
+        frame = frame.f_back
+
+    names.append(thread_name)
+    names.reverse()
+    return ';'.join(names)
+
+
+class RuntimeProfiler:
+    """
+    Profiling of the running driver, started and stopped at any time from any thread.
+
+    cprofile - deterministic cProfile of the touch loop thread, pstats output
+    sample - every interval samples stacks of all threads (sys._current_frames),
+             collapsed stacks output for flamegraph.pl / speedscope
+
+    cProfile can only be enabled by the profiled thread itself, so the touch loop
+    calls poll() every iteration (it wakes up at least once a second) and the
+    request is carried out there.
+    """
+
+    def __init__(self):
+        self.mode = None
+        self.lock = threading.Lock()
+
+        # cprofile
+        self.requested = None  # "start" or "stop" for the touch loop
+        self.profile = None
+        self.stopped = threading.Event()
+        self.path = None
+
+        # sample
+        self.sampler = None
+        self.sampling = False
+        self.samples = Counter()
+        self.samples_count = 0
+
+    def start(self, mode=MODE_CPROFILE, interval=DEFAULT_SAMPLE_INTERVAL):
+        with self.lock:
+            if self.mode:
+                return "profiler is already running ({})".format(self.mode)
+
+            if mode == MODE_CPROFILE:
+                self.path = profile_path('pstats')
+                self.stopped.clear()
+                self.requested = 'start'
+            elif mode == MODE_SAMPLE:
+                self.path = profile_path('collapsed')
+                self.samples = Counter()
+                self.samples_count = 0
+                self.sampling = True
+                self.sampler = threading.Thread(target=self.sample, args=(interval,), name='profiler', daemon=True)
+                self.sampler.start()
+            else:
+                return "unknown mode {}, use {} or {}".format(mode, MODE_CPROFILE, MODE_SAMPLE)
+
+            self.mode = mode
+
+        log.info("Profiler started (%s)", mode)
+        return "profiler started ({}), stop it to write {}".format(mode, self.path)
+
+    def stop(self):
+        with self.lock:
+            mode = self.mode
+            if mode is None:
+                return "profiler is not running"
+
+            if mode == MODE_CPROFILE and self.requested == 'start':
+                # the touch loop did not pick the start up yet, there is nothing to write
+                self.requested = None
+                self.mode = None
+                return "profiler stopped before it started"
+
+            if mode == MODE_CPROFILE:
+                self.requested = 'stop'
+            else:
+                self.sampling = False
+
+        if mode == MODE_CPROFILE:
+            if not self.stopped.wait(STOP_TIMEOUT):
+                return "stop requested, the touch loop did not respond in {}s (stuck?), {} is written once it does".format(STOP_TIMEOUT, self.path)
+        else:
+            self.sampler.join()
+            self.write_samples()
+
+        with self.lock:
+            self.mode = None
+
+        log.info("Profile written to %s", self.path)
+        return self.path
+
+    def toggle(self, mode=MODE_CPROFILE):
+        if self.mode:
+            return self.stop()
+
+        return self.start(mode)
+
+    def status(self):
+        if not self.mode:
+            return "profiler is not running"
+
+        if self.mode == MODE_SAMPLE:
+            return "profiler is running (sample), {} samples".format(self.samples_count)
+
+        return "profiler is running (cprofile)"
+
+    def poll(self):
+        """
+        Called by the touch loop thread, enables or disables cProfile in it.
+        """
+        if self.requested is None:
+            return
+
+        if self.requested == 'start':
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        elif self.requested == 'stop' and self.profile:
+            self.profile.disable()
+            try:
+                self.profile.dump_stats(self.path)
+            except OSError as e:
+                log.error("Profile can not be written to %s: %s", self.path, e)
+            self.profile = None
+            self.stopped.set()
+
+        self.requested = None
+
+    def close(self):
+        """
+        Writes a running profile on exit, called by the touch loop thread.
+        """
+        if self.mode == MODE_CPROFILE:
+            self.requested = 'stop'
+            self.poll()
+            self.mode = None
+            log.info("Profile written to %s", self.path)
+        elif self.mode == MODE_SAMPLE:
+            self.stop()
+
+    def sample(self, interval):
+        own_id = threading.get_ident()
+
+        while self.sampling:
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own_id:
+                    self.samples[collapsed_stack(thread_names.get(thread_id, str(thread_id)), frame)] += 1
+            self.samples_count += 1
+
+            sleep(interval)
+
+    def write_samples(self):
+        try:
+            with open(self.path, 'w') as f:
+                for stack, count in self.samples.most_common():
+                    f.write('{} {}\n'.format(stack, count))
+        except OSError as e:
+            log.error("Profile can not be written to %s: %s", self.path, e)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+import os
+from time import monotonic
+
+UDEV_DATA_DIR = '/run/udev/data'
+
+
+def wait_for_change(directory, timeout, mask=None, done=None):
+    """
+    Waits until something is created in directory (or done() returns True),
+    mask - inotify events which count, IN_CREATE | IN_MOVED_TO | IN_ATTRIB by default.
+
+    Returns False on timeout or when the directory can not be watched.
+    """
+    from pyinotify import IN_ATTRIB, IN_CREATE, IN_MOVED_TO, Notifier, WatchManager, WatchManagerError
+
+    if mask is None:
+        mask = IN_CREATE | IN_MOVED_TO | IN_ATTRIB
+
+    watch_manager = WatchManager()
+    try:
+        try:
+            watch_manager.add_watch(directory, mask, quiet=False)
+        except WatchManagerError:
+            return False
+
+        notifier = Notifier(watch_manager, default_proc_fun=lambda event: None)
+        deadline = monotonic() + timeout
+
+        # checked after the watch is added, so nothing can be missed in between
+        if done and done():
+            return True
+
+        while True:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                return False
+
+            if notifier.check_events(int(remaining * 1000) + 1):
+                notifier.read_events()
+                notifier.process_events()
+
+                if done is None or done():
+                    return True
+    finally:
+        watch_manager.close()
+
+
+def wait_for_file(path, timeout):
+    """
+    Waits until path exists, returns whether it does.
+    """
+    if os.path.exists(path):
+        return True
+
+    return wait_for_change(os.path.dirname(path), timeout, done=lambda: os.path.exists(path))
+
+
+def wait_for_udev_device(devnode, timeout):
+    """
+    Waits until udev processed the device node (its udev database entry exists),
+    at that time udev announces it to libinput, compositors, X.org, ...
+
+    Returns False on timeout or when udev is not running.
+    """
+    deadline = monotonic() + timeout
+
+    if not devnode or not wait_for_file(devnode, timeout):
+        return False
+
+    if not os.path.isdir(UDEV_DATA_DIR):
+        return False
+
+    rdev = os.stat(devnode).st_rdev
+    udev_data = os.path.join(UDEV_DATA_DIR, 'c{}:{}'.format(os.major(rdev), os.minor(rdev)))
+
+    return wait_for_file(udev_data, max(deadline - monotonic(), 0))
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+
+import ctypes
+import gc
+import logging
+import os
+import threading
+from array import array
+
+log = logging.getLogger('asus-dialpad-driver')
+
+MCL_CURRENT = 1
+MCL_FUTURE = 2
+
+DEFAULT_PRIORITY = 10
+DEFAULT_NICE = -10
+# generation 0 is collected after 50000 allocations instead of 700, the touch loop allocates per frame
+DEFAULT_GC_THRESHOLD = (50000, 20, 100)
+# frames the jitter is computed from
+JITTER_CAPACITY = 4096
+
+
+def parse_cpus(value):
+    """
+    "2,3" or "2-3" -> {2, 3}, empty -> None (no affinity).
+    """
+    # a single "0" or "1" comes from the config parsed as a bool
+    if isinstance(value, bool):
+        return {int(value)}
+
+    cpus = set()
+    for part in str(value or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-", 1)
+            cpus.update(range(int(first), int(last) + 1))
+        else:
+            cpus.add(int(part))
+
+    return cpus or None
+
+
+def parse_gc_threshold(value):
+    """
+    "50000,20,100" -> (50000, 20, 100), empty -> DEFAULT_GC_THRESHOLD.
+    """
+    if not value:
+        return DEFAULT_GC_THRESHOLD
+
+    return tuple(int(part) for part in str(value).split(","))
+
+
+def mlockall():
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.mlockall(MCL_CURRENT | MCL_FUTURE) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+
+
+def percentiles(samples):
+    """
+    (p50, p99, max) of samples, None when there are none.
+    """
+    if not samples:
+        return None
+
+    samples = sorted(samples)
+    return samples[len(samples) // 2], samples[min(len(samples) * 99 // 100, len(samples) - 1)], samples[-1]
+
+
+class FrameJitter:
+    """
+    Wakeup latency (kernel event timestamp -> frame read) and processing time
+    (frame handed to the gesture engine -> done) of the last frames.
+
+    observe() only writes to preallocated arrays, the percentiles are computed by report().
+    """
+
+    def __init__(self, capacity=JITTER_CAPACITY):
+        self.capacity = capacity
+        self.wakeup = array('d', [0.0] * capacity)
+        self.processing = array('d', [0.0] * capacity)
+        self.count = 0
+
+    def observe(self, wakeup, processing):
+        index = self.count % self.capacity
+        self.wakeup[index] = wakeup
+        self.processing[index] = processing
+        self.count += 1
+
+    def samples(self, values):
+        return values[:min(self.count, self.capacity)]
+
+    def report(self):
+        if not self.count:
+            return "no frames handled yet"
+
+        lines = ["last {} frames (ms):".format(min(self.count, self.capacity))]
+        for name, values in (("wakeup", self.wakeup), ("processing", self.processing)):
+            p50, p99, maximum = percentiles(self.samples(values))
+            lines.append("{} p50 {:.3f} p99 {:.3f} max {:.3f} jitter (p99 - p50) {:.3f}".format(
+                name, p50 * 1000, p99 * 1000, maximum * 1000, (p99 - p50) * 1000
+            ))
+
+        return "\n".join(lines)
+
+
+class RealtimeMode:
+    """
+    Low-jitter settings for the touch loop thread.
+
+    priority - SCHED_FIFO priority of the thread, 0 leaves the policy and only sets nice
+    nice - niceness of the thread when SCHED_FIFO is not used or not permitted
+    cpus - CPUs the thread is pinned to (None for all)
+    lock_memory - mlockall() so no page of the process is swapped out or faulted in later
+    gc_threshold - gc.set_threshold() after the objects of the startup are frozen
+
+    Every step which is not permitted (e.g. no CAP_SYS_NICE or RLIMIT_RTPRIO,
+    RLIMIT_MEMLOCK too low) is logged and skipped, the driver runs on without it.
+    Only the calling thread is scheduled so, the threads and processes it
+    starts get the default policy and niceness (SCHED_RESET_ON_FORK).
+    """
+
+    def __init__(self, priority=DEFAULT_PRIORITY, nice=DEFAULT_NICE, cpus=None, lock_memory=True, gc_threshold=DEFAULT_GC_THRESHOLD):
+        self.priority = priority
+        self.nice = nice
+        self.cpus = cpus
+        self.lock_memory = lock_memory
+        self.gc_threshold = gc_threshold
+        # what was achieved, for status()
+        self.applied = []
+
+    def apply(self):
+        """
+        Called by the touch loop thread before it starts listening, when the startup allocations are done.
+        """
+        tid = threading.get_native_id()
+
+        scheduled = False
+        if self.priority:
+            try:
+                # threads the loop starts (e.g. the attaching of a new touchpad) do not inherit the priority
+                os.sched_setscheduler(tid, os.SCHED_FIFO | os.SCHED_RESET_ON_FORK, os.sched_param(self.priority))
+                self.applied.append("SCHED_FIFO priority {}".format(self.priority))
+                scheduled = True
+            except OSError as e:
+                log.warning("Realtime: SCHED_FIFO priority %d is not permitted (%s), using nice %d", self.priority, e, self.nice)
+
+        if not scheduled:
+            try:
+                # nor the negative niceness
+                os.sched_setscheduler(tid, os.SCHED_OTHER | os.SCHED_RESET_ON_FORK, os.sched_param(0))
+            except OSError as e:
+                log.debug("Realtime: children would inherit the niceness: %s", e)
+            try:
+                # Linux niceness is per thread
+                os.setpriority(os.PRIO_PROCESS, tid, self.nice)
+                self.applied.append("nice {}".format(self.nice))
+            except OSError as e:
+                log.warning("Realtime: nice %d is not permitted: %s", self.nice, e)
+
+        if self.cpus:
+            try:
+                os.sched_setaffinity(tid, self.cpus)
+                self.applied.append("CPUs {}".format(",".join(str(cpu) for cpu in sorted(self.cpus))))
+            except OSError as e:
+                log.warning("Realtime: CPU affinity %s can not be set: %s", self.cpus, e)
+
+        if self.lock_memory:
+            try:
+                mlockall()
+                self.applied.append("memory locked")
+            except OSError as e:
+                log.warning("Realtime: memory can not be locked (RLIMIT_MEMLOCK?): %s", e)
+
+        # objects of the startup (modules, layout, keymap) are never collected again
+        gc.collect()
+        gc.freeze()
+        gc.set_threshold(*self.gc_threshold)
+        self.applied.append("gc frozen {} objects, threshold {}".format(gc.get_freeze_count(), ",".join(str(value) for value in self.gc_threshold)))
+
+        log.info("Realtime mode: %s", ", ".join(self.applied))
+
+    def status(self, jitter=None):
+        lines = ["realtime mode: " + (", ".join(self.applied) or "not applied")]
+        lines.append("gc collections by generation: {}".format(", ".join(str(stats["collections"]) for stats in gc.get_stats())))
+        if jitter is not None:
+            lines.append(jitter.report())
+
+        return "\n".join(lines)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+
+# Replays a capture (control command "capture start") through the gesture
+# engine and the shortcut dispatcher of the driver, no hardware is needed
+#
+# Usage: uv run python -m replay CAPTURE_FILE [LAYOUT] [WINDOW_TITLE]
+#
+# Prints every action (gesture, key sent, DialPad toggled) with the kernel
+# timestamp of the frame it came from, relative to the start of the capture.
+# The output of the same capture is always the same, so it can be diffed
+# before and after a change.
+
+import importlib
+import sys
+from time import perf_counter
+
+from capture import CAPTURE_KIND_FRAME, CAPTURE_KIND_KEYBOARD, CAPTURE_KIND_RESYNC, CAPTURE_KIND_STATE, CAPTURE_KIND_TOUCHPAD, read_capture
+from dispatch import ShortcutDispatcher
+from gesture import DialGesture
+from hal import FixedFocusProvider
+
+DEFAULT_LAYOUT = 'asusvivobook16x'
+
+
+class Replay:
+    """
+    Driver without hardware - fake focus (a fixed window title) and a fake
+    virtual device which records the keys instead of sending them.
+
+    actions - [(timestamp, action, detail), ...] in the order they happened
+    """
+
+    def __init__(self, layout, window_title=None):
+        self.layout = layout
+        app_shortcuts = getattr(layout, "app_shortcuts", {})
+        self.focus = FixedFocusProvider(window_title)
+        self.dispatcher = ShortcutDispatcher(app_shortcuts, self.focus.active_window_title, self.send_key, send_text=self.send_text)
+
+        # modifiers of the shortcuts by key code, as the keyboard listener of the driver knows them
+        self.modifiers = {}
+        for shortcuts in app_shortcuts.values():
+            for configs in shortcuts.values():
+                for config in configs if isinstance(configs, list) else [configs]:
+                    if "modifier" in config:
+                        self.modifiers[config["modifier"].value] = config["modifier"]
+        self.active_modifiers = set()
+
+        self.gestures = {}
+        self.enabled = False
+        self.timestamp = 0
+        self.start_timestamp = None
+        self.actions = []
+        self.frames_count = 0
+        self.events_count = 0
+
+    def action(self, action, detail=""):
+        self.actions.append((self.timestamp, action, detail))
+
+    def send_key(self, key_code, press):
+        self.action("key", "{} {}".format(key_code.name, "press" if press else "release"))
+
+    def send_text(self, text):
+        self.action("text", repr(text))
+
+    def on_gesture(self, name, pressed, duration_held):
+        self.action("gesture", "{} {} held {:.3f}s".format(name, "pressed" if pressed else "released", duration_held))
+        self.dispatcher.dispatch(name, pressed, self.active_modifiers, duration_held)
+
+    def on_icon(self):
+        self.enabled = not self.enabled
+        self.action("icon", "enabled" if self.enabled else "disabled")
+
+    def on_touchpad_send_events(self, enabled):
+        self.action("touchpad", "send events {}".format("enabled" if enabled else "disabled"))
+
+    def add_touchpad(self, source, name, max_x, num_slots, slices_count, activation_time, enabled):
+        self.enabled = enabled
+        self.gestures[source] = DialGesture(
+            self.layout,
+            max_x,
+            on_gesture=self.on_gesture,
+            on_icon=self.on_icon,
+            on_touchpad_send_events=self.on_touchpad_send_events,
+            is_enabled=lambda: self.enabled,
+            slices_count=slices_count,
+            activation_time=activation_time,
+            num_slots=num_slots
+        )
+
+    def process(self, kind, source, timestamp, payload):
+        if self.start_timestamp is None:
+            self.start_timestamp = timestamp
+        self.timestamp = timestamp - self.start_timestamp
+
+        if kind == CAPTURE_KIND_FRAME:
+            self.frames_count += 1
+            self.events_count += len(payload) + 1
+            self.gestures[source].process_frame(timestamp, payload)
+        elif kind == CAPTURE_KIND_KEYBOARD:
+            type_, code, value = payload
+            modifier = self.modifiers.get(code, code)
+            if value == 1:
+                self.active_modifiers.add(modifier)
+            elif value == 0:
+                self.active_modifiers.discard(modifier)
+        elif kind == CAPTURE_KIND_RESYNC:
+            self.gestures[source].resync(*payload)
+        elif kind == CAPTURE_KIND_STATE:
+            slices_count, activation_time, enabled = payload
+            gesture = self.gestures[source]
+            gesture.slices_count = slices_count
+            gesture.activation_time = activation_time
+            self.enabled = enabled
+        elif kind == CAPTURE_KIND_TOUCHPAD:
+            self.add_touchpad(source, *payload)
+            self.action("touchpad", payload[0])
+
+    def run(self, records):
+        for record in records:
+            self.process(*record)
+
+        return self.actions
+
+
+def replay(path, layout, window_title=None):
+    """
+    Replays the capture at path, returns the Replay with the actions.
+    """
+    r = Replay(layout, window_title)
+    r.run(read_capture(path))
+    return r
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python -m replay CAPTURE_FILE [LAYOUT] [WINDOW_TITLE]")
+        sys.exit(1)
+
+    layout = importlib.import_module('layouts.' + (sys.argv[2] if len(sys.argv) > 2 else DEFAULT_LAYOUT))
+
+    start = perf_counter()
+    r = replay(sys.argv[1], layout, sys.argv[3] if len(sys.argv) > 3 else None)
+    duration = perf_counter() - start
+
+    for timestamp, action, detail in r.actions:
+        print("{:12.6f} {:<10} {}".format(timestamp, action, detail))
+
+    # timing of the replay itself goes to stderr, stdout stays the same for the same capture
+    print("{} frames, {} events, {} actions replayed in {:.3f}s ({:.0f} frames/s)".format(
+        r.frames_count, r.events_count, len(r.actions), duration, r.frames_count / duration if duration else 0
+    ), file=sys.stderr)
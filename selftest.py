@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+
+# Loopback self-test of the whole driver on the real kernel, no DialPad is needed
+#
+# Usage: uv run python -m selftest [LAYOUT] [--rates 125,250,500] [--gestures N] [--turns N] [--output FILE]
+#
+# Creates a virtual ASUS-like touchpad through /dev/uinput, runs dialpad.py on
+# it (in the current session, with its own config dir and control socket),
+# injects circular gestures at increasing frame rates and reads the keys back
+# from the virtual device of the driver. For every rate it reports the latency
+# from writing the frame which completes a step to the kernel timestamp of the
+# key press, and keys which were dropped or sent extra.
+#
+# Both virtual devices are grabbed, so neither the synthetic touches nor the
+# keys reach the session. Needs write access to /dev/uinput and read access
+# to /dev/input/event* (root or the input group).
+
+import argparse
+import importlib
+import json
+import math
+import os
+import select
+import subprocess
+import sys
+import tempfile
+import threading
+from time import CLOCK_MONOTONIC, monotonic, sleep
+
+import libevdev
+from libevdev import EV_ABS, EV_KEY, EV_SYN, INPUT_PROP_BUTTONPAD, INPUT_PROP_POINTER, Device, InputAbsInfo, InputEvent
+
+from control import send_command
+from discovery import read_input_devices
+from dispatch import ShortcutDispatcher
+from evdev_reader import ABS_MT_POSITION_X, ABS_MT_POSITION_Y, ABS_MT_SLOT, ABS_MT_TRACKING_ID, BTN_TOOL_FINGER, EventReader, grab, set_clock_id
+from evdev_reader import EV_ABS as EV_ABS_TYPE, EV_KEY as EV_KEY_TYPE
+from gesture import DialGesture
+from hal import FixedFocusProvider, RecordingKeySink
+from readiness import wait_for_udev_device
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_LAYOUT = 'asusvivobook16x'
+
+# the driver names its virtual device by the first two words of the touchpad name
+TOUCHPAD_NAME = "DialPad Selftest Touchpad"
+OUTPUT_NAME = "DialPad Selftest DialPad"
+
+# ranges of an ASUS I2C touchpad
+TOUCHPAD_MAX_X = 3946
+TOUCHPAD_MAX_Y = 2000
+TOUCHPAD_RESOLUTION = 31
+TOUCHPAD_SLOTS = 5
+
+BTN_TOUCH = 0x14a
+ABS_X = 0x00
+ABS_Y = 0x01
+
+# config the expected keys are computed with
+SLICES_COUNT = 4
+ACTIVATION_TIME = 1
+
+DEFAULT_RATES = (125, 250, 500, 1000, 2000, 4000)
+STEP_DEGREES = 10
+DRIVER_START_TIMEOUT = 30
+# keys still on the way after the last frame of a rate
+SETTLE_TIME = 0.5
+
+
+def create_touchpad():
+    dev = Device()
+    dev.name = TOUCHPAD_NAME
+    dev.enable(INPUT_PROP_POINTER)
+    dev.enable(INPUT_PROP_BUTTONPAD)
+    for code in (EV_KEY.BTN_LEFT, EV_KEY.BTN_TOUCH, EV_KEY.BTN_TOOL_FINGER, EV_KEY.BTN_TOOL_DOUBLETAP, EV_KEY.BTN_TOOL_TRIPLETAP):
+        dev.enable(code)
+
+    dev.enable(EV_ABS.ABS_X, InputAbsInfo(minimum=0, maximum=TOUCHPAD_MAX_X, resolution=TOUCHPAD_RESOLUTION))
+    dev.enable(EV_ABS.ABS_Y, InputAbsInfo(minimum=0, maximum=TOUCHPAD_MAX_Y, resolution=TOUCHPAD_RESOLUTION))
+    dev.enable(EV_ABS.ABS_MT_SLOT, InputAbsInfo(minimum=0, maximum=TOUCHPAD_SLOTS - 1))
+    dev.enable(EV_ABS.ABS_MT_TRACKING_ID, InputAbsInfo(minimum=0, maximum=65535))
+    dev.enable(EV_ABS.ABS_MT_POSITION_X, InputAbsInfo(minimum=0, maximum=TOUCHPAD_MAX_X, resolution=TOUCHPAD_RESOLUTION))
+    dev.enable(EV_ABS.ABS_MT_POSITION_Y, InputAbsInfo(minimum=0, maximum=TOUCHPAD_MAX_Y, resolution=TOUCHPAD_RESOLUTION))
+    dev.enable(EV_ABS.ABS_MT_TOOL_TYPE, InputAbsInfo(minimum=0, maximum=2))
+
+    return dev.create_uinput_device()
+
+
+def circle_frames(layout, gestures_count, turns):
+    """
+    Frames of gestures_count touches, each going turns times around the dial, as [(type, code, value), ...].
+    """
+    center_x = getattr(layout, "circle_center_x", 0)
+    center_y = getattr(layout, "circle_center_y", 0)
+    # halfway between the center button and the edge of the dial
+    radius = (getattr(layout, "center_button_diameter", 0) + getattr(layout, "circle_diameter", 0)) / 4
+
+    frames = []
+    for gesture in range(gestures_count):
+        for step in range(int(turns * 360 / STEP_DEGREES) + 1):
+            angle = math.radians(step * STEP_DEGREES)
+            x = int(center_x + radius * math.cos(angle))
+            y = int(center_y + radius * math.sin(angle))
+            events = []
+            if step == 0:
+                events += [(EV_ABS_TYPE, ABS_MT_SLOT, 0), (EV_ABS_TYPE, ABS_MT_TRACKING_ID, gesture % 65536)]
+            events += [(EV_ABS_TYPE, ABS_MT_POSITION_X, x), (EV_ABS_TYPE, ABS_MT_POSITION_Y, y)]
+            if step == 0:
+                events += [(EV_KEY_TYPE, BTN_TOUCH, 1), (EV_KEY_TYPE, BTN_TOOL_FINGER, 1)]
+            events += [(EV_ABS_TYPE, ABS_X, x), (EV_ABS_TYPE, ABS_Y, y)]
+            frames.append(events)
+
+        frames.append([(EV_ABS_TYPE, ABS_MT_TRACKING_ID, -1), (EV_KEY_TYPE, BTN_TOUCH, 0), (EV_KEY_TYPE, BTN_TOOL_FINGER, 0)])
+
+    return frames
+
+
+def expected_presses(layout, frames):
+    """
+    Indexes of the frames after which the driver sends a key press, by the same
+    gesture engine and dispatch without a focused window.
+    """
+    frame_index = [0]
+    sink = RecordingKeySink(clock=lambda: frame_index[0])
+    dispatcher = ShortcutDispatcher(getattr(layout, "app_shortcuts", {}), FixedFocusProvider().active_window_title, sink.send_key)
+    gesture = DialGesture(
+        layout,
+        TOUCHPAD_MAX_X,
+        on_gesture=lambda name, pressed, duration_held: dispatcher.dispatch(name, pressed, set(), duration_held),
+        on_icon=lambda: None,
+        on_touchpad_send_events=lambda enabled: None,
+        is_enabled=lambda: True,
+        slices_count=SLICES_COUNT,
+        activation_time=ACTIVATION_TIME,
+        num_slots=TOUCHPAD_SLOTS
+    )
+
+    for index, events in enumerate(frames):
+        frame_index[0] = index
+        gesture.process_frame(index * 0.001, events)
+
+    return [index for index, key_code, press in sink.keys if press]
+
+
+class KeyReader(threading.Thread):
+    """
+    Kernel timestamps (monotonic) of the key presses of the virtual device of the driver.
+    """
+
+    def __init__(self, devnode):
+        super().__init__(daemon=True)
+        self.fd = os.open(devnode, os.O_RDONLY | os.O_NONBLOCK)
+        set_clock_id(self.fd, CLOCK_MONOTONIC)
+        grab(self.fd)
+        self.reader = EventReader(self.fd)
+        self.presses = []
+        self.stopped = False
+
+    def run(self):
+        while not self.stopped:
+            if not select.select([self.fd], [], [], 0.1)[0]:
+                continue
+
+            try:
+                frames, dropped = self.reader.read_frames()
+            except BlockingIOError:
+                continue
+
+            for timestamp, events in frames:
+                for type_, code, value in events:
+                    if type_ == EV_KEY_TYPE and value == 1:
+                        self.presses.append(timestamp)
+
+    def close(self):
+        self.stopped = True
+        self.join()
+        os.close(self.fd)
+
+
+def start_driver(layout_name, touchpad_devnode, workdir):
+    with open(os.path.join(workdir, 'dialpad_dev'), 'w') as f:
+        f.write("[main]\nenabled = 1\nslices_count = {}\nactivation_time = {}\n".format(SLICES_COUNT, ACTIVATION_TIME))
+
+    env = dict(os.environ, DIALPAD_SELFTEST_TOUCHPAD=touchpad_devnode, DIALPAD_CONTROL_SOCKET=os.path.join(workdir, 'control.sock'),
+               DIALPAD_AGENT_SOCKET=os.path.join(workdir, 'agent.sock'))
+    env.pop('NOTIFY_SOCKET', None)
+
+    log_file = open(os.path.join(workdir, 'driver.log'), 'w')
+    return subprocess.Popen(
+        [sys.executable, os.path.join(PROJECT_DIR, 'dialpad.py'), layout_name, workdir + os.sep],
+        cwd=PROJECT_DIR, env=env, stdout=log_file, stderr=subprocess.STDOUT
+    )
+
+
+def wait_for_driver(driver, workdir):
+    """
+    Devnode of the virtual device of the driver once the driver answers on its control socket.
+    """
+    deadline = monotonic() + DRIVER_START_TIMEOUT
+    while monotonic() < deadline:
+        if driver.poll() is not None:
+            raise RuntimeError("driver exited with {}, see {}".format(driver.returncode, os.path.join(workdir, 'driver.log')))
+
+        output = next((device for device in read_input_devices() if device.name == OUTPUT_NAME), None)
+        if output:
+            try:
+                send_command("help", os.path.join(workdir, 'control.sock'))
+                return output.devnode
+            except OSError:
+                pass
+
+        sleep(0.1)
+
+    raise RuntimeError("driver did not start in {}s, see {}".format(DRIVER_START_TIMEOUT, os.path.join(workdir, 'driver.log')))
+
+
+def inject(touchpad, frames, rate):
+    """
+    Writes frames at rate frames per second, returns monotonic() times of the writes.
+    """
+    input_events = [
+        [InputEvent(libevdev.evbit(type_, code), value) for type_, code, value in events] + [InputEvent(EV_SYN.SYN_REPORT, 0)]
+        for events in frames
+    ]
+    write_times = []
+    start = monotonic()
+
+    for index, events in enumerate(input_events):
+        deadline = start + index / rate
+        while True:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                break
+            if remaining > 0.002:
+                sleep(remaining - 0.001)
+
+        write_times.append(monotonic())
+        touchpad.send_events(events)
+
+    return write_times
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def run_rate(touchpad, key_reader, frames, expected, rate):
+    presses_before = len(key_reader.presses)
+    write_times = inject(touchpad, frames, rate)
+    sleep(SETTLE_TIME)
+    presses = key_reader.presses[presses_before:]
+
+    # n-th key press belongs to the n-th expected one
+    latencies = [press - write_times[index] for press, index in zip(presses, expected)]
+    duration = write_times[-1] - write_times[0]
+
+    return {
+        "rate": rate,
+        "achieved_rate": (len(frames) - 1) / duration if duration else 0,
+        "frames": len(frames),
+        "expected": len(expected),
+        "received": len(presses),
+        "dropped": max(len(expected) - len(presses), 0),
+        "extra": max(len(presses) - len(expected), 0),
+        "latency_p50_ms": percentile(latencies, 0.5) * 1000 if latencies else None,
+        "latency_p99_ms": percentile(latencies, 0.99) * 1000 if latencies else None,
+        "latency_max_ms": max(latencies) * 1000 if latencies else None,
+    }
+
+
+def format_ms(value):
+    return "{:8.3f}".format(value) if value is not None else "       -"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Loopback self-test of the driver on a virtual touchpad.")
+    parser.add_argument("layout", nargs="?", default=DEFAULT_LAYOUT)
+    parser.add_argument("--rates", default=",".join(str(rate) for rate in DEFAULT_RATES), help="frames per second, comma separated")
+    parser.add_argument("--gestures", type=int, default=10, help="touches per rate")
+    parser.add_argument("--turns", type=float, default=2, help="turns around the dial per touch")
+    parser.add_argument("--output", help="JSON file of the results")
+    args = parser.parse_args()
+
+    layout = importlib.import_module('layouts.' + args.layout)
+    frames = circle_frames(layout, args.gestures, args.turns)
+    expected = expected_presses(layout, frames)
+
+    workdir = tempfile.mkdtemp(prefix='asus-dialpad-driver-selftest-')
+    touchpad = create_touchpad()
+    wait_for_udev_device(touchpad.devnode, 1)
+    print("Virtual touchpad {}, driver files in {}".format(touchpad.devnode, workdir), file=sys.stderr)
+
+    driver = start_driver(args.layout, touchpad.devnode, workdir)
+    key_reader = None
+    results = []
+    try:
+        key_reader = KeyReader(wait_for_driver(driver, workdir))
+        key_reader.start()
+
+        # the first touch only makes sure the events loop is listening
+        run_rate(touchpad, key_reader, circle_frames(layout, 1, 1), [], DEFAULT_RATES[0])
+
+        print("    rate achieved  frames expected received dropped  extra   p50 ms   p99 ms   max ms")
+        for rate in (int(rate) for rate in args.rates.split(",")):
+            result = run_rate(touchpad, key_reader, frames, expected, rate)
+            results.append(result)
+            print("{rate:8d} {achieved_rate:8.0f} {frames:7d} {expected:8d} {received:8d} {dropped:7d} {extra:6d} ".format(**result) +
+                  " ".join(format_ms(result[key]) for key in ("latency_p50_ms", "latency_p99_ms", "latency_max_ms")))
+
+        # stage latencies measured by the driver itself
+        metrics_path = os.path.join(workdir, 'metrics.prom')
+        send_command("metrics " + metrics_path, os.path.join(workdir, 'control.sock'))
+        print("Latency histograms of the driver stages in {}".format(metrics_path), file=sys.stderr)
+    finally:
+        if key_reader:
+            key_reader.close()
+        driver.terminate()
+        try:
+            driver.wait(5)
+        except subprocess.TimeoutExpired:
+            driver.kill()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"layout": args.layout, "gestures": args.gestures, "turns": args.turns, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+
+import logging
+import os
+import socket
+from time import monotonic
+
+log = logging.getLogger('asus-dialpad-driver')
+
+# systemd-python is optional, without it is the notify protocol spoken directly
+# and logs go to stderr
+try:
+    from systemd import daemon as systemd_daemon
+    from systemd.journal import JournalHandler
+except ImportError:
+    systemd_daemon = None
+    JournalHandler = None
+
+SYSLOG_IDENTIFIER = 'asus-dialpad-driver'
+
+# how often is the status line refreshed
+STATUS_INTERVAL = 10
+
+
+def notify(state):
+    """
+    sd_notify(), returns whether the message was sent (False when not started by systemd).
+    """
+    if systemd_daemon:
+        return systemd_daemon.notify(state)
+
+    address = os.environ.get('NOTIFY_SOCKET')
+    if not address:
+        return False
+
+    # abstract namespace socket
+    if address.startswith('@'):
+        address = '\0' + address[1:]
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM | socket.SOCK_CLOEXEC) as s:
+            s.sendto(state.encode(), address)
+        return True
+    except OSError as e:
+        log.debug("sd_notify %s failed: %s", state, e)
+        return False
+
+
+def stderr_is_journal():
+    """
+    Whether stderr is connected to journald (systemd sets JOURNAL_STREAM to its device:inode).
+    """
+    journal_stream = os.environ.get('JOURNAL_STREAM')
+    if not journal_stream:
+        return False
+
+    try:
+        stat = os.fstat(2)
+    except OSError:
+        return False
+
+    return journal_stream == '{}:{}'.format(stat.st_dev, stat.st_ino)
+
+
+def journal_handler():
+    """
+    Logging handler sending records to journald with their extra fields
+    (e.g. GESTURE, APP, KEY, LATENCY_MS) as journal fields, None when the
+    output does not go to the journal anyway or systemd-python is missing.
+    """
+    if not JournalHandler or not stderr_is_journal():
+        return None
+
+    return JournalHandler(SYSLOG_IDENTIFIER=SYSLOG_IDENTIFIER)
+
+
+def setup_logging():
+    # started by systemd -> straight to journald with structured fields
+    handler = journal_handler()
+    if handler:
+        logging.basicConfig(
+            handlers=[handler],
+            level=os.environ.get('LOG', 'INFO')
+        )
+        return
+
+    logging.basicConfig(
+        format='%(asctime)s %(levelname)s %(message)s',
+        level=os.environ.get('LOG', 'INFO')
+    )
+
+
+def watchdog_interval():
+    """
+    Seconds between two WATCHDOG=1 (half of WatchdogSec=), None when is the watchdog not enabled for this process.
+    """
+    usec = os.environ.get('WATCHDOG_USEC')
+    pid = os.environ.get('WATCHDOG_PID')
+    if not usec or (pid and pid != str(os.getpid())):
+        return None
+
+    try:
+        return int(usec) / 1000000 / 2
+    except ValueError:
+        return None
+
+
+class ServiceNotifier:
+    """
+    Readiness, liveness and status reported to the service manager.
+
+    heartbeat() is meant to be called from the loop which handles the input,
+    so when that loop gets stuck (e.g. in a hung subprocess call) the watchdog
+    is not pinged and the service is restarted.
+    """
+
+    def __init__(self):
+        self.watchdog_interval = watchdog_interval()
+        self.last_watchdog = 0
+        self.last_status = 0
+
+    def ready(self, status):
+        notify('READY=1\nSTATUS=' + status)
+        self.last_status = monotonic()
+
+    def stopping(self):
+        notify('STOPPING=1')
+
+    def heartbeat(self, status=None):
+        """
+        Pings the watchdog when is it time and refreshes the status line,
+        status is a function returning it (called only when is needed).
+        """
+        now = monotonic()
+
+        if self.watchdog_interval and now - self.last_watchdog >= self.watchdog_interval:
+            notify('WATCHDOG=1')
+            self.last_watchdog = now
+
+        if status and now - self.last_status >= STATUS_INTERVAL:
+            notify('STATUS=' + status())
+            self.last_status = now
+
+    def select_timeout(self, timeout):
+        """
+        timeout limited so the loop wakes up in time for the next heartbeat.
+        """
+        if self.watchdog_interval:
+            return min(timeout, self.watchdog_interval)
+
+        return timeout
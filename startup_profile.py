@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+import builtins
+import logging
+import os
+import sys
+from contextlib import contextmanager
+from time import perf_counter
+
+log = logging.getLogger('asus-dialpad-driver')
+
+# STARTUP_PROFILE=1 enables the profiling mode, STARTUP_BUDGET_MS sets the limit of the time to ready
+STARTUP_PROFILE_ENV = 'STARTUP_PROFILE'
+STARTUP_BUDGET_ENV = 'STARTUP_BUDGET_MS'
+STARTUP_BUDGET_DEFAULT_MS = 1000
+# imports faster than this are not listed in the report
+IMPORT_REPORT_THRESHOLD_US = 1000
+
+
+class StartupProfile:
+    """
+    Measures where the startup time goes.
+
+    Every first-time import is timed like "python -X importtime" does (self and
+    cumulative time, nesting) by wrapping builtins.__import__, and main() wraps
+    its steps in phase() blocks. report() logs both and tells whether the time
+    from launch to ready fits into the budget.
+    """
+
+    def __init__(self, budget_ms=STARTUP_BUDGET_DEFAULT_MS):
+        self.budget_ms = budget_ms
+        self.start = perf_counter()
+        self.imports = []  # (depth, name, self_us, cumulative_us) in the order the imports finished
+        self.import_stack = []  # time spent in nested imports of the imports in progress
+        self.phases = []  # (name, ms)
+        self.original_import = None
+
+    @classmethod
+    def from_environment(cls):
+        if os.environ.get(STARTUP_PROFILE_ENV, '0') in ('', '0'):
+            return None
+
+        try:
+            budget_ms = float(os.environ.get(STARTUP_BUDGET_ENV, STARTUP_BUDGET_DEFAULT_MS))
+        except ValueError:
+            budget_ms = STARTUP_BUDGET_DEFAULT_MS
+
+        profile = cls(budget_ms)
+        profile.trace_imports()
+        return profile
+
+    def trace_imports(self):
+        self.original_import = builtins.__import__
+
+        def traced_import(name, globals=None, locals=None, fromlist=(), level=0):
+            if level or name in sys.modules:
+                return self.original_import(name, globals, locals, fromlist, level)
+
+            self.import_stack.append(0)
+            start = perf_counter()
+            try:
+                return self.original_import(name, globals, locals, fromlist, level)
+            finally:
+                cumulative_us = (perf_counter() - start) * 1000000
+                nested_us = self.import_stack.pop()
+                if self.import_stack:
+                    self.import_stack[-1] += cumulative_us
+                self.imports.append((len(self.import_stack), name, cumulative_us - nested_us, cumulative_us))
+
+        builtins.__import__ = traced_import
+
+    def stop_tracing_imports(self):
+        if self.original_import:
+            builtins.__import__ = self.original_import
+            self.original_import = None
+
+    @contextmanager
+    def phase(self, name):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, (perf_counter() - start) * 1000))
+
+    def elapsed_ms(self):
+        return (perf_counter() - self.start) * 1000
+
+    def report(self):
+        """
+        Logs the breakdown and returns whether the startup fits into the budget.
+        """
+        self.stop_tracing_imports()
+        elapsed_ms = self.elapsed_ms()
+
+        log.info("Startup imports (self [us] | cumulative [us] | module):")
+        for depth, name, self_us, cumulative_us in self.imports:
+            if cumulative_us >= IMPORT_REPORT_THRESHOLD_US:
+                log.info("%10.0f | %10.0f | %s%s", self_us, cumulative_us, "  " * depth, name)
+
+        log.info("Startup phases:")
+        for name, ms in self.phases:
+            log.info("%10.1f ms  %s", ms, name)
+
+        if elapsed_ms > self.budget_ms:
+            log.error("Startup took %.1f ms which is over the budget of %.0f ms", elapsed_ms, self.budget_ms)
+            return False
+
+        log.info("Startup took %.1f ms (budget %.0f ms)", elapsed_ms, self.budget_ms)
+        return True
@@ -0,0 +1,90 @@
+import errno
+import socket
+import tempfile
+
+import pytest
+
+import agent_link
+from agent_link import AGENT_SOCKET_NAME, MSG_LAYOUT, AgentLink, agent_socket_path, connect_agent_socket, encode
+
+
+@pytest.fixture
+def environ(monkeypatch, tmp_path):
+    for name in ("DIALPAD_AGENT_SOCKET", "XDG_RUNTIME_DIR", "SUDO_UID"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(agent_link, "USER_RUNTIME_DIRS", str(tmp_path))
+    (tmp_path / "1000").mkdir()
+    return monkeypatch
+
+
+def test_socket_in_the_runtime_dir(environ, tmp_path):
+    environ.setenv("XDG_RUNTIME_DIR", str(tmp_path / "runtime"))
+    environ.setenv("SUDO_UID", "1000")
+
+    assert agent_socket_path() == str(tmp_path / "runtime" / AGENT_SOCKET_NAME)
+
+
+def test_core_started_by_sudo_uses_the_runtime_dir_of_the_user(environ, tmp_path):
+    environ.setenv("SUDO_UID", "1000")
+
+    assert agent_socket_path() == str(tmp_path / "1000" / AGENT_SOCKET_NAME)
+
+
+def test_user_without_runtime_dir(environ, tmp_path):
+    environ.setenv("SUDO_UID", "1001")
+
+    assert agent_socket_path().startswith(tempfile.gettempdir())
+
+
+def test_socket_of_the_environment(environ):
+    environ.setenv("DIALPAD_AGENT_SOCKET", "/tmp/agent.sock")
+    environ.setenv("SUDO_UID", "1000")
+
+    assert agent_socket_path() == "/tmp/agent.sock"
+
+
+def test_core_is_told_when_the_agent_goes_away(environ, tmp_path):
+    calls = []
+    link = AgentLink(on_layout=lambda index, layout: calls.append((index, layout)), path=str(tmp_path / AGENT_SOCKET_NAME),
+                     on_disconnect=lambda: calls.append("disconnect"))
+    link.open()
+    try:
+        agent = connect_agent_socket(link.path)
+        link.accept()
+        agent.send(encode(MSG_LAYOUT, 1, text="de"))
+        link.receive()
+        agent.close()
+        link.receive()
+
+        assert calls == [(1, "de"), "disconnect"]
+        assert not link.connected
+    finally:
+        link.close()
+
+
+def test_socket_of_a_running_core_is_not_taken_over(tmp_path):
+    running = AgentLink(on_layout=lambda index, layout: None, path=str(tmp_path / AGENT_SOCKET_NAME))
+    running.open()
+    try:
+        second = AgentLink(on_layout=lambda index, layout: None, path=running.path)
+        with pytest.raises(OSError) as e:
+            second.open()
+        second.close()
+
+        assert e.value.errno == errno.EADDRINUSE
+        connect_agent_socket(running.path).close()
+    finally:
+        running.close()
+
+
+def test_stale_socket_is_replaced(tmp_path):
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    stale.bind(str(tmp_path / AGENT_SOCKET_NAME))
+    stale.close()
+
+    link = AgentLink(on_layout=lambda index, layout: None, path=str(tmp_path / AGENT_SOCKET_NAME))
+    link.open()
+    try:
+        connect_agent_socket(link.path).close()
+    finally:
+        link.close()
@@ -0,0 +1,122 @@
+from types import SimpleNamespace
+
+import pytest
+
+from capture import (
+    CAPTURE_KIND_FRAME, CAPTURE_KIND_KEYBOARD, CAPTURE_KIND_RESYNC, CAPTURE_KIND_STATE, CAPTURE_KIND_TOUCHPAD, KEYBOARD_SOURCE,
+    CaptureWriter, read_capture
+)
+from discovery import InputDevice
+from engine import DialPadEngine
+from evdev_reader import ABS_MT_POSITION_X, ABS_MT_POSITION_Y, ABS_MT_TRACKING_ID, BTN_TOOL_FINGER, EV_ABS, EV_KEY
+from hal import FakeDialPadController, FakeTouchpadSource
+
+KEY_LEFTSHIFT = 42
+SLOT_VALUES = {
+    ABS_MT_TRACKING_ID: [4, -1, 7],
+    ABS_MT_POSITION_X: [1270, 0, -5],
+    ABS_MT_POSITION_Y: [750, 0, 3000],
+}
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "capture.bin")
+
+
+def write_session(path):
+    writer = CaptureWriter(path)
+    first = writer.add_touchpad(1.0, "ASUE1416:00 04F3:3227 Touchpad", 3946, 3, 4, 1.5, True)
+    second = writer.add_touchpad(1.25, "Touchpad 2", 2000, 1, 8, 1, False)
+
+    first.resync(1.0, 0, SLOT_VALUES)
+    first.frame(1.007, [(EV_ABS, ABS_MT_TRACKING_ID, 5), (EV_ABS, ABS_MT_POSITION_X, 1300), (EV_KEY, BTN_TOOL_FINGER, 1)])
+    writer.keyboard(1.01, EV_KEY, KEY_LEFTSHIFT, 1)
+    second.frame(1.3, [])
+    first.state(2.0, 8, 2.0, False)
+    writer.close()
+
+    return writer
+
+
+def test_records_read_back_in_order(path):
+    writer = write_session(path)
+
+    assert writer.records_count == 7
+    assert list(read_capture(path)) == [
+        (CAPTURE_KIND_TOUCHPAD, 1, 1.0, ("ASUE1416:00 04F3:3227 Touchpad", 3946, 3, 4, 1.5, True)),
+        (CAPTURE_KIND_TOUCHPAD, 2, 1.25, ("Touchpad 2", 2000, 1, 8, 1.0, False)),
+        (CAPTURE_KIND_RESYNC, 1, 1.0, (0, SLOT_VALUES)),
+        (CAPTURE_KIND_FRAME, 1, 1.007, [(EV_ABS, ABS_MT_TRACKING_ID, 5), (EV_ABS, ABS_MT_POSITION_X, 1300), (EV_KEY, BTN_TOOL_FINGER, 1)]),
+        (CAPTURE_KIND_KEYBOARD, KEYBOARD_SOURCE, 1.01, (EV_KEY, KEY_LEFTSHIFT, 1)),
+        (CAPTURE_KIND_FRAME, 2, 1.3, []),
+        (CAPTURE_KIND_STATE, 1, 2.0, (8, 2.0, False)),
+    ]
+
+
+def test_records_after_close_are_dropped(path):
+    writer = write_session(path)
+    writer.keyboard(3.0, EV_KEY, KEY_LEFTSHIFT, 0)
+
+    assert len(list(read_capture(path))) == 7
+
+
+@pytest.mark.parametrize("cut", [1, 5, 20])
+def test_capture_of_a_killed_driver_ends_at_the_last_whole_record(path, cut):
+    write_session(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(data[:-cut])
+
+    records = list(read_capture(path))
+
+    assert 0 < len(records) < 7
+    assert records[-1][0] != CAPTURE_KIND_STATE
+
+
+def test_not_a_capture(path):
+    with open(path, 'wb') as f:
+        f.write(b'DPTRACE1' + bytes(32))
+
+    with pytest.raises(ValueError):
+        list(read_capture(path))
+
+
+def test_engine_records_what_the_gesture_gets(path):
+    source = FakeTouchpadSource(num_slots=3)
+    source.state = (0, SLOT_VALUES)
+    engine = DialPadEngine(
+        InputDevice("ASUE1416:00 04F3:3227 Touchpad", 7, "/dev/input/event7", "", 1, "i2c-ASUE1416:00"),
+        SimpleNamespace(circle_diameter=1400, center_button_diameter=250, circle_center_x=770, circle_center_y=750),
+        on_gesture=lambda *args: None,
+        on_icon=lambda engine: None,
+        on_touchpad_send_events=lambda engine, enabled: None,
+        on_events_dropped=lambda engine, events_count: None,
+        is_enabled=lambda: True,
+        controller=FakeDialPadController(),
+        source=source
+    )
+    engine.open()
+    writer = CaptureWriter(path)
+    engine.start_capture(writer)
+
+    frames = [
+        (0.5, [(EV_ABS, ABS_MT_POSITION_X, 1200)]),
+        (0.507, [(EV_ABS, ABS_MT_POSITION_Y, 760)]),
+    ]
+    for timestamp, events in frames:
+        source.push(timestamp, events)
+    engine.process()
+    engine.deactivate()
+    writer.close()
+    engine.close()
+
+    records = list(read_capture(path))
+    assert [kind for kind, source_id, timestamp, payload in records] == [
+        CAPTURE_KIND_TOUCHPAD, CAPTURE_KIND_RESYNC, CAPTURE_KIND_FRAME, CAPTURE_KIND_FRAME, CAPTURE_KIND_STATE
+    ]
+    assert records[0][3][:3] == ("ASUE1416:00 04F3:3227 Touchpad", 3946, 3)
+    assert records[1][3] == (0, SLOT_VALUES)
+    assert [(timestamp, payload) for kind, source_id, timestamp, payload in records[2:4]] == frames
+    assert records[4][3] == (4, 1.0, False)
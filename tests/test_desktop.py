@@ -0,0 +1,51 @@
+import subprocess
+import sys
+
+import pytest
+
+import desktop
+
+SOURCES = b"[('xkb', 'us'), ('xkb', 'de+nodeadkeys')]"
+
+
+@pytest.fixture
+def gsettings(monkeypatch):
+    values = {}
+    monkeypatch.setattr(desktop, "gsettingsGet", lambda path, name: values.get(name))
+    monkeypatch.setattr(desktop, "gnome_current_layout", None)
+    monkeypatch.setattr(desktop, "gnome_current_layout_index", None)
+    return values
+
+
+def test_agent_does_not_import_the_core():
+    code = "import sys, agent; print(sorted({'dialpad', 'engine', 'keysink', 'libevdev', 'smbus2'} & set(sys.modules)))"
+
+    assert subprocess.check_output([sys.executable, "-c", code], text=True).strip() == "[]"
+
+
+def test_wayland_layout_is_reported(gsettings):
+    desktop.use_session("wayland", wayland_display_var="wayland-0")
+    gsettings["sources"] = SOURCES
+    gsettings["mru-sources"] = b"[('xkb', 'de+nodeadkeys'), ('xkb', 'us')]"
+    layouts = []
+
+    desktop.update_gnome_layout(lambda index, layout: layouts.append((index, layout)))
+
+    assert layouts == [(1, "de")]
+
+
+def test_x11_layout_is_set_by_setxkbmap(gsettings, monkeypatch):
+    desktop.use_session("x11", x11_display_var=":0")
+    gsettings["sources"] = SOURCES
+    gsettings["mru-sources"] = b"@a(ss) []"
+    gsettings["current"] = b"uint32 1"
+    commands = []
+    monkeypatch.setattr(desktop.subprocess, "call", commands.append)
+
+    # the first layout is the one the X server already has
+    desktop.update_gnome_layout(None)
+    assert commands == []
+
+    gsettings["current"] = b"uint32 0"
+    desktop.update_gnome_layout(None)
+    assert commands == [["setxkbmap", "us", "-display", ":0"]]
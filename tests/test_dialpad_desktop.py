@@ -0,0 +1,58 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import desktop
+import dialpad
+
+
+@pytest.fixture
+def session(monkeypatch):
+    monkeypatch.setattr(dialpad, "xdg_session_type", "wayland")
+    monkeypatch.setattr(dialpad, "agent_link", None)
+    return monkeypatch
+
+
+def test_touch_loop_only_queues_the_touchpad_toggling(session):
+    calls = []
+    session.setattr(desktop, "set_touchpad_prop_send_events", lambda engine, enabled: calls.append((engine.name, enabled)))
+    toggler = dialpad.DesktopTouchpadToggler()
+    engine = SimpleNamespace(name="ASUE140D:00 04F3:31B9 Touchpad", input_device=SimpleNamespace(event=12))
+
+    toggler.set_send_events(engine, False)
+    toggler.set_send_events(engine, True)
+    assert calls == []
+
+    session.setattr(dialpad, "stop_threads", False)
+    worker = threading.Thread(target=toggler.run)
+    worker.start()
+    try:
+        deadline = time.monotonic() + 5
+        while len(calls) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        dialpad.stop_threads = True
+        worker.join()
+
+    assert calls == [(engine.name, False), (engine.name, True)]
+
+
+def test_nothing_is_queued_without_a_session(session):
+    session.setattr(dialpad, "xdg_session_type", None)
+    toggler = dialpad.DesktopTouchpadToggler()
+
+    toggler.set_send_events(SimpleNamespace(name="touchpad", input_device=SimpleNamespace(event=12)), False)
+
+    assert toggler.requests.empty()
+
+
+def test_focus_seen_by_the_watcher_without_an_agent(session):
+    provider = dialpad.SessionFocusProvider()
+    provider.set_window_title("Mozilla Firefox")
+
+    assert provider.active_window_title() == "Mozilla Firefox"
+
+    session.setattr(dialpad, "agent_link", SimpleNamespace(connected=True, window_title="Terminal"))
+    assert provider.active_window_title() == "Terminal"
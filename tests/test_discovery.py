@@ -0,0 +1,135 @@
+import os
+
+import pytest
+
+import discovery
+from discovery import find_keyboard, find_touchpads, parse_uevent, read_input_device, read_input_devices, uevent_input_device
+
+I2C_DEVICE = "devices/pci0000:00/0000:00:15.0/i2c_designware.0/i2c-1/i2c-ASUE140D:00/0018:04F3:31B9.0001"
+USB_DEVICE = "devices/pci0000:00/0000:00:14.0/usb1/1-3/1-3:1.0/0003:046D:C52B.0002"
+
+
+@pytest.fixture
+def sysfs(tmp_path):
+    """
+    Adds an input device with its event node to a fake /sys, returns the /sys/class/input path.
+    """
+    class_input = tmp_path / "class" / "input"
+    class_input.mkdir(parents=True)
+
+    def add(device_path, input_number, name):
+        input_dir = tmp_path / device_path / "input" / "input{}".format(input_number)
+        event_dir = input_dir / "event{}".format(input_number)
+        event_dir.mkdir(parents=True)
+        (input_dir / "name").write_text(name + "\n")
+        os.symlink("..", event_dir / "device")
+        os.symlink(event_dir, class_input / "event{}".format(input_number))
+        os.symlink(input_dir, class_input / "input{}".format(input_number))
+        return str(class_input / "event{}".format(input_number))
+
+    add.class_input = str(class_input)
+    return add
+
+
+def test_i2c_bus_and_client_of_the_sysfs_path(sysfs):
+    event_path = sysfs(I2C_DEVICE, 12, "ASUE140D:00 04F3:31B9 Touchpad")
+
+    device = read_input_device(event_path)
+
+    assert device.name == "ASUE140D:00 04F3:31B9 Touchpad"
+    assert device.event == 12
+    assert device.devnode == "/dev/input/event12"
+    assert device.sysfs_path == os.path.realpath(event_path)
+    assert device.i2c_bus == 1
+    assert device.i2c_client == "i2c-ASUE140D:00"
+
+
+def test_device_not_on_i2c(sysfs):
+    device = read_input_device(sysfs(USB_DEVICE, 3, "Logitech USB Receiver"))
+
+    assert device.i2c_bus is None
+    assert device.i2c_client is None
+
+
+def test_only_event_nodes_are_read_sorted_by_number(sysfs):
+    sysfs(USB_DEVICE, 10, "Logitech USB Receiver")
+    sysfs(I2C_DEVICE, 2, "ASUE140D:00 04F3:31B9 Touchpad")
+
+    assert [device.event for device in read_input_devices(sysfs.class_input)] == [2, 10]
+
+
+@pytest.mark.parametrize("name", [
+    "ASUE140D:00 04F3:31B9 Touchpad",
+    "ASUF1416:00 2808:0108 Touchpad",
+    "ASUP1205:00 093A:2003 Touchpad",
+])
+def test_asus_touchpad_on_i2c_is_found(sysfs, name):
+    sysfs(I2C_DEVICE, 12, name)
+
+    assert [device.name for device in find_touchpads(read_input_devices(sysfs.class_input))] == [name]
+
+
+@pytest.mark.parametrize("name", [
+    # other vendors
+    "SYNA7DB5:01 06CB:CD41 Touchpad",
+    "MSFT0001:00 04F3:3140 Touchpad",
+    # the touchpad mouse, not the touchpad
+    "ASUE140D:00 04F3:31B9 Mouse",
+    "ASUE1409:00 9009:0001 Touchpad",
+])
+def test_other_devices_are_not_touchpads(sysfs, name):
+    sysfs(I2C_DEVICE, 12, name)
+
+    assert find_touchpads(read_input_devices(sysfs.class_input)) == []
+
+
+def test_touchpad_not_on_i2c_is_not_found(sysfs):
+    sysfs(USB_DEVICE, 12, "ASUE140D:00 04F3:31B9 Touchpad")
+
+    assert find_touchpads(read_input_devices(sysfs.class_input)) == []
+
+
+def test_keyboard_is_found(sysfs):
+    sysfs(I2C_DEVICE, 12, "ASUE140D:00 04F3:31B9 Touchpad")
+    sysfs("devices/platform/i8042/serio0", 3, "AT Translated Set 2 keyboard")
+
+    assert find_keyboard(read_input_devices(sysfs.class_input)).event == 3
+
+
+def uevent(action, devpath, subsystem="input"):
+    fields = ["ACTION=" + action, "DEVPATH=" + devpath, "SUBSYSTEM=" + subsystem, "SEQNUM=4711"]
+    return "{}@{}".format(action, devpath).encode() + b"\0" + b"\0".join(field.encode() for field in fields) + b"\0"
+
+
+def test_parse_uevent():
+    devpath = "/" + I2C_DEVICE + "/input/input12/event12"
+
+    assert parse_uevent(uevent("add", devpath)) == {
+        "ACTION": "add", "DEVPATH": devpath, "SUBSYSTEM": "input", "SEQNUM": "4711"
+    }
+
+
+def test_added_event_node_is_read_from_sysfs(monkeypatch):
+    read = []
+    monkeypatch.setattr(discovery, "read_input_device", lambda path: read.append(path) or "device")
+    devpath = "/" + I2C_DEVICE + "/input/input12/event12"
+
+    assert uevent_input_device(parse_uevent(uevent("add", devpath))) == "device"
+    assert read == ["/sys" + devpath]
+
+
+def test_removed_event_node_is_gone():
+    # sysfs of a removed device does not exist anymore
+    devpath = "/devices/virtual/removed/input/input99/event99"
+
+    assert uevent_input_device(parse_uevent(uevent("remove", devpath))) is None
+
+
+@pytest.mark.parametrize("devpath, subsystem", [
+    ("/" + I2C_DEVICE + "/input/input12", "input"),
+    ("/" + I2C_DEVICE + "/hidraw/hidraw0", "hidraw"),
+])
+def test_uevents_of_other_devices_are_ignored(monkeypatch, devpath, subsystem):
+    monkeypatch.setattr(discovery, "read_input_device", lambda path: pytest.fail("read " + path))
+
+    assert uevent_input_device(parse_uevent(uevent("add", devpath, subsystem))) is None
@@ -0,0 +1,147 @@
+import logging
+from typing import NamedTuple
+
+import pytest
+
+from dispatch import ShortcutDispatcher
+from latency import STAGE_FOCUS_RESOLUTION
+
+
+class Key(NamedTuple):
+    name: str
+
+
+KEY_MUTE = Key("KEY_MUTE")
+KEY_VOLUMEUP = Key("KEY_VOLUMEUP")
+KEY_VOLUMEDOWN = Key("KEY_VOLUMEDOWN")
+KEY_NEXTSONG = Key("KEY_NEXTSONG")
+KEY_LEFTSHIFT = Key("KEY_LEFTSHIFT")
+KEY_LEFTCTRL = Key("KEY_LEFTCTRL")
+
+APP_SHORTCUTS = {
+    "none": {
+        "center": [
+            {"key": KEY_MUTE, "trigger": "release", "duration": 1},
+            {"key": KEY_MUTE, "trigger": "release", "modifier": KEY_LEFTSHIFT},
+        ],
+        "clockwise": [
+            {"key": KEY_VOLUMEUP, "trigger": "immediate"},
+            {"key": KEY_NEXTSONG, "trigger": "immediate", "modifier": KEY_LEFTSHIFT},
+        ],
+        "counterclockwise": {"key": KEY_VOLUMEDOWN, "trigger": "immediate"},
+    },
+    "firefox": {
+        "clockwise": [{"text": "→ ", "trigger": "immediate"}],
+    },
+}
+
+
+class Latency:
+
+    def __init__(self):
+        self.observed = []
+
+    def observe(self, stage, value):
+        self.observed.append(stage)
+
+
+class Desktop:
+    """
+    Focused window, keys and texts sent.
+    """
+
+    def __init__(self, title=None, send_text=True):
+        self.title = title
+        self.sent = []
+        self.latency = Latency()
+        self.dispatcher = ShortcutDispatcher(
+            APP_SHORTCUTS, lambda: self.title, self.send_key, self.latency, self.send_text if send_text else None
+        )
+
+    def send_key(self, key, press):
+        self.sent.append((key.name, press))
+
+    def send_text(self, text):
+        self.sent.append(("text", text))
+
+    def dispatch(self, touch_input, pressed, modifiers=(), duration_held=0):
+        self.dispatcher.dispatch(touch_input, pressed, set(modifiers), duration_held)
+        sent, self.sent = self.sent, []
+        return sent
+
+
+def test_immediate_shortcut_is_sent_on_press():
+    desktop = Desktop()
+
+    assert desktop.dispatch("clockwise", True) == [("KEY_VOLUMEUP", True), ("KEY_VOLUMEUP", False)]
+    assert desktop.dispatch("clockwise", False) == []
+    assert desktop.latency.observed == [STAGE_FOCUS_RESOLUTION, STAGE_FOCUS_RESOLUTION]
+
+
+def test_single_shortcut_without_list():
+    assert Desktop().dispatch("counterclockwise", True) == [("KEY_VOLUMEDOWN", True), ("KEY_VOLUMEDOWN", False)]
+
+
+def test_shortcut_with_held_modifier_wins():
+    desktop = Desktop()
+
+    assert desktop.dispatch("clockwise", True, [KEY_LEFTSHIFT]) == [("KEY_NEXTSONG", True), ("KEY_NEXTSONG", False)]
+    # no shortcut for the modifier held
+    assert desktop.dispatch("clockwise", True, [KEY_LEFTCTRL]) == []
+
+
+@pytest.mark.parametrize("duration_held, sent", [
+    (0.5, []),
+    (1.5, [("KEY_MUTE", True), ("KEY_MUTE", False)]),
+])
+def test_release_shortcut_needs_its_duration(duration_held, sent):
+    desktop = Desktop()
+
+    assert desktop.dispatch("center", True, duration_held=0) == []
+    assert desktop.dispatch("center", False, duration_held=duration_held) == sent
+
+
+def test_release_shortcut_with_modifier_ignores_duration():
+    assert Desktop().dispatch("center", False, [KEY_LEFTSHIFT]) == [("KEY_MUTE", True), ("KEY_MUTE", False)]
+
+
+@pytest.mark.parametrize("title, sent", [
+    ("Mozilla Firefox", [("text", "→ ")]),
+    ("FIREFOX Developer Edition", [("text", "→ ")]),
+    ("Terminal", [("KEY_VOLUMEUP", True), ("KEY_VOLUMEUP", False)]),
+    (None, [("KEY_VOLUMEUP", True), ("KEY_VOLUMEUP", False)]),
+])
+def test_shortcuts_of_the_focused_application(title, sent):
+    assert Desktop(title).dispatch("clockwise", True) == sent
+
+
+def test_gesture_without_shortcut_in_application():
+    assert Desktop("Mozilla Firefox").dispatch("center", False, duration_held=2) == []
+
+
+def test_text_without_text_sink_is_not_sent():
+    assert Desktop("Mozilla Firefox", send_text=False).dispatch("clockwise", True) == []
+
+
+def test_one_info_record_per_executed_shortcut(caplog):
+    desktop = Desktop("Terminal")
+
+    with caplog.at_level(logging.INFO, logger="asus-dialpad-driver"):
+        desktop.dispatcher.dispatch("clockwise", True, {KEY_LEFTSHIFT}, 0.25, latency=0.004)
+        # released, nothing executed
+        desktop.dispatcher.dispatch("clockwise", False, set(), 0.25)
+
+    assert len(caplog.records) == 1
+    record = caplog.records[0]
+    assert record.levelno == logging.INFO
+    assert (record.GESTURE, record.APP, record.KEY, record.MODIFIER, record.DURATION_HELD) == (
+        "clockwise", "none", "KEY_NEXTSONG", "KEY_LEFTSHIFT", 0.25
+    )
+    assert record.LATENCY_MS == pytest.approx(4)
+
+
+def test_shortcut_held_too_short_is_logged_at_debug_only(caplog):
+    with caplog.at_level(logging.INFO, logger="asus-dialpad-driver"):
+        Desktop().dispatch("center", False, duration_held=0.5)
+
+    assert caplog.records == []
@@ -0,0 +1,173 @@
+import math
+import select
+from types import SimpleNamespace
+
+import pytest
+
+from discovery import InputDevice
+from engine import DialPadEngine
+from evdev_reader import ABS_MT_POSITION_X, ABS_MT_POSITION_Y, ABS_MT_SLOT, ABS_MT_TOOL_TYPE, ABS_MT_TRACKING_ID, EV_ABS
+from hal import FakeDialPadController, FakeTouchpadSource
+
+LAYOUT = SimpleNamespace(
+    circle_diameter=1400,
+    center_button_diameter=250,
+    circle_center_x=770,
+    circle_center_y=750,
+    top_right_icon_width=250,
+    top_right_icon_height=250,
+)
+FRAME_INTERVAL = 0.007
+
+
+class Driver:
+    """
+    Engine on the fakes with the callbacks recorded.
+    """
+
+    def __init__(self, enabled=True):
+        self.gestures = []
+        self.send_events = []
+        self.dropped = []
+        self.enabled = enabled
+        self.source = FakeTouchpadSource(num_slots=2)
+        self.controller = FakeDialPadController()
+        self.engine = DialPadEngine(
+            InputDevice("ASUE1416:00 04F3:3227 Touchpad", 7, "/dev/input/event7", "", 1, "i2c-ASUE1416:00"),
+            LAYOUT,
+            on_gesture=lambda engine, name, pressed, duration_held: self.gestures.append((engine, name, pressed)),
+            on_icon=lambda engine: None,
+            on_touchpad_send_events=lambda engine, enabled: self.send_events.append(enabled),
+            on_events_dropped=lambda engine, events_count: self.dropped.append(events_count),
+            is_enabled=lambda: self.enabled,
+            controller=self.controller,
+            source=self.source
+        )
+        self.timestamp = 0
+
+    def push(self, *events):
+        self.timestamp += FRAME_INTERVAL
+        self.source.push(self.timestamp, list(events))
+
+    def push_turn(self, start, end, step=3):
+        for angle in range(start, end, step):
+            self.push(*on_dial(angle))
+
+    def steps(self):
+        return [name for engine, name, pressed in self.gestures if pressed and name != "center"]
+
+    def readable(self):
+        return bool(select.select([self.engine], [], [], 0)[0])
+
+
+def on_dial(angle, radius=500):
+    return [
+        (EV_ABS, ABS_MT_POSITION_X, int(770 + radius * math.cos(math.radians(angle)))),
+        (EV_ABS, ABS_MT_POSITION_Y, int(750 + radius * math.sin(math.radians(angle)))),
+    ]
+
+
+@pytest.fixture
+def driver():
+    driver = Driver()
+    driver.engine.open()
+    yield driver
+    driver.engine.close()
+
+
+def test_frames_are_handled_when_the_source_is_readable(driver):
+    assert not driver.readable()
+
+    driver.push((EV_ABS, ABS_MT_TRACKING_ID, 1), *on_dial(45))
+    driver.push_turn(45, 45 + 360 + 30)
+    assert driver.readable()
+
+    assert driver.engine.process() == 1 + len(range(45, 45 + 360 + 30, 3))
+    assert not driver.readable()
+    assert driver.steps() == ["clockwise"] * 4
+    # engine is passed to the callbacks
+    assert all(engine is driver.engine for engine, name, pressed in driver.gestures)
+    assert driver.send_events == [False]
+
+
+def test_disabled_dialpad_sends_nothing(driver):
+    driver.enabled = False
+    driver.push((EV_ABS, ABS_MT_TRACKING_ID, 1), *on_dial(45))
+    driver.push_turn(45, 400)
+    driver.engine.process()
+
+    assert driver.gestures == []
+    assert driver.send_events == []
+
+
+def test_contacts_on_the_touchpad_at_open_are_resynced():
+    driver = Driver()
+    driver.source.state = (0, {
+        ABS_MT_TRACKING_ID: [3, -1],
+        ABS_MT_POSITION_X: [1270, 0],
+        ABS_MT_POSITION_Y: [760, 0],
+        ABS_MT_TOOL_TYPE: [0, 0],
+    })
+    driver.engine.open()
+
+    assert driver.engine.gesture.slot_tracking_ids[0] == 3
+    # the contact was already down, it does not own the dial
+    assert not driver.engine.gesture.finger_detected
+    driver.engine.close()
+
+
+def test_events_dropped_resync_and_continue(driver):
+    driver.push((EV_ABS, ABS_MT_TRACKING_ID, 1), *on_dial(45))
+    driver.push_turn(45, 80)
+    # lost events: the finger moved on and is still down
+    driver.source.drop(0, {
+        ABS_MT_TRACKING_ID: [1, -1],
+        ABS_MT_POSITION_X: [770, 0],
+        ABS_MT_POSITION_Y: [1250, 0],
+        ABS_MT_TOOL_TYPE: [0, 0],
+    })
+    driver.push_turn(90, 200)
+
+    # everything queued is handled by one process()
+    driver.engine.process()
+
+    assert len(driver.dropped) == 1
+    assert driver.engine.gesture.owner == 0
+    assert driver.steps() == ["clockwise"]
+
+
+def test_events_dropped_after_the_finger_was_lifted_cancel_the_touch(driver):
+    driver.push((EV_ABS, ABS_MT_TRACKING_ID, 1), (EV_ABS, ABS_MT_POSITION_X, 770), (EV_ABS, ABS_MT_POSITION_Y, 750))
+    driver.source.drop(0, {ABS_MT_TRACKING_ID: [-1, -1]})
+    driver.engine.process()
+
+    # center pressed, never released because the release was lost
+    assert [(name, pressed) for engine, name, pressed in driver.gestures] == [("center", True)]
+    assert not driver.engine.gesture.finger_detected
+    assert driver.send_events == [False, True]
+
+
+def test_second_slot_is_ignored(driver):
+    driver.push((EV_ABS, ABS_MT_TRACKING_ID, 1), *on_dial(45))
+    driver.push((EV_ABS, ABS_MT_SLOT, 1), (EV_ABS, ABS_MT_TRACKING_ID, 2), *on_dial(200))
+    driver.push_turn(200, 560)
+    driver.engine.process()
+
+    assert driver.steps() == []
+
+
+def test_controller_and_config(driver):
+    assert driver.engine.check_i2c()
+    driver.engine.activate()
+    driver.engine.deactivate()
+    assert driver.controller.commands == ["activate", "deactivate"]
+
+    driver.engine.set_config(8, 2)
+    assert (driver.engine.gesture.slices_count, driver.engine.gesture.activation_time) == (8, 2)
+
+
+def test_unavailable_controller():
+    driver = Driver()
+    driver.controller.available = False
+
+    assert not driver.engine.check_i2c()
@@ -0,0 +1,135 @@
+import os
+import struct
+
+import pytest
+
+from evdev_reader import (
+    ABS_MT_POSITION_X, ABS_MT_POSITION_Y, EV_ABS, EV_SYN, INPUT_EVENT_FORMAT, SYN_DROPPED, SYN_REPORT, EventReader,
+    EventsDroppedError
+)
+
+
+def event(type_, code, value, timestamp=0.0):
+    sec = int(timestamp)
+    return struct.pack(INPUT_EVENT_FORMAT, sec, round((timestamp - sec) * 1000000), type_, code, value)
+
+
+def report(timestamp):
+    return event(EV_SYN, SYN_REPORT, 0, timestamp)
+
+
+def dropped():
+    return event(EV_SYN, SYN_DROPPED, 0)
+
+
+def position(x, y):
+    return event(EV_ABS, ABS_MT_POSITION_X, x) + event(EV_ABS, ABS_MT_POSITION_Y, y)
+
+
+@pytest.fixture
+def pipe():
+    read_fd, write_fd = os.pipe()
+    yield read_fd, write_fd
+    os.close(read_fd)
+    os.close(write_fd)
+
+
+def test_frames_are_split_by_syn_report(pipe):
+    read_fd, write_fd = pipe
+    reader = EventReader(read_fd)
+
+    os.write(write_fd, position(1, 2) + report(1.5) + position(3, 4) + report(2.25))
+    frames, was_dropped = reader.read_frames()
+
+    assert not was_dropped
+    assert frames == [
+        (1.5, [(EV_ABS, ABS_MT_POSITION_X, 1), (EV_ABS, ABS_MT_POSITION_Y, 2)]),
+        (2.25, [(EV_ABS, ABS_MT_POSITION_X, 3), (EV_ABS, ABS_MT_POSITION_Y, 4)]),
+    ]
+    assert reader.frames_count == 2
+
+
+def test_unfinished_frame_is_kept_for_next_read(pipe):
+    read_fd, write_fd = pipe
+    reader = EventReader(read_fd)
+
+    os.write(write_fd, position(1, 2))
+    assert reader.read_frames() == ([], False)
+
+    os.write(write_fd, event(EV_ABS, ABS_MT_POSITION_X, 5) + report(1))
+    frames, was_dropped = reader.read_frames()
+
+    assert frames == [(1, [(EV_ABS, ABS_MT_POSITION_X, 1), (EV_ABS, ABS_MT_POSITION_Y, 2), (EV_ABS, ABS_MT_POSITION_X, 5)])]
+
+
+def test_syn_dropped_splits_and_skips_to_next_report(pipe):
+    read_fd, write_fd = pipe
+    reader = EventReader(read_fd)
+
+    os.write(write_fd, position(1, 1) + report(1) + position(2, 2) + dropped() + position(3, 3) + report(2) + position(4, 4) + report(3))
+
+    # frames before SYN_DROPPED, the rest stays in the buffer
+    frames, was_dropped = reader.read_frames()
+    assert was_dropped
+    assert [timestamp for timestamp, events in frames] == [1]
+    assert reader.unsplit
+
+    # split again without reading, the events up to the next SYN_REPORT are invalid
+    frames, was_dropped = reader.read_frames()
+    assert not was_dropped
+    assert frames == [(3, [(EV_ABS, ABS_MT_POSITION_X, 4), (EV_ABS, ABS_MT_POSITION_Y, 4)])]
+    assert not reader.unsplit
+
+
+def test_dropping_continues_across_reads(pipe):
+    read_fd, write_fd = pipe
+    reader = EventReader(read_fd)
+
+    os.write(write_fd, dropped() + position(1, 1))
+    assert reader.read_frames() == ([], True)
+    assert reader.unsplit
+    assert reader.read_frames() == ([], False)
+    assert reader.pending == 0
+
+    os.write(write_fd, position(2, 2) + report(1) + position(3, 3) + report(2))
+    assert reader.read_frames() == ([(2, [(EV_ABS, ABS_MT_POSITION_X, 3), (EV_ABS, ABS_MT_POSITION_Y, 3)])], False)
+
+
+def test_oversize_frame_is_handed_over(pipe):
+    read_fd, write_fd = pipe
+    reader = EventReader(read_fd, capacity=4)
+
+    os.write(write_fd, position(1, 1) + position(2, 2))
+    frames, was_dropped = reader.read_frames()
+
+    assert len(frames) == 1
+    assert len(frames[0][1]) == 4
+    assert reader.pending == 0
+
+
+def test_oversize_frame_being_dropped_is_discarded(pipe):
+    read_fd, write_fd = pipe
+    reader = EventReader(read_fd, capacity=4)
+
+    os.write(write_fd, dropped())
+    assert reader.read_frames() == ([], True)
+
+    # the rest of the invalid frame fills the whole buffer
+    os.write(write_fd, position(1, 1) + position(2, 2))
+    assert reader.read_frames() == ([], False)
+    assert reader.pending == 0
+
+    os.write(write_fd, report(1) + position(3, 3) + report(2))
+    assert reader.read_frames() == ([(2, [(EV_ABS, ABS_MT_POSITION_X, 3), (EV_ABS, ABS_MT_POSITION_Y, 3)])], False)
+
+
+def test_frames_raises_after_dropped_frames(pipe):
+    read_fd, write_fd = pipe
+    reader = EventReader(read_fd)
+
+    os.write(write_fd, position(1, 1) + report(1) + dropped())
+    frames = reader.frames()
+
+    assert next(frames)[0] == 1
+    with pytest.raises(EventsDroppedError):
+        next(frames)
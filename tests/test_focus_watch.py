@@ -0,0 +1,76 @@
+import pytest
+
+import desktop
+import focus_watch
+from focus_watch import FocusWatcher
+
+
+def test_only_changes_are_reported():
+    titles = []
+    watcher = FocusWatcher(titles.append)
+
+    for title in ["Firefox", "Firefox", None, None, "Terminal", "Firefox"]:
+        watcher.changed(title)
+
+    assert titles == ["Firefox", None, "Terminal", "Firefox"]
+
+
+def test_failing_receiver_does_not_end_the_watching():
+    titles = []
+
+    def on_change(title):
+        titles.append(title)
+        raise RuntimeError("receiver failed")
+
+    watcher = FocusWatcher(on_change)
+    watcher.changed("Firefox")
+    watcher.changed("Terminal")
+
+    assert titles == ["Firefox", "Terminal"]
+
+
+def test_polling_when_the_session_reports_no_changes(monkeypatch):
+    looked_up = iter(["Firefox", "Firefox", "Terminal"])
+    sleeps = []
+    monkeypatch.setattr(desktop, "xdg_session_type", "wayland")
+    monkeypatch.setenv("XDG_CURRENT_DESKTOP", "GNOME")
+    monkeypatch.setattr(desktop, "get_active_window_title", lambda: next(looked_up))
+    monkeypatch.setattr(focus_watch, "sleep", sleeps.append)
+
+    titles = []
+    FocusWatcher(titles.append).run(lambda: len(sleeps) == 3)
+
+    assert titles == ["Firefox", "Terminal"]
+    assert sleeps == [focus_watch.FOCUS_POLL_INTERVAL] * 3
+
+
+def test_polling_when_the_events_are_not_available(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(desktop, "xdg_session_type", "x11")
+    monkeypatch.setattr(desktop, "get_active_window_title", lambda: "Firefox")
+    monkeypatch.setattr(focus_watch, "sleep", sleeps.append)
+
+    def run_x11(self, is_stopped):
+        raise OSError("no display")
+
+    monkeypatch.setattr(FocusWatcher, "run_x11", run_x11)
+
+    titles = []
+    FocusWatcher(titles.append).run(lambda: len(sleeps) == 1)
+
+    assert titles == ["Firefox"]
+
+
+def test_kwin_script_left_to_the_agent(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(desktop, "xdg_session_type", "wayland")
+    monkeypatch.setenv("XDG_CURRENT_DESKTOP", "KDE")
+    monkeypatch.setattr(desktop, "get_active_window_title", lambda: "Dolphin")
+    monkeypatch.setattr(focus_watch, "sleep", sleeps.append)
+    monkeypatch.setattr(FocusWatcher, "run_kwin", lambda self, is_stopped: pytest.fail("KWin script loaded"))
+
+    titles = []
+    FocusWatcher(titles.append, poll_interval=0.5, kwin_script=False).run(lambda: len(sleeps) == 1)
+
+    assert titles == ["Dolphin"]
+    assert sleeps == [0.5]
@@ -0,0 +1,271 @@
+import math
+from types import SimpleNamespace
+
+import pytest
+
+from evdev_reader import ABS_MT_POSITION_X, ABS_MT_POSITION_Y, ABS_MT_SLOT, ABS_MT_TOOL_TYPE, ABS_MT_TRACKING_ID, EV_ABS, MT_TOOL_PALM
+from gesture import NO_SLOT, DialGesture
+
+FRAME_INTERVAL = 0.007
+MAX_X = 3946
+CENTER_X = 770
+CENTER_Y = 750
+
+
+def make_layout(**values):
+    layout = dict(
+        circle_diameter=1400,
+        center_button_diameter=250,
+        circle_center_x=CENTER_X,
+        circle_center_y=CENTER_Y,
+        top_right_icon_width=250,
+        top_right_icon_height=250,
+    )
+    layout.update(values)
+    return SimpleNamespace(**layout)
+
+
+class Recorder:
+
+    def __init__(self, layout=None, num_slots=5):
+        self.gestures = []
+        self.send_events = []
+        self.icons = 0
+        self.gesture = DialGesture(
+            layout or make_layout(), MAX_X, self.on_gesture, self.on_icon, self.send_events.append, lambda: True, num_slots=num_slots
+        )
+        self.timestamp = 0
+
+    def on_gesture(self, name, pressed, duration_held):
+        self.gestures.append((name, pressed))
+
+    def on_icon(self):
+        self.icons += 1
+
+    def frame(self, *events):
+        self.timestamp += FRAME_INTERVAL
+        self.gesture.process_frame(self.timestamp, list(events))
+
+    def steps(self, name):
+        return self.gestures.count((name, True))
+
+
+def position(x, y):
+    return [(EV_ABS, ABS_MT_POSITION_X, int(x)), (EV_ABS, ABS_MT_POSITION_Y, int(y))]
+
+
+def dial_point(angle, radius=500):
+    return CENTER_X + radius * math.cos(math.radians(angle)), CENTER_Y + radius * math.sin(math.radians(angle))
+
+
+def on_dial(angle, radius=500):
+    return position(*dial_point(angle, radius))
+
+
+def touch(slot, tracking_id, x, y, palm=False):
+    events = [(EV_ABS, ABS_MT_SLOT, slot), (EV_ABS, ABS_MT_TRACKING_ID, tracking_id)]
+    if palm:
+        events.append((EV_ABS, ABS_MT_TOOL_TYPE, MT_TOOL_PALM))
+    return events + position(x, y)
+
+
+def lift(slot):
+    return [(EV_ABS, ABS_MT_SLOT, slot), (EV_ABS, ABS_MT_TRACKING_ID, -1)]
+
+
+def test_full_turn_sends_a_step_per_slice():
+    recorder = Recorder()
+    recorder.frame((EV_ABS, ABS_MT_TRACKING_ID, 1), *on_dial(45))
+
+    for angle in range(45, 45 + 360 + 30, 3):
+        recorder.frame(*on_dial(angle))
+
+    assert recorder.steps("clockwise") == 4
+    assert recorder.steps("counterclockwise") == 0
+    # tap-to-click is disabled while the dial is touched
+    assert recorder.send_events == [False]
+
+    recorder.frame((EV_ABS, ABS_MT_TRACKING_ID, -1))
+    assert recorder.send_events == [False, True]
+
+
+def test_turn_back_sends_counterclockwise_steps():
+    recorder = Recorder()
+    recorder.frame((EV_ABS, ABS_MT_TRACKING_ID, 1), *on_dial(315))
+
+    for angle in range(315, 315 - 200, -3):
+        recorder.frame(*on_dial(angle))
+
+    assert recorder.steps("counterclockwise") == 2
+    assert recorder.steps("clockwise") == 0
+
+
+def jitter_on_boundary(layout, frames_count=500):
+    recorder = Recorder(layout)
+    recorder.frame((EV_ABS, ABS_MT_TRACKING_ID, 1), *on_dial(88))
+
+    for i in range(frames_count):
+        recorder.frame(*on_dial(90 + (2 if i % 2 else -2)))
+
+    return recorder.steps("clockwise") + recorder.steps("counterclockwise")
+
+
+def test_jitter_on_slice_boundary_sends_no_steps():
+    assert jitter_on_boundary(make_layout()) == 0
+
+
+def test_hysteresis_alone_filters_jitter_on_slice_boundary():
+    assert jitter_on_boundary(make_layout(dial_smoothing=1)) == 0
+
+
+def test_jitter_on_slice_boundary_flaps_without_filter():
+    assert jitter_on_boundary(make_layout(dial_smoothing=1, dial_hysteresis=0)) > 200
+
+
+def test_center_button_press_and_release():
+    recorder = Recorder()
+    recorder.frame((EV_ABS, ABS_MT_TRACKING_ID, 1), *position(CENTER_X, CENTER_Y))
+    recorder.frame(*position(CENTER_X + 10, CENTER_Y))
+    recorder.frame((EV_ABS, ABS_MT_TRACKING_ID, -1))
+
+    assert recorder.gestures == [("center", True), ("center", False)]
+
+
+def test_resting_palm_never_owns_the_dial():
+    recorder = Recorder()
+    recorder.frame(*touch(1, 10, CENTER_X + 300, CENTER_Y, palm=True))
+    assert not recorder.gesture.finger_detected
+
+    # palm moving around the dial does nothing
+    for angle in range(0, 360, 10):
+        recorder.frame(*on_dial(angle, radius=300))
+    assert recorder.gestures == []
+
+    recorder.frame(*touch(0, 11, *dial_point(45)))
+    assert recorder.gesture.owner == 0
+
+
+def test_second_contact_does_not_move_the_dial():
+    recorder = Recorder()
+    recorder.frame(*touch(0, 1, CENTER_X + 500, CENTER_Y + 10))
+    assert recorder.gesture.owner == 0
+
+    # second finger circles the dial while the owner rests
+    recorder.frame(*touch(1, 2, CENTER_X, CENTER_Y - 500))
+    for angle in range(270, 270 + 360, 5):
+        recorder.frame(*on_dial(angle))
+    assert recorder.steps("clockwise") == 0
+    assert recorder.gesture.owner == 0
+
+
+def test_contact_already_down_takes_over_when_the_owner_is_lifted():
+    recorder = Recorder()
+    recorder.frame(*touch(0, 1, CENTER_X + 500, CENTER_Y + 10))
+    recorder.frame(*touch(1, 2, *dial_point(45)))
+
+    recorder.frame(*lift(0))
+    assert recorder.gesture.owner == 1
+
+    recorder.frame((EV_ABS, ABS_MT_SLOT, 1), *on_dial(45))
+    for angle in range(45, 45 + 360, 5):
+        recorder.frame(*on_dial(angle))
+    assert recorder.steps("clockwise") == 4
+    assert recorder.steps("counterclockwise") == 0
+
+
+def test_contact_outside_the_dial_does_not_take_over_when_the_owner_is_lifted():
+    recorder = Recorder()
+    recorder.frame(*touch(0, 1, CENTER_X + 500, CENTER_Y + 10))
+    recorder.frame(*touch(1, 2, 3000, 1800))
+
+    recorder.frame(*lift(0))
+    assert recorder.gesture.owner == NO_SLOT
+
+
+def test_contact_outside_the_dial_does_not_own_it():
+    recorder = Recorder()
+    recorder.frame(*touch(0, 1, 3000, 1800))
+    assert not recorder.gesture.finger_detected
+
+
+def test_contact_sliding_into_the_dial_owns_it():
+    recorder = Recorder()
+    recorder.frame(*touch(0, 1, CENTER_X + 1000, CENTER_Y))
+    assert not recorder.gesture.finger_detected
+
+    recorder.frame(*position(CENTER_X + 500, CENTER_Y + 10))
+    assert recorder.gesture.owner == 0
+
+    for angle in range(0, 360, 5):
+        recorder.frame(*on_dial(angle))
+    assert recorder.steps("clockwise") == 3
+
+
+def test_slot_out_of_range_is_ignored_until_a_tracked_slot_is_selected():
+    recorder = Recorder(num_slots=2)
+    recorder.frame(*touch(0, 1, CENTER_X + 500, CENTER_Y + 10))
+
+    # contact of slot 7 must not overwrite slot 0 nor lift its finger
+    recorder.frame(*touch(7, 20, 3000, 1800), (EV_ABS, ABS_MT_TRACKING_ID, -1))
+    assert recorder.gesture.slot == NO_SLOT
+    assert recorder.gesture.owner == 0
+    assert (recorder.gesture.slot_x[0], recorder.gesture.slot_y[0]) == (CENTER_X + 500, CENTER_Y + 10)
+    assert list(recorder.gesture.slot_tracking_ids) == [1, -1]
+
+    # still the untracked slot in the next frame
+    recorder.frame(*position(10, 10))
+    assert (recorder.gesture.slot_x[0], recorder.gesture.slot_y[0]) == (CENTER_X + 500, CENTER_Y + 10)
+
+    recorder.frame((EV_ABS, ABS_MT_SLOT, 0), *position(CENTER_X + 400, CENTER_Y))
+    assert recorder.gesture.slot_x[0] == CENTER_X + 400
+
+
+def slot_values(tracking_ids, x, y):
+    return {
+        ABS_MT_TRACKING_ID: tracking_ids,
+        ABS_MT_POSITION_X: x,
+        ABS_MT_POSITION_Y: y,
+        ABS_MT_TOOL_TYPE: [0] * len(tracking_ids),
+    }
+
+
+def test_resync_continues_rotation_of_the_same_contact():
+    recorder = Recorder(num_slots=2)
+    recorder.frame(*touch(0, 1, *dial_point(45)))
+    for angle in range(45, 80, 3):
+        recorder.frame(*on_dial(angle))
+
+    x, y = dial_point(120)
+    recorder.gesture.resync(0, slot_values([1, -1], [int(x), 0], [int(y), 0]))
+    assert recorder.gesture.owner == 0
+    assert recorder.send_events == [False]
+
+    # rotation goes on from the current position, what happened in between is not sent
+    for angle in range(120, 200, 3):
+        recorder.frame(*on_dial(angle))
+    assert recorder.steps("clockwise") == 1
+
+    # center button is ignored until the contact is lifted
+    recorder.frame(*position(CENTER_X, CENTER_Y))
+    assert ("center", True) not in recorder.gestures
+
+
+@pytest.mark.parametrize("tracking_ids", [[-1, -1], [5, -1]])
+def test_resync_cancels_touch_of_a_lifted_contact(tracking_ids):
+    recorder = Recorder(num_slots=2)
+    recorder.frame(*touch(0, 1, CENTER_X, CENTER_Y))
+    assert recorder.gestures == [("center", True)]
+
+    recorder.gesture.resync(0, slot_values(tracking_ids, [CENTER_X, 0], [CENTER_Y, 0]))
+
+    # cancelled without a release, tap-to-click enabled again
+    assert recorder.gesture.owner == NO_SLOT
+    assert recorder.gestures == [("center", True)]
+    assert recorder.send_events == [False, True]
+
+
+def test_resync_of_slot_out_of_range():
+    recorder = Recorder(num_slots=2)
+    recorder.gesture.resync(9, slot_values([-1, -1], [0, 0], [0, 0]))
+
+    assert recorder.gesture.slot == NO_SLOT
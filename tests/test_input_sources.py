@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+
+import pytest
+
+from input_sources import InputSourcesWatcher, is_input_sources_change
+
+
+@pytest.mark.parametrize("prefix, changes", [
+    # gsettings set org.gnome.desktop.input-sources mru-sources ...
+    ("/org/gnome/desktop/input-sources/mru-sources", [""]),
+    ("/org/gnome/desktop/input-sources/", ["sources", "current"]),
+    ("/org/gnome/desktop/", ["input-sources/mru-sources", "interface/clock-format"]),
+    # dconf reset -f of a dir above
+    ("/org/gnome/", []),
+    ("/", [""]),
+])
+def test_input_sources_change(prefix, changes):
+    assert is_input_sources_change(prefix, changes)
+
+
+@pytest.mark.parametrize("prefix, changes", [
+    ("/org/gnome/desktop/interface/clock-format", [""]),
+    ("/org/gnome/desktop/", ["interface/clock-format", "wm/preferences/"]),
+    ("/org/gnome/desktop/input-sources-other/", ["sources"]),
+    ("/org/gnome/shell/", []),
+])
+def test_unrelated_change(prefix, changes):
+    assert not is_input_sources_change(prefix, changes)
+
+
+def test_dconf_notify_of_the_input_sources_calls_on_change():
+    changes = []
+    watcher = InputSourcesWatcher(lambda: changes.append(True), database_path="/nonexistent/dconf/user")
+
+    watcher.on_dconf_notify(None, None, None, "Notify", ("/org/gnome/desktop/input-sources/", ["mru-sources"], ""))
+    watcher.on_dconf_notify(None, None, None, "Notify", ("/org/gnome/desktop/interface/", ["clock-format"], ""))
+
+    assert changes == [True]
+
+
+def test_database_event_of_other_file_is_ignored(tmp_path):
+    changes = []
+    watcher = InputSourcesWatcher(lambda: changes.append(True), database_path=str(tmp_path / "user"))
+
+    watcher.on_database_event(SimpleNamespace(pathname=str(tmp_path / "user.lock")))
+    watcher.on_database_event(SimpleNamespace(pathname=str(tmp_path / "user")))
+
+    assert changes == [True]
+
+
+def test_failing_update_does_not_end_the_watching():
+    def on_change():
+        raise RuntimeError("gsettings failed")
+
+    InputSourcesWatcher(on_change, database_path="/nonexistent/dconf/user").changed()
@@ -0,0 +1,79 @@
+import json
+import mmap
+
+from keymap_cache import CACHE_FILE_NAME, CACHE_MAX_ENTRIES, KeymapCache, cache_dir, digest
+
+
+def test_digest_depends_on_every_part():
+    assert digest("wayland", b"keymap", 0, ["a", "b"]) == digest("wayland", b"keymap", 0, ["a", "b"])
+    assert digest("wayland", b"keymap", 0, ["a", "b"]) != digest("wayland", b"keymap", 1, ["a", "b"])
+    assert digest("wayland", b"keymap", 0, ["a", "b"]) != digest("wayland", b"keymap", 0, ["a", "c"])
+    # parts are not just concatenated
+    assert digest("ab", "c") != digest("a", "bc")
+
+
+def test_digest_of_mapped_keymap(tmp_path):
+    path = tmp_path / "keymap"
+    path.write_bytes(b"xkb_keymap {};\0")
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, prot=mmap.PROT_READ) as data:
+        assert digest(data) == digest(b"xkb_keymap {};\0")
+
+
+def test_cache_dir_follows_xdg_cache_home(monkeypatch, tmp_path):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+
+    assert cache_dir() == str(tmp_path / "asus-dialpad-driver")
+    assert KeymapCache().path == str(tmp_path / "asus-dialpad-driver" / CACHE_FILE_NAME)
+
+
+def test_entries_survive_restart(tmp_path):
+    path = str(tmp_path / "cache" / CACHE_FILE_NAME)
+    mapping = {"a": "KEY_A", "A": ["KEY_LEFTSHIFT", "KEY_A"], "EuroSign": ""}
+
+    KeymapCache(path).set("key", mapping)
+
+    assert KeymapCache(path).get("key") == mapping
+    assert KeymapCache(path).get("other") is None
+
+
+def test_least_recently_set_entries_are_dropped(tmp_path):
+    path = str(tmp_path / CACHE_FILE_NAME)
+    cache = KeymapCache(path)
+
+    for i in range(CACHE_MAX_ENTRIES):
+        cache.set(str(i), {"a": "KEY_A"})
+    # set again, the most recently used now
+    cache.set("0", {"a": "KEY_Q"})
+    cache.set("new", {"a": "KEY_A"})
+
+    entries = KeymapCache(path).read()
+    assert len(entries) == CACHE_MAX_ENTRIES
+    assert "1" not in entries
+    assert entries["0"] == {"a": "KEY_Q"}
+    assert list(entries)[-1] == "new"
+
+
+def test_broken_cache_file_is_ignored(tmp_path):
+    path = tmp_path / CACHE_FILE_NAME
+
+    path.write_text("{not json")
+    assert KeymapCache(str(path)).get("key") is None
+
+    path.write_text(json.dumps(["not", "a", "dict"]))
+    cache = KeymapCache(str(path))
+    assert cache.get("key") is None
+
+    # replaced by the next write
+    cache.set("key", {"a": "KEY_A"})
+    assert KeymapCache(str(path)).get("key") == {"a": "KEY_A"}
+
+
+def test_cache_which_can_not_be_written_still_works(tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    cache = KeymapCache(str(blocker / CACHE_FILE_NAME))
+
+    cache.set("key", {"a": "KEY_A"})
+
+    assert cache.get("key") == {"a": "KEY_A"}
@@ -0,0 +1,78 @@
+import pytest
+
+xkb = pytest.importorskip("xkbcommon.xkb")
+
+from keymap_index import KeymapIndex  # noqa: E402
+
+# evdev key code + 8
+KEYCODE_A = 30 + 8
+KEYCODE_Y = 21 + 8
+KEYCODE_Z = 44 + 8
+
+KEYSYM_NAMES = ["a", "A", "z", "Z", "y", "1", "exclam", "space", "Return", "adiaeresis", "ssharp", "EuroSign"]
+
+
+@pytest.fixture(scope="module", params=[("us", ""), ("de", ""), ("us,de", ",")])
+def keymap(request):
+    layout, variant = request.param
+    return xkb.Context().keymap_new_from_names(layout=layout, variant=variant)
+
+
+def full_walk(keymap, keysym):
+    """
+    Every (keycode, layout, level, mod_mask) of keysym as the walk over the whole keymap finds them.
+    """
+    entries = []
+    for keycode in keymap:
+        for layout in range(keymap.num_layouts_for_key(keycode)):
+            for level in range(keymap.num_levels_for_key(keycode, layout)):
+                keysyms = keymap.key_get_syms_by_level(keycode, layout, level)
+                if len(keysyms) != 1 or keysyms[0] != keysym:
+                    continue
+                for mod_mask in keymap.key_get_mods_for_level(keycode, layout, level):
+                    entries.append((keycode, layout, level, mod_mask))
+
+    return entries
+
+
+@pytest.mark.parametrize("keysym_name", KEYSYM_NAMES)
+def test_lookup_matches_the_full_walk(keymap, keysym_name):
+    keysym = xkb.keysym_from_name(keysym_name)
+
+    assert list(KeymapIndex(keymap).lookup(keysym)) == full_walk(keymap, keysym)
+
+
+def test_unknown_keysym_is_not_found(keymap):
+    assert list(KeymapIndex(keymap).lookup(xkb.keysym_from_name("Hangul"))) == []
+
+
+def test_first_entry_of_a_layout():
+    keymap = xkb.Context().keymap_new_from_names(layout="us,de", variant=",")
+    index = KeymapIndex(keymap)
+
+    first = {}
+    for keycode, layout, level, mod_mask in index.lookup(xkb.keysym_from_name("z")):
+        first.setdefault(layout, keycode)
+
+    # z and y are swapped on the German layout
+    assert first == {0: KEYCODE_Z, 1: KEYCODE_Y}
+
+
+def test_shifted_keysym_needs_shift():
+    index = KeymapIndex(xkb.Context().keymap_new_from_names(layout="us", variant=""))
+
+    entries = index.lookup(xkb.keysym_from_name("A"))
+    assert {(keycode, layout, level) for keycode, layout, level, mod_mask in entries} == {(KEYCODE_A, 0, 1)}
+    assert ["Shift"] in [index.mod_names_for_mask(mod_mask) for keycode, layout, level, mod_mask in entries]
+
+    # cached by mask
+    mod_mask = entries[0][3]
+    assert index.mod_names_for_mask(mod_mask) is index.mod_names_for_mask(mod_mask)
+
+
+def test_modifier_keys():
+    index = KeymapIndex(xkb.Context().keymap_new_from_names(layout="us", variant=""))
+
+    assert index.modifier_keysym_name("Shift", lambda layout: True) in ("Shift_L", "Shift_R")
+    assert index.modifier_keysym_name("Control", lambda layout: True) in ("Control_L", "Control_R")
+    assert index.modifier_keysym_name("Shift", lambda layout: False) is None
@@ -0,0 +1,78 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from evdev_reader import EV_KEY, EV_SYN, SYN_REPORT
+from keysink import UinputKeySink, is_keyboard_key
+from macro import INPUT_EVENT, key_stroke
+
+KEY_VOLUMEUP = SimpleNamespace(value=115)
+
+
+def read_events(fd, size=65536):
+    data = os.read(fd, size)
+    return [event[2:] for event in INPUT_EVENT.iter_unpack(data)]
+
+
+@pytest.fixture
+def pipe():
+    read_fd, write_fd = os.pipe()
+    with open(write_fd, 'wb', buffering=0) as uinput_file:
+        yield read_fd, UinputKeySink(None, uinput_file)
+    os.close(read_fd)
+
+
+def test_send_key_writes_key_and_syn_report(pipe):
+    read_fd, sink = pipe
+
+    sink.send_key(KEY_VOLUMEUP, True)
+    sink.send_key(KEY_VOLUMEUP, False)
+
+    assert read_events(read_fd) == [
+        (EV_KEY, 115, 1), (EV_SYN, SYN_REPORT, 0),
+        (EV_KEY, 115, 0), (EV_SYN, SYN_REPORT, 0),
+    ]
+
+
+def test_send_buffer_writes_the_buffer(pipe):
+    read_fd, sink = pipe
+    buffer = INPUT_EVENT.pack(0, 0, EV_KEY, 30, 1) + INPUT_EVENT.pack(0, 0, EV_SYN, SYN_REPORT, 0)
+
+    sink.send_buffer(buffer)
+
+    assert os.read(read_fd, 4096) == buffer
+
+
+def test_long_buffer_is_sent_by_one_write(pipe, monkeypatch):
+    read_fd, sink = pipe
+    writes = []
+    write = os.write
+    monkeypatch.setattr(os, "write", lambda fd, data: writes.append(data) or write(fd, data))
+    buffer = key_stroke([29, 42, 22]) + key_stroke([18]) * 20
+
+    sink.send_buffer(buffer)
+
+    assert writes == [buffer]
+    assert os.read(read_fd, 65536) == buffer
+
+
+@pytest.mark.parametrize("code, provisioned", [
+    (1, True),  # KEY_ESC
+    (115, True),  # KEY_VOLUMEUP
+    (0xff, True),
+    (0x100, False),  # BTN_MISC
+    (0x110, False),  # BTN_LEFT
+    (0x14a, False),  # BTN_TOUCH
+    (0x160, True),  # KEY_OK
+    (0x1d2, True),  # KEY_FN_F
+    (0x220, False),  # BTN_DPAD_UP
+    (0x224, True),  # KEY_CAMERA_ACCESS_ENABLE
+    (0x2c0, False),  # BTN_TRIGGER_HAPPY1
+    (0x2e8, True),
+    (0x2ff, True),  # KEY_MAX
+    (0x300, False),
+    (0, False),  # KEY_RESERVED
+])
+def test_virtual_keyboard_provisions_keys_but_no_buttons(code, provisioned):
+    assert is_keyboard_key(code) == provisioned
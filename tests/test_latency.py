@@ -0,0 +1,77 @@
+import math
+import re
+
+import pytest
+
+from latency import METRIC_NAME, STAGE_SEND_EVENTS, LatencyHistogram, LatencyStats
+
+# name{label="value",...} value
+SAMPLE_RE = re.compile(r'^([a-z_]+)\{([^}]*)\} (\S+)$')
+LABEL_RE = re.compile(r'([a-z_]+)="([^"]*)"')
+
+
+def parse(text):
+    """
+    Prometheus text format -> {(name, frozenset of labels): value}, comments checked and left out.
+    """
+    samples = {}
+    for line in text.splitlines():
+        if line.startswith('#'):
+            assert re.match(r'^# (HELP|TYPE) {} '.format(METRIC_NAME), line)
+            continue
+
+        match = SAMPLE_RE.match(line)
+        assert match, line
+        labels = frozenset(LABEL_RE.findall(match.group(2)))
+        samples[(match.group(1), labels)] = float(match.group(3))
+
+    return samples
+
+
+def test_observations_go_to_the_bucket_of_their_upper_bound():
+    histogram = LatencyHistogram(buckets=(0.001, 0.01))
+
+    for seconds in (0.0005, 0.001, 0.002, 0.5):
+        histogram.observe(seconds)
+
+    assert list(histogram.counts) == [2, 1, 1]
+    assert histogram.count == 4
+    assert histogram.sum == pytest.approx(0.5035)
+
+
+def test_prometheus_histogram_is_cumulative():
+    stats = LatencyStats(stages=(STAGE_SEND_EVENTS,), buckets=(0.001, 0.01))
+    for seconds in (0.0005, 0.002, 0.003, 0.5):
+        stats.observe(STAGE_SEND_EVENTS, seconds)
+
+    samples = parse(stats.prometheus_text())
+
+    def bucket(le):
+        return samples[(METRIC_NAME + '_bucket', frozenset({('stage', STAGE_SEND_EVENTS), ('le', le)}))]
+
+    assert [bucket('0.001'), bucket('0.01'), bucket('+Inf')] == [1, 3, 4]
+    assert samples[(METRIC_NAME + '_count', frozenset({('stage', STAGE_SEND_EVENTS)}))] == 4
+    assert samples[(METRIC_NAME + '_sum', frozenset({('stage', STAGE_SEND_EVENTS)}))] == pytest.approx(0.5055)
+    assert len(samples) == 5
+
+
+def test_every_stage_is_exported_without_observations():
+    samples = parse(LatencyStats().prometheus_text())
+
+    infs = {dict(labels)['stage']: value for (name, labels), value in samples.items() if ('le', '+Inf') in labels}
+    assert len(infs) == 5
+    assert all(value == 0 for value in infs.values())
+    assert not any(math.isnan(value) for value in samples.values())
+
+
+def test_write_replaces_the_file(tmp_path):
+    path = str(tmp_path / "dialpad.prom")
+    stats = LatencyStats()
+
+    stats.write(path)
+    stats.observe(STAGE_SEND_EVENTS, 0.002)
+    stats.write(path)
+
+    with open(path) as f:
+        assert f.read() == stats.prometheus_text()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["dialpad.prom"]
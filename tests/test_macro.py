@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+
+from macro import MacroCompiler, key_stroke
+
+# keysym name -> key code of a US keymap
+US_KEYS = {
+    'Control_L': 29, 'Shift_L': 42, 'space': 57, 'u': 22, 'z': 44,
+    '0': 11, '1': 2, '2': 3, '3': 4, '4': 5, '5': 6, '6': 7, '7': 8, '8': 9, '9': 10,
+    'a': 30, 'b': 48, 'c': 46, 'd': 32, 'e': 18, 'f': 33,
+}
+
+
+def key(code):
+    return SimpleNamespace(value=code)
+
+
+def keymap_keys(keymap):
+    def keys(name):
+        # capital letters with Shift, as the keymap of the driver resolves them
+        if len(name) == 1 and name.isupper() and name.lower() in keymap:
+            return [key(keymap['Shift_L']), key(keymap[name.lower()])]
+
+        return key(keymap[name]) if name in keymap else ''
+
+    return keys
+
+
+def keysym_name(char):
+    return {' ': 'space', 'é': 'eacute', '→': 'rightarrow'}.get(char, char)
+
+
+def test_character_with_a_key():
+    compiler = MacroCompiler(keymap_keys(US_KEYS), keysym_name)
+
+    assert compiler.compile('a z') == key_stroke([30]) + key_stroke([57]) + key_stroke([44])
+
+
+def test_shifted_character_presses_shift_first():
+    compiler = MacroCompiler(keymap_keys(US_KEYS), keysym_name)
+
+    assert compiler.compile('A') == key_stroke([42, 30])
+
+
+def test_character_without_a_key_is_typed_by_the_unicode_sequence():
+    compiler = MacroCompiler(keymap_keys(US_KEYS), keysym_name)
+
+    # Ctrl+Shift+U, e9, space
+    assert compiler.compile('é') == key_stroke([29, 42, 22]) + key_stroke([18]) + key_stroke([10]) + key_stroke([57])
+
+
+def test_character_which_can_not_be_typed_is_left_out():
+    keymap = {name: code for name, code in US_KEYS.items() if name != 'u'}
+    compiler = MacroCompiler(keymap_keys(keymap), keysym_name)
+
+    assert compiler.compile('é a') == key_stroke([57]) + key_stroke([30])
+
+
+def test_texts_are_compiled_for_the_current_layout():
+    keymap = dict(US_KEYS)
+    compiler = MacroCompiler(keymap_keys(keymap), keysym_name)
+    us = compiler.compile_all(['z', 'é'])
+
+    # German layout, z is on the key of the US y, é is typed by its own key
+    keymap.update(z=21, eacute=26)
+    de = compiler.compile_all(['z', 'é'])
+
+    assert us['z'] == key_stroke([44])
+    assert de == {'z': key_stroke([21]), 'é': key_stroke([26])}
+
+
+def test_keysym_names_include_the_unicode_sequence():
+    compiler = MacroCompiler(keymap_keys(US_KEYS), keysym_name)
+
+    names = compiler.keysym_names('→')
+
+    assert {'rightarrow', 'Control_L', 'Shift_L', 'u', 'space'} <= names
+    assert set('0123456789abcdef') <= names
@@ -0,0 +1,116 @@
+import pstats
+import threading
+from time import sleep
+
+import pytest
+
+from profiler import MODE_CPROFILE, MODE_SAMPLE, RuntimeProfiler
+
+
+@pytest.fixture
+def profiler(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    profiler = RuntimeProfiler()
+    yield profiler
+    if profiler.mode == MODE_SAMPLE:
+        profiler.stop()
+
+
+def dial_step():
+    return sum(i * i for i in range(100))
+
+
+class TouchLoop:
+    """
+    Thread polling the profiler every iteration, as listen_touchpad_events does.
+    """
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="touch")
+        self.thread.start()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.profiler.poll()
+            dial_step()
+            sleep(0.001)
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+
+def test_cprofile_of_the_polling_thread(profiler):
+    loop = TouchLoop(profiler)
+    try:
+        assert profiler.start(MODE_CPROFILE).startswith("profiler started (cprofile)")
+        assert profiler.status() == "profiler is running (cprofile)"
+        assert profiler.start(MODE_SAMPLE) == "profiler is already running (cprofile)"
+        sleep(0.05)
+
+        path = profiler.stop()
+    finally:
+        loop.stop()
+
+    assert path.endswith(".pstats")
+    functions = {function for _, _, function in pstats.Stats(path).stats}
+    assert "dial_step" in functions
+    assert profiler.status() == "profiler is not running"
+
+
+def test_sample_mode_writes_collapsed_stacks(profiler):
+    loop = TouchLoop(profiler)
+    try:
+        profiler.start(MODE_SAMPLE, interval=0.001)
+        while profiler.samples_count < 5:
+            sleep(0.005)
+        assert profiler.status().startswith("profiler is running (sample)")
+
+        path = profiler.stop()
+    finally:
+        loop.stop()
+
+    with open(path) as f:
+        lines = f.read().splitlines()
+
+    stacks = {}
+    for line in lines:
+        stack, count = line.rsplit(" ", 1)
+        stacks[stack] = int(count)
+
+    # root first: thread name, then module:function frames
+    touch_stacks = [stack.split(";") for stack in stacks if stack.startswith("touch;")]
+    assert touch_stacks
+    assert all(frame.count(":") == 1 for stack in touch_stacks for frame in stack[1:])
+    assert any("test_profiler.py:run" in stack for stack in touch_stacks)
+    # the sampler itself is never sampled
+    assert not any(stack.startswith("profiler;") for stack in stacks)
+
+
+def test_stop_without_start(profiler):
+    assert profiler.stop() == "profiler is not running"
+
+
+def test_unknown_mode(profiler):
+    assert profiler.start("perf").startswith("unknown mode perf")
+    assert profiler.mode is None
+
+
+def test_toggle(profiler):
+    loop = TouchLoop(profiler)
+    try:
+        assert profiler.toggle().startswith("profiler started")
+        while profiler.requested:
+            sleep(0.001)
+        assert profiler.toggle().endswith(".pstats")
+    finally:
+        loop.stop()
+
+
+def test_stop_before_the_touch_loop_started_the_profile(profiler):
+    profiler.start(MODE_CPROFILE)
+
+    assert profiler.stop() == "profiler stopped before it started"
+    assert profiler.status() == "profiler is not running"
@@ -0,0 +1,83 @@
+import os
+import threading
+from time import monotonic
+
+import pytest
+
+import readiness
+from readiness import wait_for_file, wait_for_udev_device
+
+
+@pytest.fixture
+def udev(tmp_path, monkeypatch):
+    """
+    Device node and the udev data dir, returns the path of the udev entry of the node.
+    """
+    data_dir = tmp_path / "udev-data"
+    data_dir.mkdir()
+    monkeypatch.setattr(readiness, "UDEV_DATA_DIR", str(data_dir))
+
+    devnode = tmp_path / "event42"
+    devnode.touch()
+    rdev = os.stat(devnode).st_rdev
+    return str(devnode), data_dir / "c{}:{}".format(os.major(rdev), os.minor(rdev))
+
+
+def later(action, delay=0.05):
+    timer = threading.Timer(delay, action)
+    timer.start()
+    return timer
+
+
+def test_device_processed_before_the_wait(udev):
+    devnode, udev_entry = udev
+    udev_entry.touch()
+
+    assert wait_for_udev_device(devnode, 1)
+
+
+def test_device_processed_while_waiting(udev):
+    devnode, udev_entry = udev
+    timer = later(udev_entry.touch)
+
+    start = monotonic()
+    assert wait_for_udev_device(devnode, 5)
+    assert monotonic() - start < 1
+    timer.join()
+
+
+def test_device_node_created_while_waiting(udev, tmp_path):
+    devnode, udev_entry = udev
+    udev_entry.touch()
+    new_devnode = tmp_path / "event43"
+    timer = later(new_devnode.touch)
+
+    # a regular file has the same st_rdev as the fixture node
+    assert wait_for_udev_device(str(new_devnode), 5)
+    timer.join()
+
+
+def test_timeout_when_udev_does_not_process_the_device(udev):
+    devnode, udev_entry = udev
+
+    start = monotonic()
+    assert not wait_for_udev_device(devnode, 0.2)
+    assert 0.2 <= monotonic() - start < 1
+
+
+def test_without_udev(udev, monkeypatch, tmp_path):
+    devnode, udev_entry = udev
+    monkeypatch.setattr(readiness, "UDEV_DATA_DIR", str(tmp_path / "no-udev"))
+
+    assert not wait_for_udev_device(devnode, 0.2)
+
+
+def test_unrelated_file_does_not_end_the_wait(tmp_path):
+    timer = later((tmp_path / "other").touch)
+
+    assert not wait_for_file(str(tmp_path / "expected"), 0.3)
+    timer.join()
+
+
+def test_directory_which_can_not_be_watched(tmp_path):
+    assert not wait_for_file(str(tmp_path / "missing" / "file"), 0.2)
@@ -0,0 +1,75 @@
+import gc
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from realtime import FrameJitter, RealtimeMode, parse_cpus, parse_gc_threshold
+
+CHILD_POLICY = [sys.executable, "-c", "import os; print(os.sched_getscheduler(0), os.getpriority(os.PRIO_PROCESS, 0))"]
+
+
+def apply_in_thread(mode):
+    """
+    Applies mode to a new thread and returns (its policy, policy and niceness of a process it starts).
+    """
+    result = {}
+
+    def run():
+        mode.apply()
+        result["policy"] = os.sched_getscheduler(0)
+        result["child"] = subprocess.check_output(CHILD_POLICY, text=True).split()
+
+    threshold = gc.get_threshold()
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    gc.unfreeze()
+    gc.set_threshold(*threshold)
+
+    return result["policy"], [int(value) for value in result["child"]]
+
+
+def test_processes_started_by_the_realtime_thread_are_not_realtime():
+    mode = RealtimeMode(priority=1, lock_memory=False)
+    policy, child = apply_in_thread(mode)
+    if not any(applied.startswith("SCHED_FIFO") for applied in mode.applied):
+        pytest.skip("SCHED_FIFO is not permitted")
+
+    assert policy == os.SCHED_FIFO | os.SCHED_RESET_ON_FORK
+    assert child == [os.SCHED_OTHER, 0]
+
+
+def test_processes_started_by_the_niced_thread_are_not_niced():
+    mode = RealtimeMode(priority=0, nice=-5, lock_memory=False)
+    policy, child = apply_in_thread(mode)
+    if "nice -5" not in mode.applied:
+        pytest.skip("negative niceness is not permitted")
+
+    assert child == [os.SCHED_OTHER, 0]
+
+
+@pytest.mark.parametrize("value, cpus", [
+    (None, None),
+    ("", None),
+    (True, {1}),
+    (False, {0}),
+    ("2,3", {2, 3}),
+    ("0-2, 5", {0, 1, 2, 5}),
+])
+def test_parse_cpus(value, cpus):
+    assert parse_cpus(value) == cpus
+
+
+def test_parse_gc_threshold():
+    assert parse_gc_threshold("1000,10,10") == (1000, 10, 10)
+
+
+def test_frame_jitter_report():
+    jitter = FrameJitter()
+    for i in range(100):
+        jitter.observe(0.001, 0.0001)
+
+    assert "wakeup p50 1.000" in jitter.report()
@@ -0,0 +1,117 @@
+import os
+import socket
+
+import pytest
+
+import service
+from service import STATUS_INTERVAL, ServiceNotifier, notify, watchdog_interval
+
+
+@pytest.fixture
+def environ(monkeypatch):
+    for name in ("NOTIFY_SOCKET", "WATCHDOG_USEC", "WATCHDOG_PID"):
+        monkeypatch.delenv(name, raising=False)
+    # the notify protocol spoken directly, as without systemd-python
+    monkeypatch.setattr(service, "systemd_daemon", None)
+    return monkeypatch
+
+
+def receiver(address):
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    s.bind(address)
+    s.settimeout(1)
+    return s
+
+
+def test_notify_sends_a_datagram(environ, tmp_path):
+    path = str(tmp_path / "notify")
+    with receiver(path) as s:
+        environ.setenv("NOTIFY_SOCKET", path)
+
+        assert notify("READY=1")
+        assert s.recv(4096) == b"READY=1"
+
+
+def test_notify_to_an_abstract_socket(environ):
+    name = "asus-dialpad-driver-test-{}".format(os.getpid())
+    with receiver("\0" + name) as s:
+        environ.setenv("NOTIFY_SOCKET", "@" + name)
+
+        assert notify("WATCHDOG=1")
+        assert s.recv(4096) == b"WATCHDOG=1"
+
+
+def test_notify_without_service_manager(environ, tmp_path):
+    assert not notify("READY=1")
+
+    environ.setenv("NOTIFY_SOCKET", str(tmp_path / "missing"))
+    assert not notify("READY=1")
+
+
+@pytest.mark.parametrize("usec, pid, interval", [
+    ("10000000", None, 5),
+    ("10000000", "self", 5),
+    ("10000000", "1", None),
+    ("ten", None, None),
+    (None, None, None),
+])
+def test_watchdog_interval(environ, usec, pid, interval):
+    if usec:
+        environ.setenv("WATCHDOG_USEC", usec)
+    if pid:
+        environ.setenv("WATCHDOG_PID", str(os.getpid()) if pid == "self" else pid)
+
+    assert watchdog_interval() == interval
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1000
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def notifier(environ):
+    sent = []
+    clock = Clock()
+    environ.setattr(service, "notify", sent.append)
+    environ.setattr(service, "monotonic", clock)
+    environ.setenv("WATCHDOG_USEC", "4000000")
+    return ServiceNotifier(), sent, clock
+
+
+def test_heartbeat_pings_the_watchdog_every_interval(notifier):
+    service_notifier, sent, clock = notifier
+
+    service_notifier.heartbeat()
+    clock.now += 1
+    service_notifier.heartbeat()
+    clock.now += 1
+    service_notifier.heartbeat()
+
+    assert sent == ["WATCHDOG=1", "WATCHDOG=1"]
+
+
+def test_heartbeat_refreshes_the_status(notifier):
+    service_notifier, sent, clock = notifier
+    service_notifier.ready("started")
+
+    service_notifier.heartbeat(lambda: "status")
+    clock.now += STATUS_INTERVAL
+    service_notifier.heartbeat(lambda: "status")
+
+    assert [message for message in sent if message.startswith("STATUS=")] == ["STATUS=status"]
+    assert sent[0] == "READY=1\nSTATUS=started"
+
+
+def test_select_timeout_wakes_up_for_the_watchdog(notifier, environ):
+    service_notifier, sent, clock = notifier
+
+    assert service_notifier.select_timeout(10) == 2
+    assert service_notifier.select_timeout(1) == 1
+
+    environ.delenv("WATCHDOG_USEC")
+    assert ServiceNotifier().select_timeout(10) == 10
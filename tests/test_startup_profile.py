@@ -0,0 +1,79 @@
+import builtins
+import logging
+import sys
+
+import pytest
+
+import startup_profile
+from startup_profile import STARTUP_BUDGET_DEFAULT_MS, StartupProfile
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(startup_profile, "perf_counter", clock)
+    return clock
+
+
+@pytest.mark.parametrize("elapsed_ms, within_budget", [(250, True), (500, True), (501, False)])
+def test_report_tells_whether_the_startup_fits_into_the_budget_for_the_exit_code(clock, elapsed_ms, within_budget, caplog):
+    profile = StartupProfile(budget_ms=500)
+    with profile.phase("devices"):
+        clock.now += elapsed_ms / 1000
+
+    with caplog.at_level(logging.INFO, logger="asus-dialpad-driver"):
+        assert profile.report() == within_budget
+
+    assert profile.phases == [("devices", pytest.approx(elapsed_ms))]
+    assert any(record.levelno == (logging.INFO if within_budget else logging.ERROR) and "Startup took" in record.getMessage()
+               for record in caplog.records)
+
+
+@pytest.mark.parametrize("value", [None, "", "0"])
+def test_profile_is_off_by_default(monkeypatch, value):
+    if value is None:
+        monkeypatch.delenv("STARTUP_PROFILE", raising=False)
+    else:
+        monkeypatch.setenv("STARTUP_PROFILE", value)
+
+    assert StartupProfile.from_environment() is None
+
+
+@pytest.mark.parametrize("budget, budget_ms", [("250", 250), ("12.5", 12.5), ("fast", STARTUP_BUDGET_DEFAULT_MS), (None, STARTUP_BUDGET_DEFAULT_MS)])
+def test_budget_of_the_environment(monkeypatch, budget, budget_ms):
+    monkeypatch.setenv("STARTUP_PROFILE", "1")
+    if budget is None:
+        monkeypatch.delenv("STARTUP_BUDGET_MS", raising=False)
+    else:
+        monkeypatch.setenv("STARTUP_BUDGET_MS", budget)
+
+    profile = StartupProfile.from_environment()
+    try:
+        assert profile.budget_ms == budget_ms
+    finally:
+        profile.stop_tracing_imports()
+
+
+def test_first_time_imports_are_timed(monkeypatch):
+    original_import = builtins.__import__
+    monkeypatch.delitem(sys.modules, "colorsys", raising=False)
+
+    profile = StartupProfile()
+    profile.trace_imports()
+    try:
+        import colorsys  # noqa: F401
+        import os  # noqa: F401 - imported already, not timed
+    finally:
+        profile.stop_tracing_imports()
+
+    assert builtins.__import__ is original_import
+    assert [name for depth, name, self_us, cumulative_us in profile.imports] == ["colorsys"]
@@ -0,0 +1,59 @@
+import pytest
+
+from tracebuffer import (
+    TRACE_CLOCKWISE, TRACE_FINGER_DOWN, TRACE_FINGER_UP, TRACE_HEADER, TRACE_RECORD, TraceBuffer, read_dump
+)
+
+
+def timestamps(data):
+    return [record[0] for record in TRACE_RECORD.iter_unpack(data)]
+
+
+def test_snapshot_before_the_ring_is_full():
+    trace = TraceBuffer(capacity=4)
+    for i in range(3):
+        trace.record(float(i), TRACE_CLOCKWISE)
+
+    assert timestamps(trace.snapshot()) == [0, 1, 2]
+
+
+@pytest.mark.parametrize("records", [4, 5, 11])
+def test_snapshot_keeps_the_newest_records_oldest_first(records):
+    trace = TraceBuffer(capacity=4)
+    for i in range(records):
+        trace.record(float(i), TRACE_CLOCKWISE)
+
+    assert timestamps(trace.snapshot()) == [float(i) for i in range(records - 4, records)]
+    assert trace.count == records
+
+
+def test_dump_round_trip(tmp_path):
+    trace = TraceBuffer(capacity=2)
+    trace.record(1.0, TRACE_FINGER_DOWN, 100.5, 90.25, -1, 0)
+    trace.record(1.5, TRACE_CLOCKWISE, 200.0, 45.0, 3, 0, 115)
+    trace.record(2.0, TRACE_FINGER_UP, slot=0)
+
+    path = trace.dump(str(tmp_path / "trace.bin"))
+
+    assert list(read_dump(path)) == [
+        (1.5, TRACE_CLOCKWISE, 200.0, 45.0, 3, 0, 115),
+        (2.0, TRACE_FINGER_UP, 0.0, 0.0, -1, 0, 0),
+    ]
+
+
+def test_dump_to_the_runtime_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    trace = TraceBuffer(capacity=2)
+
+    path = trace.dump()
+
+    assert path.startswith(str(tmp_path))
+    assert list(read_dump(path)) == []
+
+
+def test_other_file_is_not_read(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(TRACE_HEADER.pack(b"OTHER000", TRACE_RECORD.size, 0))
+
+    with pytest.raises(ValueError):
+        list(read_dump(str(path)))
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+import os
+import struct
+import sys
+import tempfile
+from time import strftime
+
+# timestamp, distance from the circle center, filtered angle, slice (-1 none), decision, slot, key code
+TRACE_RECORD = struct.Struct('<dffbBbH')
+TRACE_MAGIC = b'DPTRACE1'
+# magic, record size, number of records
+TRACE_HEADER = struct.Struct('<8sII')
+# ~1.4 MiB, minutes of continuous dialing
+DEFAULT_CAPACITY = 65536
+
+# Decisions
+TRACE_FINGER_DOWN = 1
+TRACE_FINGER_UP = 2
+TRACE_CANCEL = 3
+TRACE_RESYNC = 4
+TRACE_OUTSIDE = 5  # outside of the circle or the DialPad is disabled
+TRACE_CENTER = 6
+TRACE_ICON = 7
+TRACE_FIRST_SLICE = 8
+TRACE_SAME_SLICE = 9  # stayed in the slice thanks to the hysteresis
+TRACE_CLOCKWISE = 10
+TRACE_COUNTERCLOCKWISE = 11
+TRACE_KEY_PRESS = 12
+TRACE_KEY_RELEASE = 13
+
+TRACE_DECISION_NAMES = {
+    TRACE_FINGER_DOWN: "finger_down",
+    TRACE_FINGER_UP: "finger_up",
+    TRACE_CANCEL: "cancel",
+    TRACE_RESYNC: "resync",
+    TRACE_OUTSIDE: "outside",
+    TRACE_CENTER: "center",
+    TRACE_ICON: "icon",
+    TRACE_FIRST_SLICE: "first_slice",
+    TRACE_SAME_SLICE: "same_slice",
+    TRACE_CLOCKWISE: "clockwise",
+    TRACE_COUNTERCLOCKWISE: "counterclockwise",
+    TRACE_KEY_PRESS: "key_press",
+    TRACE_KEY_RELEASE: "key_release",
+}
+
+
+def no_trace(timestamp, decision, distance=0, angle=0, slice_=-1, slot=-1, key=0):
+    pass
+
+
+class TraceBuffer:
+    """
+    Fixed-size ring of compact binary trace records, always on.
+
+    Recording is one struct.pack_into() into a buffer allocated up front, so
+    it costs about as much as a dict lookup and never allocates. The newest
+    capacity records can be dumped to a file at any time (SIGUSR2 or the
+    trace-dump control command) and read by "python -m tracebuffer FILE".
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.buffer = bytearray(capacity * TRACE_RECORD.size)
+        self.offset = 0
+        self.count = 0
+
+    def record(self, timestamp, decision, distance=0, angle=0, slice_=-1, slot=-1, key=0):
+        TRACE_RECORD.pack_into(self.buffer, self.offset, timestamp, distance, angle, slice_, decision, slot, key)
+
+        self.offset += TRACE_RECORD.size
+        if self.offset == len(self.buffer):
+            self.offset = 0
+        self.count += 1
+
+    def snapshot(self):
+        """
+        Recorded bytes from the oldest record to the newest one.
+        """
+        offset = self.offset
+        if self.count < self.capacity:
+            return bytes(self.buffer[:offset])
+
+        return bytes(self.buffer[offset:]) + bytes(self.buffer[:offset])
+
+    def dump(self, path=None):
+        """
+        Writes the records to path (a new file in $XDG_RUNTIME_DIR by default), returns the path.
+        """
+        data = self.snapshot()
+        if path is None:
+            directory = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+            path = os.path.join(directory, 'asus-dialpad-driver-trace-{}-{}.bin'.format(os.getpid(), strftime('%Y%m%d-%H%M%S')))
+
+        with open(path, 'wb') as f:
+            f.write(TRACE_HEADER.pack(TRACE_MAGIC, TRACE_RECORD.size, len(data) // TRACE_RECORD.size))
+            f.write(data)
+
+        return path
+
+
+def read_dump(path):
+    """
+    Yields records of a dump as (timestamp, decision, distance, angle, slice, slot, key).
+    """
+    with open(path, 'rb') as f:
+        magic, record_size, count = TRACE_HEADER.unpack(f.read(TRACE_HEADER.size))
+        if magic != TRACE_MAGIC or record_size != TRACE_RECORD.size:
+            raise ValueError("{} is not a DialPad trace dump".format(path))
+
+        data = f.read(record_size * count)
+
+    for timestamp, distance, angle, slice_, decision, slot, key in TRACE_RECORD.iter_unpack(data):
+        yield timestamp, decision, distance, angle, slice_, slot, key
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python -m tracebuffer DUMP_FILE")
+        sys.exit(1)
+
+    previous = None
+    for timestamp, decision, distance, angle, slice_, slot, key in read_dump(sys.argv[1]):
+        delta_ms = (timestamp - previous) * 1000 if previous is not None else 0
+        previous = timestamp
+        print("{:.6f} {:+9.3f}ms {:<16} slot {:>2} distance {:8.1f} angle {:6.1f} slice {:>2} key {}".format(
+            timestamp, delta_ms, TRACE_DECISION_NAMES.get(decision, decision), slot, distance, angle, slice_, key or ""
+        ))